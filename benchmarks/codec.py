@@ -0,0 +1,111 @@
+"""
+Benchmark of the JSON backends available to ``sirbot.slack.codec``.
+
+Measure the time spent decoding an RTM frame and encoding / decoding a stored
+user profile for each installed backend.
+
+    $ python benchmarks/codec.py
+"""
+
+import json
+import timeit
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+NUMBER = 20000
+
+RTM_FRAME = json.dumps({
+    'type': 'message',
+    'channel': 'C2147483705',
+    'user': 'U2147483697',
+    'text': 'Hello world, <@U0BOT0001> how are you doing today ?',
+    'ts': '1355517523.000005',
+    'source_team': 'T061EG9R6',
+    'team': 'T061EG9R6',
+    'event_ts': '1355517523.000005',
+})
+
+USER = {
+    'id': 'U2147483697',
+    'team_id': 'T061EG9R6',
+    'name': 'spengler',
+    'deleted': False,
+    'color': '9f69e7',
+    'real_name': 'Egon Spengler',
+    'tz': 'America/Los_Angeles',
+    'tz_label': 'Pacific Daylight Time',
+    'tz_offset': -25200,
+    'profile': {
+        'avatar_hash': 'ge3b51ca72de',
+        'status_text': 'Print is dead',
+        'status_emoji': ':books:',
+        'real_name': 'Egon Spengler',
+        'display_name': 'spengler',
+        'email': 'spengler@ghostbusters.example.com',
+        'image_24': 'https://.../U2147483697-4f4ebea8b2de-24.png',
+        'image_32': 'https://.../U2147483697-4f4ebea8b2de-32.png',
+        'image_48': 'https://.../U2147483697-4f4ebea8b2de-48.png',
+        'image_72': 'https://.../U2147483697-4f4ebea8b2de-72.png',
+        'image_192': 'https://.../U2147483697-4f4ebea8b2de-192.png',
+        'image_512': 'https://.../U2147483697-4f4ebea8b2de-512.png',
+        'team': 'T061EG9R6'
+    },
+    'is_admin': True,
+    'is_owner': False,
+    'is_primary_owner': False,
+    'is_restricted': False,
+    'is_ultra_restricted': False,
+    'is_bot': False,
+    'updated': 1502138686,
+    'is_app_user': False,
+    'has_2fa': False
+}
+USER_RAW = json.dumps(USER)
+
+BACKENDS = [('json', json.loads, json.dumps)]
+if ujson:
+    BACKENDS.append(('ujson', ujson.loads, ujson.dumps))
+if orjson:
+    BACKENDS.append(
+        ('orjson', orjson.loads, lambda obj: orjson.dumps(obj).decode())
+    )
+
+
+def bench(func, *args):
+    best = min(timeit.repeat(lambda: func(*args), number=NUMBER, repeat=5))
+    return best / NUMBER * 1e6
+
+
+def main():
+    print('{:<8} {:>14} {:>14} {:>14}'.format(
+        'backend', 'rtm loads', 'user dumps', 'user loads'))
+
+    results = dict()
+    for name, loads, dumps in BACKENDS:
+        results[name] = (
+            bench(loads, RTM_FRAME),
+            bench(dumps, USER),
+            bench(loads, USER_RAW),
+        )
+        print('{:<8} {:>12.2f}us {:>12.2f}us {:>12.2f}us'.format(
+            name, *results[name]))
+
+    # A stored message costs one decode of the frame, one user lookup and
+    # one save of the message.
+    baseline = sum(results['json'])
+    for name, timings in results.items():
+        if name != 'json':
+            print('{}: {:.2f}us of CPU saved per event ({:.0%})'.format(
+                name, baseline - sum(timings), 1 - sum(timings) / baseline))
+
+
+if __name__ == '__main__':
+    main()
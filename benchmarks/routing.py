@@ -0,0 +1,160 @@
+"""
+Benchmark of the message handlers matching.
+
+Compare the indexed ``MessageRouter`` with the previous implementation (a
+linear scan searching every registered regex) on ~300 patterns, checking
+both find the same handlers.
+
+    $ python benchmarks/routing.py
+"""
+
+import random
+import re
+import string
+import timeit
+from collections import defaultdict
+
+from sirbot.slack.dispatcher.router import MessageRouter
+
+NUMBER = 20
+PATTERNS = 300
+MESSAGES = 2000
+CHANNELS = ['C{:08d}'.format(i) for i in range(20)]
+
+WORDS = ['help', 'deploy', 'status', 'weather', 'karma', 'ping', 'hello',
+         'release', 'build', 'ticket', 'remind', 'poll', 'joke', 'stats']
+
+
+class User:
+    def __init__(self, admin):
+        self.admin = admin
+
+
+class Channel:
+    def __init__(self, id_):
+        self.id = id_
+
+
+class Message:
+    def __init__(self, text, to, mention, admin):
+        self.text = text
+        self.to = Channel(to)
+        self.frm = User(admin)
+        self.mention = mention
+
+
+def handler():
+    pass
+
+
+def patterns(rnd):
+    for i in range(PATTERNS):
+        word = rnd.choice(WORDS) + str(i)
+        kind = i % 6
+        if kind == 0:
+            yield '^{}'.format(word), 0
+        elif kind == 1:
+            yield '{} (\\w+)'.format(word), 0
+        elif kind == 2:
+            yield '(?P<word>{}|{})'.format(word, rnd.choice(WORDS)), 0
+        elif kind == 3:
+            yield word, re.IGNORECASE
+        elif kind == 4:
+            yield '\\b{}\\b'.format(word), 0
+        else:
+            yield '^!{} (.+)$'.format(word), 0
+
+
+def options(rnd):
+    channel_id = '*'
+    if rnd.random() < 0.3:
+        channel_id = rnd.sample(CHANNELS, 3)
+    return {
+        'func': handler,
+        'mention': rnd.random() < 0.2,
+        'admin': rnd.random() < 0.1,
+        'channel_id': channel_id
+    }
+
+
+def messages(rnd):
+    for _ in range(MESSAGES):
+        words = [''.join(rnd.choice(string.ascii_lowercase)
+                         for _ in range(rnd.randint(2, 8)))
+                 for _ in range(rnd.randint(3, 20))]
+        if rnd.random() < 0.2:
+            words.insert(0, rnd.choice(WORDS) + str(rnd.randrange(PATTERNS)))
+        yield Message(' '.join(words), rnd.choice(CHANNELS),
+                      rnd.random() < 0.3, rnd.random() < 0.1)
+
+
+def indexed_find(router, msg):
+    """MessageDispatcher._dispatch handlers lookup"""
+    return [(command['func'], n) for command, n in router.find(msg)
+            if not command.get('admin') or msg.frm.admin]
+
+
+def linear_find(endpoints, msg):
+    """Previous MessageDispatcher._find_handlers"""
+    handlers = list()
+
+    for match, commands in endpoints.items():
+        commands = [
+            command for command in commands
+            if (
+                command['channel_id'] == '*' or msg.to.id in
+                command['channel_id']
+            )
+        ]
+
+        if commands:
+            n = match.search(msg.text)
+            if n:
+                for command in commands:
+                    if command.get('mention') and not msg.mention:
+                        continue
+                    elif command.get('admin') and not msg.frm.admin:
+                        continue
+                    handlers.append((command['func'], n))
+
+    return handlers
+
+
+def main():
+    rnd = random.Random(42)
+    endpoints = defaultdict(list)
+    router = MessageRouter()
+
+    for match, flags in patterns(rnd):
+        option = options(rnd)
+        endpoints[re.compile(match, flags)].append(option)
+        router.add(match, flags, option)
+
+    msgs = list(messages(rnd))
+
+    def key(handlers):
+        return [(func, n.re.pattern, n.span(), n.groups())
+                for func, n in handlers]
+
+    matched = 0
+    for msg in msgs:
+        expected = linear_find(endpoints, msg)
+        assert key(indexed_find(router, msg)) == key(expected), msg.text
+        matched += bool(expected)
+
+    linear = timeit.timeit(
+        lambda: [linear_find(endpoints, msg) for msg in msgs], number=NUMBER
+    ) / (NUMBER * len(msgs))
+    indexed = timeit.timeit(
+        lambda: [indexed_find(router, msg) for msg in msgs], number=NUMBER
+    ) / (NUMBER * len(msgs))
+
+    print('{} patterns, {} messages ({} matching): identical results'.format(
+        len(router), len(msgs), matched))
+    print('{:<10} {:>10.2f} us/message'.format('linear', linear * 1e6))
+    print('{:<10} {:>10.2f} us/message ({:.1f}x)'.format(
+        'indexed', indexed * 1e6, linear / indexed))
+
+
+if __name__ == '__main__':
+    main()
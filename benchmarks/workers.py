@@ -0,0 +1,136 @@
+"""
+Scaling benchmark of the multi-process worker mode.
+
+Start the bot with 1 to N workers and replay a recording (or synthetic
+messages) as fast as possible against its events endpoint. The bot
+configuration must activate the events and metrics endpoints and point the
+slack API to the mock server:
+
+    $ python -m sirbot.slack.mockserver --port 9000 &
+    $ SIRBOT_SLACK_API_ROOT=http://127.0.0.1:9000/api/ \\
+        SIRBOT_SLACK_VERIFICATION_TOKEN=benchmark \\
+        python benchmarks/workers.py --config sirbot.yml --max-workers 4
+
+The duration of the handlers registered by the configured plugins is
+reported once the bot processed every event.
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from sirbot.slack import codec
+from sirbot.slack.replay import Recorder, Replayer
+
+EVENTS = 20000
+
+
+def synthetic_recording(path, events=EVENTS):
+    recorder = Recorder(path)
+    for i in range(events):
+        recorder.record('events', codec.dumps({
+            'type': 'event_callback',
+            'event_id': 'Ev{:08d}'.format(i),
+            'event': {
+                'type': 'message',
+                'channel': 'C{:08d}'.format(i % 20),
+                'user': 'U{:08d}'.format(i % 100),
+                'text': 'Hello world, how are you doing today ? #{}'.format(i),
+                'ts': '{}.{:06d}'.format(1355517523 + i // 1000000,
+                                         i % 1000000),
+            }
+        }))
+    recorder.close()
+
+
+def wait_port(host, port, timeout=30):
+    limit = time.time() + timeout
+    while time.time() < limit:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('Bot not listening on {}:{}'.format(host, port))
+
+
+def bench(args, recording, workers):
+    process = subprocess.Popen([
+        sys.executable, '-m', 'sirbot.slack.workers',
+        '--config', args.config,
+        '--host', '127.0.0.1',
+        '--port', str(args.port),
+        '--workers', str(workers)
+    ])
+
+    try:
+        wait_port('127.0.0.1', args.port)
+        loop = asyncio.new_event_loop()
+        replayer = Replayer(recording, speed=None,
+                            concurrency=args.concurrency, loop=loop)
+        report = loop.run_until_complete(replayer.to_url(
+            'http://127.0.0.1:{}{}'.format(args.port, args.endpoint),
+            token=os.environ.get('SIRBOT_SLACK_VERIFICATION_TOKEN'),
+            metrics_url='http://127.0.0.1:{}{}'.format(args.port,
+                                                       args.metrics),
+            workers=workers
+        ))
+        loop.close()
+    finally:
+        process.terminate()
+        process.wait()
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--config', required=True,
+                        help='Bot configuration with the events endpoint')
+    parser.add_argument('--endpoint', default='/slack/events')
+    parser.add_argument('--metrics', default='/slack/metrics')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count())
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--recording',
+                        help='Recording to replay (default to synthetic '
+                             'messages)')
+    args = parser.parse_args()
+
+    recording = args.recording
+    if not recording:
+        fd, recording = tempfile.mkstemp(suffix='.jsonl.gz')
+        os.close(fd)
+        os.remove(recording)
+        synthetic_recording(recording)
+
+    baseline = None
+    print('{:>8} {:>12} {:>8}  {}'.format(
+        'workers', 'events/s', 'speedup', 'handlers p50 / p99 ms'))
+
+    for workers in range(1, args.max_workers + 1):
+        report = bench(args, recording, workers)
+        baseline = baseline or report['events_per_second']
+        print('{:>8} {:>12.1f} {:>7.2f}x  {}'.format(
+            workers,
+            report['events_per_second'],
+            report['events_per_second'] / baseline if baseline else 0,
+            ', '.join(
+                '{} {:.2f} / {:.2f}'.format(name.rsplit('.', 1)[-1],
+                                            handler['p50'] * 1000,
+                                            handler['p99'] * 1000)
+                for name, handler in sorted(report['handlers'].items())
+            ) or '-'
+        ))
+
+    if not args.recording:
+        os.remove(recording)
+
+
+if __name__ == '__main__':
+    main()
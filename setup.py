@@ -100,7 +100,8 @@ setup(
         'pytest',
     ],
     extras_require={
-        'dev': parse_reqs('./requirements/requirements_dev.txt')
+        'dev': parse_reqs('./requirements/requirements_dev.txt'),
+        'speedups': ['orjson'],
     },
     # See: http://pypi.python.org/pypi?%3Aaction=list_classifiers
     classifiers=[
@@ -1,22 +1,59 @@
 import asyncio
-import json
+import functools
+import itertools
 import logging
 import aiohttp
 
 from typing import Any, AnyStr, Dict, Optional
 
 from sirbot.utils import ensure_future
+from . import codec
 from .errors import (
     SlackConnectionError,
     SlackServerError,
+    SlackRateLimitError,
     SlackRedirectionError,
     SlackAPIError,
     SlackClientError
 )
+from .metrics import APIMetrics, Histogram
+from .ratelimit import RateLimiter
+from .retry import CircuitBreaker, RetryPolicy
 
 logger = logging.getLogger(__name__)
 
 
+def single_flight(func):
+    """
+    Decorator sharing one in-flight call between concurrent identical calls.
+
+    Callers awaiting an identical call (same method and arguments) while it is
+    in progress receive the result of the first call instead of querying the
+    slack API again. Only use on idempotent read methods.
+    """
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        key = (func.__name__, args, tuple(sorted(kwargs.items())))
+        future = self._inflight.get(key)
+
+        if future is None:
+            logger.debug('Single flight call: %s', key)
+            future = asyncio.ensure_future(func(self, *args, **kwargs),
+                                           loop=self._loop)
+            self._inflight[key] = future
+            future.add_done_callback(
+                lambda _: self._inflight.pop(key, None)
+            )
+        else:
+            logger.debug('Joining in-flight call: %s', key)
+
+        # Shield the shared future so a cancelled caller doesn't cancel it
+        # for everyone else
+        return await asyncio.shield(future, loop=self._loop)
+
+    return wrapper
+
+
 class APIPath:
     """Path definitions for slack"""
     SLACK_API_ROOT = 'https://slack.com/api/{0}'
@@ -31,9 +68,11 @@ class APIPath:
 
     CHANNEL_GET = SLACK_API_ROOT.format('channels.list')
     CHANNEL_INFO = SLACK_API_ROOT.format('channels.info')
+    CHANNEL_HISTORY = SLACK_API_ROOT.format('channels.history')
 
     GROUP_GET = SLACK_API_ROOT.format('groups.list')
     GROUP_INFO = SLACK_API_ROOT.format('groups.info')
+    GROUP_HISTORY = SLACK_API_ROOT.format('groups.history')
 
     RTM_START = SLACK_API_ROOT.format('rtm.start')
     RTM_CONNECT = SLACK_API_ROOT.format('rtm.connect')
@@ -47,6 +86,26 @@ class APIPath:
 
     IM_OPEN = SLACK_API_ROOT.format('im.open')
     IM_LIST = SLACK_API_ROOT.format('im.list')
+    IM_HISTORY = SLACK_API_ROOT.format('im.history')
+
+    @classmethod
+    def set_root(cls, root):
+        """
+        Point all the paths to another slack API (i.e: a mock server)
+
+        :param root: Root url of the API (ex: ``http://localhost:8080/api/``)
+        """
+        if '{0}' not in root:
+            root = root.rstrip('/') + '/{0}'
+
+        old = cls.SLACK_API_ROOT.format('')
+        for name, value in list(vars(cls).items()):
+            if name.isupper() and name != 'SLACK_API_ROOT' \
+                    and isinstance(value, str) and value.startswith(old):
+                setattr(cls, name, root.format(value[len(old):]))
+
+        cls.SLACK_API_ROOT = root
+        logger.info('Using slack API at %s', root.format(''))
 
 
 class APICaller:
@@ -55,18 +114,32 @@ class APICaller:
 
     :param token: Slack API Token
     :param loop: Asyncio event loop to run in.
+    :param rate_limiter: Optional :class:`RateLimiter` pacing the API calls
+    :param retry_policies: :class:`RetryPolicy` by slack API method
+    :param circuit_breaker: Optional :class:`CircuitBreaker`
+    :param metrics: Optional :class:`APIMetrics` recording the calls
     """
-    __slots__ = ('_bot_token', '_app_token', '_token', '_loop', '_session')
+    __slots__ = ('_bot_token', '_app_token', '_token', '_loop', '_session',
+                 '_rate_limiter', '_retry_policies', '_circuit_breaker',
+                 '_metrics')
 
     def __init__(self, bot_token, app_token=None,
                  loop: Optional[asyncio.BaseEventLoop] = None,
-                 session: aiohttp.ClientSession = None):
+                 session: aiohttp.ClientSession = None,
+                 rate_limiter: Optional[RateLimiter] = None,
+                 retry_policies: Optional[Dict[str, RetryPolicy]] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None,
+                 metrics: Optional[APIMetrics] = None):
 
         self._bot_token = bot_token
         self._app_token = app_token
         self._token = app_token or bot_token
         self._loop = loop or asyncio.get_event_loop()
         self._session = session or aiohttp.ClientSession(loop=self._loop)
+        self._rate_limiter = rate_limiter
+        self._retry_policies = retry_policies or dict()
+        self._circuit_breaker = circuit_breaker
+        self._metrics = metrics
 
     def __del__(self):
         if not self._session.closed:
@@ -90,8 +163,7 @@ class APICaller:
         msg = msg or {}
         logger.debug('Querying SLACK HTTP API: %s', url)
         msg['token'] = token or self._token
-        async with self._session.post(url, data=msg) as response:
-            return await self._validate_response(response, url)
+        return await self._query(url, msg, data=msg)
 
     async def _do_json(self, url, *, msg=None, token=None):
         """
@@ -110,18 +182,121 @@ class APICaller:
         msg = msg or {}
         logger.debug('Querying SLACK HTTP API: %s', url)
         msg['token'] = token or self._token
-        async with self._session.post(
-                url=url,
-                data=json.dumps(msg),
-                headers={'content-type': 'application/json; charset=utf-8'}
-        ) as response:
-            return await self._validate_response(response, url)
+        return await self._query(
+            url,
+            msg,
+            data=codec.dumps(msg),
+            headers={'content-type': 'application/json; charset=utf-8'}
+        )
+
+    async def _query(self, url, msg, **kwargs):
+        """
+        Perform the POST request.
+
+        Wait on the rate limiter before each attempt and retry after the delay
+        requested by slack on 429 responses. Idempotent methods with a retry
+        policy are retried on server and connection errors and the circuit
+        breaker is notified of the outcome.
+
+        :param url: url for the request
+        :param msg: payload to send, used to find the rate limit bucket
+        :param kwargs: arguments of :meth:`aiohttp.ClientSession.post`
+        :return: Slack API Response
+        :rtype: dict
+        """
+        method = self._api_method(url)
+        policy = self._retry_policies.get(method)
+        breaker = self._circuit_breaker if method else None
+        rate_limited = 0
+        failures = 0
+        delay = 0
+
+        while True:
+            if delay:
+                await asyncio.sleep(delay, loop=self._loop)
+                delay = 0
+
+            if breaker:
+                breaker.check()
+
+            if self._rate_limiter is not None and method:
+                await self._rate_limiter.acquire(method, msg)
+
+            label = method or 'response_url'
+            status = 'error'
+            start = self._loop.time()
+            if self._metrics is not None:
+                self._metrics.start(label)
+
+            try:
+                async with self._session.post(url, **kwargs) as response:
+                    status = response.status
+                    if response.status == 429 and self._rate_limiter and \
+                            rate_limited < self._rate_limiter.retries:
+                        rate_limited += 1
+                        self._rate_limiter.throttled(
+                            method, msg, self._retry_after(response)
+                        )
+                        if self._metrics is not None:
+                            self._metrics.retry(label, 'rate_limited')
+                        continue
+
+                    rep = await self._validate_response(response, url)
+            except (SlackServerError, aiohttp.ClientError,
+                    asyncio.TimeoutError) as e:
+                failures += 1
+                if breaker:
+                    breaker.failure()
+
+                if policy and failures < policy.attempts:
+                    delay = policy.delay(failures)
+                    logger.warning('Slack server error on %s (%r), retrying '
+                                   'in %.2fs', method, e, delay)
+                    if self._metrics is not None:
+                        reason = 'server_error' if isinstance(
+                            e, SlackServerError) else 'connection_error'
+                        self._metrics.retry(label, reason)
+                    continue
+
+                raise
+            except SlackClientError:
+                if breaker:
+                    breaker.success()
+                raise
+            else:
+                if breaker:
+                    breaker.success()
+                return rep
+            finally:
+                if self._metrics is not None:
+                    self._metrics.end(label, status,
+                                      self._loop.time() - start)
+
+    @staticmethod
+    def _api_method(url):
+        """
+        Extract the slack API method from an url
+
+        :param url: url of the request
+        :return: slack API method or None for url outside of the slack API
+        (i.e: response_url)
+        """
+        root = APIPath.SLACK_API_ROOT.format('')
+        if url.startswith(root):
+            return url[len(root):]
+
+    @staticmethod
+    def _retry_after(response):
+        try:
+            return int(response.headers.get('Retry-After', 1))
+        except ValueError:
+            return 1
 
     async def _validate_response(self, response, url):
         if 200 <= response.status < 300:
 
             if response.headers['Content-Type'].startswith('application/json'):
-                rep = await response.json()
+                rep = await response.json(loads=codec.loads)
             else:
                 rep = await response.text()
                 if rep == 'ok':
@@ -139,6 +314,10 @@ class APICaller:
             e = 'Redirection, status code: {}'.format(response.status)
             logger.error(e)
             raise SlackRedirectionError(e)
+        elif response.status == 429:
+            e = 'Rate limited, status code: {}'.format(response.status)
+            logger.error(e)
+            raise SlackRateLimitError(e, self._retry_after(response))
         elif 400 <= response.status < 500:
             e = 'Client error, status code: {}'.format(response.status)
             logger.error(e)
@@ -155,8 +334,15 @@ class HTTPClient(APICaller):
 
     :param token: Slack API access token
     :param loop: Event loop, optional
+    :param page_size: Number of items requested per page on paginated
+    methods
     """
 
+    def __init__(self, *args, page_size=200, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._inflight = dict()
+        self.page_size = page_size
+
     async def message_delete(self, message):
         """
         Delete a previously sent message
@@ -276,6 +462,52 @@ class HTTPClient(APICaller):
         msg['timestamp'] = message.timestamp
         return msg
 
+    async def _paginate(self, url, key, msg=None, page_size=None):
+        """
+        Iterate over the items of a cursor paginated slack API method.
+
+        Pages are only queried when the previous one is consumed.
+
+        :param url: url of the method
+        :param key: key of the items in the response
+        :param msg: payload to send with each query
+        :param page_size: number of items per page
+        """
+        msg = msg or {}
+        cursor = None
+
+        while True:
+            data = dict(msg, limit=page_size or self.page_size)
+            if cursor:
+                data['cursor'] = cursor
+
+            rep = await self._do_post(url, msg=data)
+            for item in rep.get(key, []):
+                yield item
+
+            cursor = rep.get('response_metadata', {}).get('next_cursor')
+            if not cursor:
+                break
+
+    def iter_channels(self, members=False, archived=False, page_size=None):
+        """
+        Asynchronously iterate over all the available channels in the team.
+
+        :Example:
+
+        >>> async for channel in client.iter_channels():
+        ...     print(channel['name'])
+
+        :param page_size: number of channels queried per page
+        """
+        logger.debug('Iterating channels')
+        data = {
+            'exclude_members': members,
+            'exclude_archived': archived
+        }
+        return self._paginate(APIPath.CHANNEL_GET, 'channels', msg=data,
+                              page_size=page_size)
+
     async def get_channels(self, members=False, archived=False):
         """
         Query all available channels in the teams and identify in witch
@@ -286,15 +518,13 @@ class HTTPClient(APICaller):
         team.
         """
         logger.debug('Getting channels')
-        data = {
-            'exclude_members': members,
-            'exclude_archived': archived
-        }
-        rep = await self._do_post(APIPath.CHANNEL_GET, msg=data)
-        channels = [data for data in rep.get('channels', [])]
+        channels = [
+            channel async for channel in self.iter_channels(members, archived)
+        ]
 
         return channels
 
+    @single_flight
     async def get_channel(self, channel_id: str):
         """
         Query the information about a channel
@@ -310,6 +540,7 @@ class HTTPClient(APICaller):
         rep = await self._do_post(APIPath.CHANNEL_INFO, msg=msg)
         return rep['channel']
 
+    @single_flight
     async def get_group(self, group_id: str):
         """
         Query the information about a channel
@@ -325,11 +556,27 @@ class HTTPClient(APICaller):
         rep = await self._do_post(APIPath.GROUP_INFO, msg=msg)
         return rep['group']
 
+    def iter_users(self, page_size=None):
+        """
+        Asynchronously iterate over all the users of the team.
+
+        :Example:
+
+        >>> async for user in client.iter_users():
+        ...     print(user['name'])
+
+        :param page_size: number of users queried per page
+        """
+        logger.debug('Iterating users')
+        return self._paginate(APIPath.USER_LIST, 'members',
+                              page_size=page_size)
+
     async def get_users(self):
 
-        rep = await self._do_post(APIPath.USER_LIST)
-        return rep['members']
+        users = [user async for user in self.iter_users()]
+        return users
 
+    @single_flight
     async def get_user(self, user_id: str):
         """
         Query the information about an user
@@ -345,6 +592,7 @@ class HTTPClient(APICaller):
         rep = await self._do_post(APIPath.USER_INFO, msg=msg)
         return rep['user']
 
+    @single_flight
     async def open_dm(self, user_id: str):
         """
         Query the id of the direct message channel for an user
@@ -366,11 +614,53 @@ class HTTPClient(APICaller):
 
         return rep['channel']['id']
 
+    async def get_history(self, channel_id: str, oldest, latest=None):
+        """
+        Query the messages of a channel, private channel or direct message
+        channel between two timestamps
+
+        :param channel_id: id of the channel
+        :param oldest: only messages after this timestamp are returned
+        :param latest: only messages before this timestamp are returned
+        :return: list of messages, oldest first
+        :rtype: list
+        """
+        if channel_id.startswith('C'):
+            url = APIPath.CHANNEL_HISTORY
+        elif channel_id.startswith('G'):
+            url = APIPath.GROUP_HISTORY
+        else:
+            url = APIPath.IM_HISTORY
+
+        messages = list()
+        while True:
+            msg = {
+                'channel': channel_id,
+                'oldest': oldest,
+                'count': self.page_size
+            }
+            if latest:
+                msg['latest'] = latest
+
+            rep = await self._do_post(url, msg=msg, token=self._bot_token)
+            page = rep.get('messages', [])
+            messages.extend(page)
+
+            if not rep.get('has_more') or not page:
+                break
+
+            # Pages are ordered newest first
+            latest = page[-1]['ts']
+
+        messages.reverse()
+        return messages
+
     async def get_dms(self):
 
         rep = await self._do_post(APIPath.IM_LIST, token=self._bot_token)
         return rep
 
+    @single_flight
     async def get_bot(self, bot=None):
 
         rep = await self._do_post(APIPath.BOT_INFO, msg={'bot': bot})
@@ -389,18 +679,59 @@ class RTMClient(APICaller):
     """
     Client for the slack RTM API (websocket based API).
 
+    The callback is awaited for each frame before reading the next one.
+
     :param token: Slack API Token
+    :param callback: Coroutine function called with each frame
     :param loop: Event loop to work in, optional.
+    :param reconnect_policy: :class:`RetryPolicy` used to space the
+    reconnection attempts
+    :param on_reconnect: Optional coroutine function called after each
+    successful reconnection
+    :param ping_interval: Time in seconds between two RTM pings (0 to
+    deactivate)
+    :param ping_timeout: Time in seconds without pong before the connection
+    is considered dead and reconnected
+    :param recorder: Optional :class:`Recorder` of the incoming frames
+    :param skip: Optional function called with each raw frame, returning True
+    to drop the frame before decoding it
     """
 
     def __init__(self, bot_token, callback,
                  *, loop: Optional[asyncio.BaseEventLoop] = None,
-                 session: aiohttp.ClientSession = None):
-
-        super().__init__(bot_token, loop=loop, session=session)
+                 session: aiohttp.ClientSession = None,
+                 rate_limiter: Optional[RateLimiter] = None,
+                 retry_policies: Optional[Dict[str, RetryPolicy]] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None,
+                 metrics: Optional[APIMetrics] = None,
+                 reconnect_policy: Optional[RetryPolicy] = None,
+                 on_reconnect=None, ping_interval=30, ping_timeout=60,
+                 recorder=None, skip=None):
+
+        super().__init__(bot_token, loop=loop, session=session,
+                         rate_limiter=rate_limiter,
+                         retry_policies=retry_policies,
+                         circuit_breaker=circuit_breaker,
+                         metrics=metrics)
         self._ws = None
         self._closed = asyncio.Event(loop=self._loop)
         self._callback = callback
+        self._reconnect_policy = reconnect_policy or RetryPolicy(
+            backoff=1, max_backoff=60
+        )
+        self._on_reconnect = on_reconnect
+        self._ping_interval = ping_interval
+        self._ping_timeout = ping_timeout
+        self._recorder = recorder
+        self._skip = skip
+        self._ping_id = itertools.count(1)
+        self._pings = dict()
+        self._last_pong = None
+
+        self.latency = Histogram()
+        self.pings = 0
+        self.pongs = 0
+        self.dead_connections = 0
 
     @property
     def is_closed(self) -> bool:
@@ -419,47 +750,146 @@ class RTMClient(APICaller):
         return data
 
     async def reconnect(self):
+        """
+        Close the current websocket connection.
+
+        The :meth:`connect` loop negotiates a new one.
+        """
         logger.warning('Trying to reconnect to slack')
-        try:
-            self._closed.set()
+        if self._ws:
             await self._ws.close()
-            await self.connect()
-        except SlackClientError:
-            await asyncio.sleep(1, loop=self._loop)
-            await self.reconnect()
-        except Exception as e:
-            logger.exception(e)
 
     async def connect(self, url=None):
         """
-        Connect to the websocket stream and iterate over the messages
-        dumping them in the Queue.
+        Connect to the websocket stream and pass the frames to the callback.
+
+        When the connection drops a new one is negotiated, waiting between
+        failed attempts according to the reconnect policy. This coroutine
+        only returns when cancelled.
         """
-        logger.debug('Connecting...')
+        failures = 0
+        reconnecting = False
+
         try:
-            if not url:
-                url = (await self._negotiate_rtm_url())['url']
-            async with self._session.ws_connect(url) as self._ws:
-                self._closed.clear()
-                async for data in self._ws:
-                    if data.type == aiohttp.WSMsgType.TEXT:
-                        if data.data == 'close cmd':
-                            await self._ws.close()
-                            break
-                        else:
-                            msg = json.loads(data.data)
-                            ensure_future(self._callback(msg),
-                                          loop=self._loop,
-                                          logger=logger)
-                    elif data.type == aiohttp.WSMsgType.CLOSED:
-                        logger.warning('WS CLOSED: %s', data)
-                    elif data.type == aiohttp.WSMsgType.ERROR:
-                        logger.warning('WS ERROR: %s', data)
-
-            await self.reconnect()
+            while True:
+                try:
+                    if not url:
+                        url = (await self._negotiate_rtm_url())['url']
+
+                    logger.debug('Connecting...')
+                    async with self._session.ws_connect(url) as self._ws:
+                        self._closed.clear()
+                        failures = 0
+
+                        if reconnecting and self._on_reconnect:
+                            await self._reconnected()
+
+                        keepalive = None
+                        if self._ping_interval:
+                            keepalive = ensure_future(
+                                self._keepalive(), loop=self._loop,
+                                logger=logger
+                            )
+
+                        try:
+                            await self._read()
+                        finally:
+                            if keepalive:
+                                keepalive.cancel()
+                except asyncio.CancelledError:
+                    raise
+                except (SlackClientError, aiohttp.ClientError) as e:
+                    failures += 1
+                    logger.warning('RTM connection failed: %s', e)
+                except Exception as e:
+                    failures += 1
+                    logger.exception('RTM connection failed: %s', e)
+                finally:
+                    self._closed.set()
+                    self._ws = None
+
+                url = None
+                reconnecting = True
+                delay = self._reconnect_policy.delay(failures)
+                logger.debug('Reconnecting in %.2fs', delay)
+                await asyncio.sleep(delay, loop=self._loop)
 
         except asyncio.CancelledError:
             pass
-        finally:
-            self._closed.set()
-            self._ws = None
+
+    async def _reconnected(self):
+        try:
+            await self._on_reconnect()
+        except Exception as e:
+            logger.exception(e)
+
+    async def _read(self):
+        async for data in self._ws:
+            if data.type == aiohttp.WSMsgType.TEXT:
+                if data.data == 'close cmd':
+                    await self._ws.close()
+                    break
+                else:
+                    if self._recorder is not None:
+                        self._recorder.record('rtm', data.data)
+
+                    if self._skip and self._skip(data.data):
+                        continue
+
+                    msg = codec.loads(data.data)
+                    if msg.get('type') == 'pong':
+                        self._pong(msg)
+                    else:
+                        await self._callback(msg)
+            elif data.type == aiohttp.WSMsgType.CLOSED:
+                logger.warning('WS CLOSED: %s', data)
+            elif data.type == aiohttp.WSMsgType.ERROR:
+                logger.warning('WS ERROR: %s', data)
+
+    async def _keepalive(self):
+        """
+        Ping slack every ping_interval seconds and close the connection when
+        no pong is received for ping_timeout seconds
+        """
+        self._pings.clear()
+        self._last_pong = self._loop.time()
+
+        while True:
+            await asyncio.sleep(self._ping_interval, loop=self._loop)
+
+            if self._loop.time() - self._last_pong > self._ping_timeout:
+                logger.warning('No RTM pong for %ss, reconnecting',
+                               self._ping_timeout)
+                self.dead_connections += 1
+                ensure_future(self.reconnect(), loop=self._loop,
+                              logger=logger)
+                return
+
+            id_ = next(self._ping_id)
+            self._pings[id_] = self._loop.time()
+            self.pings += 1
+            await self._ws.send_str(codec.dumps({'id': id_, 'type': 'ping'}))
+
+    def _pong(self, msg):
+        now = self._loop.time()
+        self._last_pong = now
+        self.pongs += 1
+
+        reply_to = msg.get('reply_to')
+        sent = self._pings.pop(reply_to, None)
+        if sent is not None:
+            self.latency.observe(now - sent)
+
+            # Older pings will never be answered
+            for id_ in list(self._pings):
+                if id_ < reply_to:
+                    del self._pings[id_]
+
+    def snapshot(self):
+        return {
+            'connected': not self.is_closed,
+            'pings': self.pings,
+            'pongs': self.pongs,
+            'dead_connections': self.dead_connections,
+            'latency': self.latency.snapshot(),
+        }
@@ -0,0 +1,67 @@
+"""
+JSON codec of the plugin. Use ``codec.loads`` / ``codec.dumps`` (not a direct
+import of the functions) so the backend selected by :func:`use` is honored.
+"""
+
+import json
+import logging
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import ujson
+except ImportError:  # pragma: no cover
+    ujson = None
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('orjson', 'ujson', 'json')
+
+backend = None
+loads = None
+dumps = None
+
+
+def _orjson_dumps(obj):
+    return orjson.dumps(obj).decode('utf-8')
+
+
+def _ujson_dumps(obj):
+    return ujson.dumps(obj, ensure_ascii=False)
+
+
+def use(name=None):
+    """
+    Select the JSON backend
+
+    :param name: One of ``orjson``, ``ujson`` or ``json``. Default to the
+    fastest installed backend.
+    """
+    global backend, loads, dumps
+
+    if name is None:
+        if orjson:
+            name = 'orjson'
+        elif ujson:
+            name = 'ujson'
+        else:
+            name = 'json'
+
+    if name == 'orjson' and orjson:
+        loads, dumps = orjson.loads, _orjson_dumps
+    elif name == 'ujson' and ujson:
+        loads, dumps = ujson.loads, _ujson_dumps
+    elif name == 'json':
+        loads, dumps = json.loads, json.dumps
+    else:
+        raise ValueError('JSON backend must be one of {} and be '
+                         'installed'.format(', '.join(BACKENDS)))
+
+    backend = name
+    logger.debug('Using JSON backend: %s', backend)
+
+
+use()
@@ -1,22 +1,35 @@
+import asyncio
 import logging
 import os
+import time
 import yaml
 
-from collections import defaultdict
+from aiohttp.web import Response
 
-from sirbot.utils import merge_dict
+from sirbot.utils import ensure_future, merge_dict
 from sirbot.core import Plugin, registry
 
-from . import database, sync
+from . import codec, database, sync
 from .dispatcher import (EventDispatcher,
                          ActionDispatcher,
                          CommandDispatcher,
                          MessageDispatcher)
 from .__meta__ import DATA as METADATA
-from .api import RTMClient, HTTPClient
-from .errors import SlackSetupError
+from .api import APIPath, RTMClient, HTTPClient
+from .dedup import DedupIndex, SharedDedupIndex
+from .errors import SlackClientError, SlackSetupError
+from .executor import HandlerExecutor
+from .ingest import IngestQueue, event_key
+from .lanes import LANES, LaneScheduler
+from .metrics import APIMetrics
+from .ratelimit import RateLimiter
+from .replay import Recorder
+from .retry import CircuitBreaker, RetryPolicy, policies_from_config
+from .scheduler import OutboundScheduler
+from .serial import KeyedExecutor
 from .store import ChannelStore, UserStore, GroupStore, MessageStore
 from .store.user import User
+from .threads import SharedThreadRegistry, ThreadRegistry
 from .wrapper import SlackWrapper
 
 logger = logging.getLogger(__name__)
@@ -43,14 +56,27 @@ class SirBotSlack(Plugin):
         self._app_token = None
         self._verification_token = None
         self._rtm_client = None
+        self._rtm_queue = None
+        self._events_queue = None
+        self._rtm_last_seen = dict()
+        self._dedup = None
+        self._recorder = None
         self._http_client = None
+        self._rate_limiter = None
+        self._retry_policies = None
+        self._circuit_breaker = None
+        self._api_metrics = APIMetrics()
+        self._scheduler = None
+        self._lanes = None
+        self._executor = None
+        self._serial = None
         self._users = None
         self._channels = None
         self._groups = None
         self._messages = None
         self._pm = None
 
-        self._threads = defaultdict(dict)
+        self._threads = None
         self._dispatcher = dict()
         self._started = False
 
@@ -80,6 +106,10 @@ class SirBotSlack(Plugin):
             'SIRBOT_SLACK_VERIFICATION_TOKEN'
         )
 
+        api_root = os.environ.get('SIRBOT_SLACK_API_ROOT')
+        if api_root:
+            APIPath.set_root(api_root)
+
         if 'database' not in registry:
             raise SlackSetupError('A database is required')
 
@@ -98,26 +128,89 @@ class SirBotSlack(Plugin):
                 'SIRBOT_SLACK_VERIFICATION_TOKEN must be set'
             )
 
+        if self._config['rate_limit']['enabled']:
+            self._rate_limiter = RateLimiter(
+                loop=self._loop,
+                margin=self._config['rate_limit']['margin'],
+                burst=self._config['rate_limit']['burst'],
+                retries=self._config['rate_limit']['retries']
+            )
+
+        self._retry_policies = policies_from_config(self._config['retry'])
+
+        if self._config['circuit_breaker']['enabled']:
+            self._circuit_breaker = CircuitBreaker(
+                loop=self._loop,
+                threshold=self._config['circuit_breaker']['threshold'],
+                timeout=self._config['circuit_breaker']['timeout']
+            )
+
         self._http_client = HTTPClient(
             bot_token=self._bot_token,
             app_token=self._app_token,
             loop=self._loop,
-            session=self._session
+            session=self._session,
+            rate_limiter=self._rate_limiter,
+            retry_policies=self._retry_policies,
+            circuit_breaker=self._circuit_breaker,
+            metrics=self._api_metrics,
+            page_size=self._config['page_size']
+        )
+
+        # chat.postMessage is already paced by channel by the rate limiter
+        if self._rate_limiter is not None:
+            interval = 0
+        else:
+            interval = self._config['outbound']['interval']
+        self._scheduler = OutboundScheduler(
+            loop=self._loop,
+            interval=interval
         )
 
+        self._lanes = LaneScheduler(
+            loop=self._loop,
+            concurrency=self._config['lanes']['concurrency'],
+            limits={lane: self._config['lanes'][lane] for lane in LANES},
+            queue=self._config['lanes']['queue'] or None
+        )
+
+        self._executor = HandlerExecutor(
+            loop=self._loop,
+            threads=self._config['executor']['threads'],
+            processes=self._config['executor']['processes'] or None,
+            block_threshold=self._config['executor']['block_threshold']
+        )
+
+        self._serial = KeyedExecutor(
+            loop=self._loop,
+            workers=self._config['serial']['workers']
+        )
+
+        if self._config['threads']:
+            threads = SharedThreadRegistry \
+                if self._config['threads']['shared'] else ThreadRegistry
+            self._threads = threads(
+                loop=self._loop,
+                ttl=self._config['threads']['ttl'],
+                size=self._config['threads']['size']
+            )
+
         self._users = UserStore(
             client=self._http_client,
-            refresh=self._config['refresh']['user']
+            refresh=self._config['refresh']['user'],
+            cache_size=self._config['cache']['user']
         )
 
         self._channels = ChannelStore(
             client=self._http_client,
-            refresh=self._config['refresh']['channel']
+            refresh=self._config['refresh']['channel'],
+            cache_size=self._config['cache']['channel']
         )
 
         self._groups = GroupStore(
             client=self._http_client,
-            refresh=self._config['refresh']['group']
+            refresh=self._config['refresh']['group'],
+            cache_size=self._config['cache']['group']
         )
 
         self._messages = MessageStore(
@@ -137,9 +230,26 @@ class SirBotSlack(Plugin):
                 save=self._config['save']['messages'],
                 ping=self._config['ping'],
                 loop=self._loop,
-                threads=self._threads
+                threads=self._threads,
+                lanes=self._lanes,
+                executor=self._executor,
+                serial=self._serial
             )
 
+            if self._config['record']:
+                logger.info('Recording incoming events in %s',
+                            self._config['record'])
+                self._recorder = Recorder(self._config['record'])
+
+            if self._config['dedup']:
+                dedup = SharedDedupIndex \
+                    if self._config['dedup']['shared'] else DedupIndex
+                self._dedup = dedup(
+                    loop=self._loop,
+                    window=self._config['dedup']['window'],
+                    size=self._config['dedup']['size']
+                )
+
             self._dispatcher['event'] = EventDispatcher(
                 http_client=self._http_client,
                 users=self._users,
@@ -149,15 +259,54 @@ class SirBotSlack(Plugin):
                 loop=self._loop,
                 message_dispatcher=self._dispatcher['message'],
                 event_save=self._config['save']['events'],
-                token=self._verification_token
+                token=self._verification_token,
+                dedup=self._dedup,
+                recorder=self._recorder,
+                lanes=self._lanes,
+                executor=self._executor,
+                serial=self._serial,
+                skip_unhandled=self._config['skip_unhandled']
             )
 
+            if self._config['endpoints']['events']:
+                self._events_queue = IngestQueue(
+                    callback=self._dispatcher['event'].dispatch,
+                    loop=self._loop,
+                    workers=self._config['events_queue']['workers'],
+                    size=self._config['events_queue']['size'],
+                    overflow=self._config['events_queue']['overflow'],
+                    spill_path=self._config['events_queue']['spill']
+                )
+                self._dispatcher['event'].queue = self._events_queue
+
             if self._config['rtm']:
+                self._rtm_queue = IngestQueue(
+                    callback=self._incoming_rtm,
+                    loop=self._loop,
+                    workers=self._config['rtm_queue']['workers'],
+                    size=self._config['rtm_queue']['size'],
+                    overflow=self._config['rtm_queue']['overflow']
+                )
+
                 self._rtm_client = RTMClient(
                     bot_token=self._bot_token,
                     loop=self._loop,
-                    callback=self._incoming_rtm,
-                    session=self._session
+                    callback=self._incoming_rtm_frame,
+                    session=self._session,
+                    rate_limiter=self._rate_limiter,
+                    retry_policies=self._retry_policies,
+                    circuit_breaker=self._circuit_breaker,
+                    metrics=self._api_metrics,
+                    reconnect_policy=RetryPolicy(
+                        backoff=self._config['rtm_reconnect']['backoff'],
+                        max_backoff=self._config['rtm_reconnect'][
+                            'max_backoff']
+                    ),
+                    on_reconnect=self._rtm_reconnected,
+                    ping_interval=self._config['rtm_ping']['interval'],
+                    ping_timeout=self._config['rtm_ping']['timeout'],
+                    recorder=self._recorder,
+                    skip=self._dispatcher['event'].skip_raw
                 )
 
             if self._config['endpoints']['events']:
@@ -178,7 +327,9 @@ class SirBotSlack(Plugin):
                 plugins=self._pm,
                 loop=self._loop,
                 save=self._config['save']['actions'],
-                token=self._verification_token
+                token=self._verification_token,
+                lanes=self._lanes,
+                executor=self._executor
             )
 
             self._router.add_route(
@@ -198,7 +349,9 @@ class SirBotSlack(Plugin):
                 plugins=self._pm,
                 loop=self._loop,
                 save=self._config['save']['commands'],
-                token=self._verification_token
+                token=self._verification_token,
+                lanes=self._lanes,
+                executor=self._executor
             )
             self._router.add_route(
                 'POST',
@@ -206,6 +359,79 @@ class SirBotSlack(Plugin):
                 self._dispatcher['command'].incoming
             )
 
+        if self._config['endpoints']['metrics']:
+            logger.debug('Adding metrics endpoint: %s',
+                         self._config['endpoints']['metrics'])
+            self._router.add_route(
+                'GET',
+                self._config['endpoints']['metrics'],
+                self._metrics_endpoint
+            )
+
+    def metrics(self):
+        """
+        Snapshot of the plugin metrics
+
+        :return: Dictionary of metrics by component
+        :rtype: dict
+        """
+        metrics = {
+            'pid': os.getpid(),
+            'api': self._api_metrics.snapshot()
+        }
+
+        if self._rtm_client is not None:
+            metrics['rtm'] = self._rtm_client.snapshot()
+
+        if self._rtm_queue is not None:
+            metrics['rtm_queue'] = self._rtm_queue.snapshot()
+
+        if self._events_queue is not None:
+            metrics['events_queue'] = self._events_queue.snapshot()
+
+        if self._dedup is not None:
+            metrics['dedup'] = self._dedup.snapshot()
+
+        if self._users is not None:
+            metrics['stores'] = {
+                'user': self._users.snapshot(),
+                'channel': self._channels.snapshot(),
+                'group': self._groups.snapshot(),
+            }
+
+        if self._lanes is not None:
+            metrics['lanes'] = self._lanes.snapshot()
+
+        if self._threads is not None:
+            metrics['threads'] = self._threads.snapshot()
+
+        if self._executor is not None:
+            metrics['executor'] = self._executor.snapshot()
+
+        if self._serial is not None:
+            metrics['serial'] = self._serial.snapshot()
+
+        if 'event' in self._dispatcher:
+            metrics['events'] = self._dispatcher['event'].snapshot()
+
+        metrics['middlewares'] = {
+            name: dispatcher.middlewares_snapshot()
+            for name, dispatcher in self._dispatcher.items()
+        }
+
+        metrics['handlers'] = {
+            name: dispatcher.handlers_snapshot()
+            for name, dispatcher in self._dispatcher.items()
+        }
+
+        return metrics
+
+    async def _metrics_endpoint(self, request):
+        return Response(
+            text=codec.dumps(self.metrics()),
+            content_type='application/json'
+        )
+
     def factory(self):
         """
         Initialize and return the slack wrapper
@@ -221,7 +447,9 @@ class SirBotSlack(Plugin):
             messages=self._messages,
             bot=self.bot,
             threads=self._threads,
-            dispatcher=self._dispatcher
+            dispatcher=self._dispatcher,
+            scheduler=self._scheduler,
+            executor=self._executor
         )
 
     async def start(self):
@@ -233,27 +461,68 @@ class SirBotSlack(Plugin):
                                   ', '.join(SUPPORTED_DATABASE))
 
         await self._create_db_table()
+        self._executor.start()
 
-        slack = self.factory()
-        sync.add_to_slack(slack)
+        try:
+            if self._events_queue is not None:
+                self._events_queue.start()
 
-        if self._rtm_client:
-            data = await self._http_client.rtm_connect()
-            self.bot = await self._users.get(data['self']['id'])
-            self.bot.type = 'rtm'
-            self._dispatcher['message'].bot = self.bot
-            self._dispatcher['event'].bot = self.bot
-            await self._rtm_client.connect(url=data['url'])
-        else:
-            self.bot = User(id_='B000000000')
-            self.bot.type = 'event'
-            if 'message' in self._dispatcher:
+            slack = self.factory()
+            sync.add_to_slack(slack)
+
+            if self._rtm_client is not None:
+                data = await self._http_client.rtm_connect()
+                self.bot = await self._users.get(data['self']['id'])
+                self.bot.type = 'rtm'
                 self._dispatcher['message'].bot = self.bot
-            if 'event' in self._dispatcher:
                 self._dispatcher['event'].bot = self.bot
-            self._started = True
+                self._rtm_queue.start()
+                await self._rtm_client.connect(url=data['url'])
+            else:
+                self.bot = User(id_='B000000000')
+                self.bot.type = 'event'
+                if 'message' in self._dispatcher:
+                    self._dispatcher['message'].bot = self.bot
+                if 'event' in self._dispatcher:
+                    self._dispatcher['event'].bot = self.bot
+                self._started = True
 
-    async def _incoming_rtm(self, event):
+                # Run until the core cancels the plugin on shutdown
+                try:
+                    await self._loop.create_future()
+                except asyncio.CancelledError:
+                    pass
+        finally:
+            await self.stop()
+
+    async def stop(self):
+        """
+        Stop the plugin
+
+        Called when the plugin is cancelled by the core on shutdown.
+        """
+        logger.debug('Stopping slack plugin')
+
+        if self._rtm_queue is not None:
+            self._rtm_queue.stop()
+
+        if self._events_queue is not None:
+            self._events_queue.stop()
+
+        await self._lanes.stop(timeout=self._config['lanes']['drain'])
+        self._scheduler.stop()
+        self._executor.stop()
+
+        if self._recorder is not None:
+            self._recorder.close()
+
+    async def _incoming_rtm_frame(self, event):
+        """
+        Handle a frame of the RTM websocket.
+
+        Events are pushed to the RTM ingest queue, blocking the websocket
+        reader while the queue is full.
+        """
         try:
             msg_type = event.get('type', None)
 
@@ -262,12 +531,60 @@ class SirBotSlack(Plugin):
             elif self.started:
                 if msg_type in ('team_migration_started', 'goodbye'):
                     logger.debug('Bot needs to reconnect')
-                    await self._rtm_client.reconnect()
+                    ensure_future(self._rtm_client.reconnect(),
+                                  loop=self._loop, logger=logger)
                 else:
-                    await self._dispatcher['event'].incoming_rtm(event)
+                    if msg_type == 'message':
+                        self._rtm_seen(event)
+                    await self._rtm_queue.put(event, key=event_key(event))
         except Exception as e:
             logger.exception(e)
 
+    def _rtm_seen(self, event):
+        """
+        Keep track of the last message received in each channel
+        """
+        channel, ts = event.get('channel'), event.get('ts')
+        if channel and ts and \
+                float(ts) > float(self._rtm_last_seen.get(channel, 0)):
+            self._rtm_last_seen[channel] = ts
+
+    async def _rtm_reconnected(self):
+        if self._config['rtm_reconnect']['backfill']:
+            ensure_future(self._rtm_backfill(until=time.time()),
+                          loop=self._loop, logger=logger)
+
+    async def _rtm_backfill(self, until):
+        """
+        Query the messages missed while the RTM websocket was disconnected
+        and push them to the RTM ingest queue.
+
+        :param until: Timestamp of the reconnection. Later messages are
+        received on the websocket.
+        """
+        for channel, last_seen in list(self._rtm_last_seen.items()):
+            try:
+                messages = await self._http_client.get_history(
+                    channel, oldest=last_seen, latest=until
+                )
+            except SlackClientError as e:
+                logger.warning('Failed to backfill channel %s: %s',
+                               channel, e)
+                continue
+
+            if messages:
+                logger.debug('Backfilling %s messages in %s',
+                             len(messages), channel)
+
+            for message in messages:
+                message.setdefault('type', 'message')
+                message['channel'] = channel
+                self._rtm_seen(message)
+                await self._rtm_queue.put(message, key=channel)
+
+    async def _incoming_rtm(self, event):
+        await self._dispatcher['event'].incoming_rtm(event)
+
     async def database_update(self, metadata, db):
 
         if metadata['version'] == '0.0.5':
@@ -1,6 +1,7 @@
 # flake8: noqa
 
-from . import user, channel, group, update, dispatcher, message
+from . import user, channel, group, update, dispatcher, message, dedup, \
+    thread
 
 
 async def create_table(db):
@@ -73,3 +74,18 @@ async def create_table(db):
     raw TEXT,
     PRIMARY KEY (ts, to_id, from_id)
     )''')
+
+    await db.execute('''CREATE TABLE IF NOT EXISTS slack_dedup (
+    key TEXT PRIMARY KEY NOT NULL,
+    seen_at REAL
+    )''')
+
+    await db.execute('''CREATE TABLE IF NOT EXISTS slack_threads (
+    thread TEXT,
+    user_id TEXT,
+    token TEXT,
+    callback TEXT,
+    serial TEXT,
+    expires_at REAL,
+    PRIMARY KEY (thread, user_id)
+    )''')
@@ -1,6 +1,7 @@
-import json
 import logging
 
+from ... import codec
+
 logger = logging.getLogger(__name__)
 
 
@@ -14,7 +15,7 @@ async def add(db, channel):
            is_member, is_archived, raw, last_update) VALUES (?, ?, ?, ?, ?, ?)
         ''', (
             channel.id, channel.name, channel.member, channel.archived,
-            json.dumps(channel.raw), channel.last_update)
+            codec.dumps(channel.raw), channel.last_update)
     )
 
 
@@ -0,0 +1,22 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+async def add(db, key, now, window):
+    """
+    Remember a deduplication key
+
+    :return: False if the key was already seen in the time window
+    """
+    await db.execute('''DELETE FROM slack_dedup
+                        WHERE key = ? AND seen_at < ?''',
+                     (key, now - window))
+    await db.execute('''INSERT OR IGNORE INTO slack_dedup (key, seen_at)
+                        VALUES (?, ?)''', (key, now))
+    return db.cursor.rowcount == 1
+
+
+async def expire(db, limit):
+    await db.execute('''DELETE FROM slack_dedup WHERE seen_at < ?''',
+                     (limit,))
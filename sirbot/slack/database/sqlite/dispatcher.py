@@ -1,6 +1,7 @@
-import json
 import logging
 
+from ... import codec
+
 logger = logging.getLogger(__name__)
 
 
@@ -9,8 +10,8 @@ async def save_incoming_action(db, action):
                         (ts, to_id, from_id, callback_id, action, raw)
                         VALUES (?, ?, ?, ?, ?, ?)''',
                      (action.ts, action.to.id, action.frm.id,
-                      action.callback_id, json.dumps(action.action),
-                      json.dumps(action.raw))
+                      action.callback_id, codec.dumps(action.action),
+                      codec.dumps(action.raw))
                      )
 
 
@@ -20,14 +21,14 @@ async def save_incoming_command(db, command):
                         (? ,?, ?, ?, ?, ?)''',
                      (command.timestamp, command.to.id,
                       command.frm.id, command.command, command.text,
-                      json.dumps(command.raw))
+                      codec.dumps(command.raw))
                      )
 
 
 async def save_incoming_event(db, ts, user, event):
     await db.execute('''INSERT INTO slack_events (ts, from_id, type, raw)
                         VALUES (?, ?, ?, ?)''',
-                     (ts, user, event['type'], json.dumps(event))
+                     (ts, user, event['type'], codec.dumps(event))
                      )
 
 
@@ -40,12 +41,12 @@ async def save_incoming_message(db, message):
                      (message.timestamp, message.frm.id, message.to.id,
                       message.subtype, message.thread,
                       message.mention, message.text,
-                      json.dumps(message.raw))
+                      codec.dumps(message.raw))
                      )
 
 
 async def update_raw(db, message):
     await db.execute('''UPDATE slack_messages SET raw=?
                         WHERE ts=?''',
-                     (json.dumps(message.raw), message.timestamp)
+                     (codec.dumps(message.raw), message.timestamp)
                      )
@@ -1,6 +1,7 @@
-import json
 import logging
 
+from ... import codec
+
 logger = logging.getLogger(__name__)
 
 
@@ -9,7 +10,7 @@ async def add(db, group):
         '''INSERT OR REPLACE INTO slack_channels (id, name, is_archived, raw,
          last_update) VALUES (?, ?, ?, ?, ?)
         ''', (
-            group.id, group.name, group.archived, json.dumps(group.raw),
+            group.id, group.name, group.archived, codec.dumps(group.raw),
             group.last_update)
     )
 
@@ -1,6 +1,7 @@
-import json
 import logging
 
+from ... import codec
+
 logger = logging.getLogger(__name__)
 
 
@@ -15,7 +16,7 @@ async def get_thread(db, thread_ts, limit):
                             ORDER BY ts DESC''', (thread_ts,))
 
     messages = await db.fetchall()
-    data = [{'raw': json.loads(message['raw'])} for message in messages]
+    data = [{'raw': codec.loads(message['raw'])} for message in messages]
     return data
 
 
@@ -25,5 +26,5 @@ async def get_channel(db, channel_id, since, until):
                         ORDER BY ts DESC''', (channel_id, since, until))
 
     messages = await db.fetchall()
-    data = [{'raw': json.loads(message['raw'])} for message in messages]
+    data = [{'raw': codec.loads(message['raw'])} for message in messages]
     return data
@@ -0,0 +1,40 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+async def add(db, thread, user_id, token, callback, serial, expires_at):
+    await db.execute('''INSERT OR REPLACE INTO slack_threads
+                        (thread, user_id, token, callback, serial, expires_at)
+                        VALUES (?, ?, ?, ?, ?, ?)''',
+                     (thread, user_id, token, callback, serial, expires_at))
+
+
+async def find(db, thread, user_id, now):
+    """
+    Callbacks of a user in a thread, the ones registered for every user of
+    the thread last
+    """
+    await db.execute('''SELECT * FROM slack_threads
+                        WHERE thread = ? AND user_id IN (?, 'all')
+                        AND (expires_at IS NULL OR expires_at > ?)
+                        ORDER BY user_id = 'all' ''',
+                     (thread, user_id, now))
+    return await db.fetchall()
+
+
+async def delete(db, thread, user_id, token):
+    """
+    Remove a callback
+
+    :return: False if the callback was already removed or replaced
+    """
+    await db.execute('''DELETE FROM slack_threads
+                        WHERE thread = ? AND user_id = ? AND token = ?''',
+                     (thread, user_id, token))
+    return db.cursor.rowcount == 1
+
+
+async def expire(db, now):
+    await db.execute('''DELETE FROM slack_threads WHERE expires_at < ?''',
+                     (now,))
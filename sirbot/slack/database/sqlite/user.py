@@ -1,6 +1,7 @@
-import json
 import logging
 
+from ... import codec
+
 logger = logging.getLogger(__name__)
 
 
@@ -11,7 +12,7 @@ async def add(db, user, dm_id=True):
             '''INSERT OR REPLACE INTO slack_users
              (id, dm_id, admin, raw, last_update, deleted)
              VALUES (?, ?, ?, ?, ?, ?)''',
-            (user.id, user.dm_id, user.admin, json.dumps(user.raw),
+            (user.id, user.dm_id, user.admin, codec.dumps(user.raw),
              user.last_update, user.deleted))
     else:
         await db.execute(
@@ -21,7 +22,7 @@ async def add(db, user, dm_id=True):
                 (SELECT dm_id FROM slack_users WHERE id=?),
                 ?, ?, ?, ?, ?
              )'''.format(user.id),
-            (user.id, user.id, user.admin, json.dumps(user.raw),
+            (user.id, user.id, user.admin, codec.dumps(user.raw),
              user.last_update, user.deleted))
 
 
@@ -45,6 +46,26 @@ async def get_all(db, deleted=False):
     return users
 
 
+async def iter_all(db, deleted=False, size=200):
+    """
+    Iterate over the users, fetching ``size`` rows at a time
+    """
+    filter_ = ''
+    if not deleted:
+        filter_ = 'WHERE deleted=0'
+
+    await db.execute('''SELECT * FROM slack_users {filter}'''.format(
+        filter=filter_))
+
+    while True:
+        users = await db.fetchmany(size)
+        if not users:
+            break
+
+        for user in users:
+            yield user
+
+
 async def find(db, id_):
     await db.execute('''SELECT id, dm_id, raw, last_update, deleted
                         FROM slack_users WHERE id = ?''',
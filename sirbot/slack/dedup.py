@@ -0,0 +1,152 @@
+import collections
+import logging
+import time
+
+from sirbot.core import registry
+
+from . import codec, database
+
+logger = logging.getLogger(__name__)
+
+
+def event_keys(event, event_id=None):
+    """
+    Deduplication keys of an incoming event
+
+    :param event: Event payload
+    :param event_id: Events API ``event_id`` of the event
+    :return: List of keys
+    """
+    keys = list()
+
+    if event_id:
+        keys.append(event_id)
+
+    ts = event.get('ts') or event.get('event_ts')
+    if ts:
+        channel = event.get('channel')
+        if isinstance(channel, dict):
+            channel = channel.get('id')
+        keys.append((event.get('type'), channel, ts, event.get('subtype')))
+
+    return keys
+
+
+class DedupIndex:
+    """
+    Bounded, time windowed index of the already seen events.
+
+    :param loop: Event loop
+    :param window: Time in seconds an event is remembered
+    :param size: Maximum number of remembered events
+    """
+
+    def __init__(self, loop, window=600, size=50000):
+        self._loop = loop
+        self._window = window
+        self._size = size
+        self._seen = collections.OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._seen)
+
+    def seen(self, keys):
+        """
+        Check if an event was already seen and remember it
+
+        :param keys: Deduplication keys of the event
+        :return: True if any of the keys was seen in the time window
+        """
+        if not keys:
+            return False
+
+        now = self._loop.time()
+        self._expire(now)
+
+        if any(key in self._seen for key in keys):
+            self.hits += 1
+            return True
+
+        self.misses += 1
+        for key in keys:
+            self._seen[key] = now
+
+        while len(self._seen) > self._size:
+            self._seen.popitem(last=False)
+
+        return False
+
+    async def check(self, keys):
+        """
+        Check if an event was already seen and remember it
+
+        :param keys: Deduplication keys of the event
+        :return: True if any of the keys was seen in the time window
+        """
+        return self.seen(keys)
+
+    def _expire(self, now):
+        limit = now - self._window
+        while self._seen:
+            key, seen_at = next(iter(self._seen.items()))
+            if seen_at >= limit:
+                break
+            del self._seen[key]
+
+    def snapshot(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self._seen),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0,
+        }
+
+
+class SharedDedupIndex(DedupIndex):
+    """
+    Deduplication index shared by the worker processes through the database.
+
+    The keys are first checked against the in-memory index of the worker,
+    then remembered in the database where the keys stored by the other
+    workers are found.
+
+    :param loop: Event loop
+    :param window: Time in seconds an event is remembered
+    :param size: Maximum number of events remembered in memory
+    """
+
+    def __init__(self, loop, window=600, size=50000):
+        super().__init__(loop, window, size)
+        self._expired_at = time.time()
+
+    async def check(self, keys):
+        if not keys:
+            return False
+        elif self.seen(keys):
+            return True
+
+        db = registry.get('database')
+        now = time.time()
+        seen = False
+        for key in keys:
+            added = await database.__dict__[db.type].dedup.add(
+                db, codec.dumps(key), now, self._window
+            )
+            seen = seen or not added
+
+        if now - self._expired_at > self._window:
+            await database.__dict__[db.type].dedup.expire(
+                db, now - self._window
+            )
+            self._expired_at = now
+
+        await db.commit()
+
+        if seen:
+            self.misses -= 1
+            self.hits += 1
+        return seen
@@ -1,14 +1,11 @@
-import asyncio
 import inspect
-import json
 import logging
 
 from aiohttp.web import Response
 from sirbot.core import registry
-from sirbot.utils import ensure_future
 
 from .dispatcher import SlackDispatcher
-from .. import database
+from .. import codec, database
 from ..errors import SlackUnknownAction
 from ..store.message.action import SlackAction
 
@@ -17,7 +14,7 @@ logger = logging.getLogger(__name__)
 
 class ActionDispatcher(SlackDispatcher):
     def __init__(self, http_client, users, channels, groups, plugins,
-                 save, loop, token):
+                 save, loop, token, lanes=None, executor=None):
 
         super().__init__(
             http_client=http_client,
@@ -26,7 +23,9 @@ class ActionDispatcher(SlackDispatcher):
             groups=groups,
             plugins=plugins,
             save=save,
-            loop=loop
+            loop=loop,
+            lanes=lanes,
+            executor=executor
         )
 
         self._token = token
@@ -37,13 +36,18 @@ class ActionDispatcher(SlackDispatcher):
         if 'payload' not in data:
             return Response(text='Invalid', status=400)
 
-        payload = json.loads(data['payload'])
+        payload = codec.loads(data['payload'])
 
         if 'token' not in payload or payload['token'] != self._token:
             return Response(text='Invalid', status=400)
 
         logger.debug('Action handler received: %s', payload)
 
+        if self._middlewares:
+            payload = await self._run_middlewares(payload)
+            if payload is None:
+                return Response(status=200)
+
         slack = registry.get('slack')
         settings = self._endpoints.get(payload['callback_id'])
 
@@ -62,26 +66,26 @@ class ActionDispatcher(SlackDispatcher):
                 db, action)
             await db.commit()
 
-        coroutine = settings['func'](action, slack)
-        ensure_future(coroutine=coroutine, loop=self._loop, logger=logger)
+        self._run_handler('interactive', settings['func'], action, slack)
 
         if settings.get('public'):
             return Response(
                 status=200,
-                body=json.dumps({"response_type": "in_channel"}),
+                body=codec.dumps({"response_type": "in_channel"}),
                 content_type='application/json; charset=utf-8'
             )
         else:
             return Response(status=200)
 
-    def register(self, id_, func, public=False):
+    def register(self, id_, func, public=False, concurrency=None,
+                 timeout=None, overflow='queue', executor=None):
         logger.debug('Registering action: %s, %s from %s',
                      id_,
                      func.__name__,
                      inspect.getabsfile(func))
 
-        if not asyncio.iscoroutinefunction(func):
-            func = asyncio.coroutine(func)
+        func = self._wrap(func, executor)
 
+        func = self._guard(func, concurrency, timeout, overflow)
         settings = {'func': func, 'public': public}
         self._endpoints[id_] = settings
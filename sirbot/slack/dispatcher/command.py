@@ -1,10 +1,8 @@
-import asyncio
 import inspect
 import logging
 
 from aiohttp.web import Response
 from sirbot.core import registry
-from sirbot.utils import ensure_future
 
 from .dispatcher import SlackDispatcher
 from .. import database
@@ -16,7 +14,7 @@ logger = logging.getLogger(__name__)
 
 class CommandDispatcher(SlackDispatcher):
     def __init__(self, http_client, users, channels, groups, plugins,
-                 save, loop, token):
+                 save, loop, token, lanes=None, executor=None):
 
         super().__init__(
             http_client=http_client,
@@ -25,20 +23,27 @@ class CommandDispatcher(SlackDispatcher):
             groups=groups,
             plugins=plugins,
             save=save,
-            loop=loop
+            loop=loop,
+            lanes=lanes,
+            executor=executor
         )
 
         self._token = token
 
     async def _incoming(self, request):
-        data = await request.post()
-        data = {**data}
+        # The form data is immutable, the middlewares get a mutable copy
+        data = dict(await request.post())
 
         if data['token'] != self._token:
             return Response(text='Invalid')
 
         logger.debug('Command handler received: %s', data['command'])
 
+        if self._middlewares:
+            data = await self._run_middlewares(data)
+            if data is None:
+                return Response(status=200)
+
         slack = registry.get('slack')
         func = self._endpoints.get(data['command'])
 
@@ -56,17 +61,17 @@ class CommandDispatcher(SlackDispatcher):
                 db, command)
             await db.commit()
 
-        coroutine = func(command, slack)
-        ensure_future(coroutine=coroutine, loop=self._loop, logger=logger)
+        self._run_handler('interactive', func, command, slack)
         return Response(status=200)
 
-    def register(self, command, func):
+    def register(self, command, func, concurrency=None, timeout=None,
+                 overflow='queue', executor=None):
         logger.debug('Registering slash command: %s, %s from %s',
                      command,
                      func.__name__,
                      inspect.getabsfile(func))
 
-        if not asyncio.iscoroutinefunction(func):
-            func = asyncio.coroutine(func)
+        func = self._wrap(func, executor)
 
-        self._endpoints[command] = func
+        self._endpoints[command] = self._guard(func, concurrency, timeout,
+                                               overflow)
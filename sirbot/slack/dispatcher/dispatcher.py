@@ -1,6 +1,11 @@
+import asyncio
 import logging
 
 from aiohttp.web import Response
+from sirbot.utils import ensure_future
+
+from .guard import HandlerGuard
+from .middleware import Middleware
 
 logger = logging.getLogger(__name__)
 
@@ -8,7 +13,7 @@ logger = logging.getLogger(__name__)
 class SlackDispatcher:
 
     def __init__(self, http_client, users, channels, groups, plugins,
-                 loop, save=None):
+                 loop, save=None, lanes=None, executor=None, serial=None):
 
         if not save:
             save = list()
@@ -20,8 +25,13 @@ class SlackDispatcher:
         self._channels = channels
         self._groups = groups
         self._http_client = http_client
+        self._lanes = lanes
+        self._executor = executor
+        self._serial = serial
 
         self._endpoints = dict()
+        self._guards = list()
+        self._middlewares = list()
 
     async def incoming(self, item):
         try:
@@ -34,5 +44,97 @@ class SlackDispatcher:
     async def _incoming(self, item):
         pass
 
+    def _wrap(self, func, executor=None):
+        """
+        Make a coroutine function of a handler
+
+        Synchronous handlers registered with an ``executor`` are run in the
+        thread or process pool when an executor is configured.
+        """
+        if self._executor is not None:
+            return self._executor.wrap(func, executor)
+        elif not asyncio.iscoroutinefunction(func):
+            return asyncio.coroutine(func)
+        return func
+
+    def _guard(self, func, concurrency=None, timeout=None, overflow='queue'):
+        """
+        Wrap a handler in a :class:`HandlerGuard` when limits are set
+
+        :param func: Coroutine function of the handler
+        :param concurrency: Maximum number of concurrent invocations
+        :param timeout: Maximum execution time in seconds
+        :param overflow: ``queue`` or ``shed`` the invocations over the
+        concurrency limit
+        :return: Handler
+        """
+        if not concurrency and not timeout:
+            return func
+
+        guard = HandlerGuard(func, loop=self._loop, concurrency=concurrency,
+                             timeout=timeout, overflow=overflow)
+        self._guards.append(guard)
+        return guard
+
+    def add_middleware(self, func, fail_open=False):
+        """
+        Append a middleware to the chain run on the raw incoming payloads
+        before routing
+
+        :param func: Function or coroutine function called with the payload,
+        returning the payload to dispatch or None to drop it
+        :param fail_open: Dispatch the payload when the middleware raises
+        instead of dropping it
+        """
+        logger.debug('Registering middleware: %s', func.__name__)
+        self._middlewares.append(Middleware(func, fail_open=fail_open))
+
+    async def _run_middlewares(self, payload):
+        """
+        Run the middleware chain on a payload
+
+        :param payload: Raw incoming payload
+        :return: Payload to dispatch or None if a middleware dropped it
+        """
+        for middleware in self._middlewares:
+            payload = await middleware(payload)
+            if payload is None:
+                logger.debug('Payload dropped by middleware %s',
+                             middleware.name)
+                return None
+
+        return payload
+
+    def middlewares_snapshot(self):
+        return {middleware.name: middleware.snapshot()
+                for middleware in self._middlewares}
+
+    def handlers_snapshot(self):
+        return {guard.name: guard.snapshot() for guard in self._guards}
+
+    def _run_handler(self, lane, func, *args, key=None):
+        """
+        Run a handler in the background, in its lane when a lane scheduler
+        is configured
+
+        Invocations with a key are run after the previous invocations sharing
+        the same key.
+
+        :param lane: Lane of the handler
+        :param func: Handler
+        :param args: Arguments of the handler
+        :param key: Ordering key of the invocation
+        """
+        if key is not None and self._serial is not None:
+            if self._lanes is not None:
+                self._serial.submit(key, self._lanes.run, lane, func, *args)
+            else:
+                self._serial.submit(key, func, *args)
+        elif self._lanes is not None:
+            self._lanes.submit(lane, func, *args)
+        else:
+            ensure_future(coroutine=func(*args), loop=self._loop,
+                          logger=logger)
+
     def register(self):
         pass
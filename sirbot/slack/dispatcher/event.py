@@ -1,16 +1,18 @@
-import asyncio
 import inspect
-import json
 import logging
+import re
 import time
-from collections import defaultdict
+from collections import Counter, defaultdict
 
 from aiohttp.web import Response
 from sirbot.core import registry
 from sirbot.utils import ensure_future
 
 from .dispatcher import SlackDispatcher
-from .. import database
+from .. import codec, database
+from ..dedup import event_keys
+from ..ingest import event_key
+from ..serial import check_serial, serial_key
 
 logger = logging.getLogger(__name__)
 
@@ -18,10 +20,42 @@ logger = logging.getLogger(__name__)
 IGNORING = ['channel_join', 'channel_leave', 'bot_message']
 SUBTYPE_TO_EVENT = ['message_changed', 'message_deleted']
 
+# Always dispatched: messages and the RTM connection management frames
+ALWAYS_DISPATCHED = ['message', 'hello', 'goodbye', 'team_migration_started',
+                     'pong']
+
+EVENT_TYPE = re.compile(r'"type"\s*:\s*"([^"]+)"')
+JSON_TOKEN = re.compile(r'"(?:[^"\\]|\\.)*"|[{}\[\]]')
+
+
+def raw_event_type(raw):
+    """
+    Top level ``type`` of a JSON encoded event, without decoding it
+
+    The frame is only scanned up to the top level ``type`` key.
+
+    :param raw: JSON encoded event
+    :return: Type of the event or None
+    """
+    depth = 0
+    for token in JSON_TOKEN.finditer(raw):
+        value = token.group()
+        if value in ('{', '['):
+            depth += 1
+        elif value in ('}', ']'):
+            depth -= 1
+        elif depth == 1 and value == '"type"':
+            match = EVENT_TYPE.match(raw, token.start())
+            if match:
+                return match.group(1)
+    return None
+
 
 class EventDispatcher(SlackDispatcher):
     def __init__(self, http_client, users, channels, groups, plugins,
-                 event_save, message_dispatcher, loop, token):
+                 event_save, message_dispatcher, loop, token, dedup=None,
+                 recorder=None, lanes=None, executor=None, serial=None,
+                 skip_unhandled=True):
 
         super().__init__(
             http_client=http_client,
@@ -30,13 +64,25 @@ class EventDispatcher(SlackDispatcher):
             groups=groups,
             plugins=plugins,
             save=event_save,
-            loop=loop
+            loop=loop,
+            lanes=lanes,
+            executor=executor,
+            serial=serial
         )
 
         self._endpoints = defaultdict(list)
         self._message_dispatcher = message_dispatcher
         self._token = token
+        self._dedup = dedup
+        self._recorder = recorder
+        self._skip_unhandled = skip_unhandled
+        self._wanted = set(ALWAYS_DISPATCHED)
+        if isinstance(self._save, list):
+            self._wanted.update(self._save)
+
         self.bot = None
+        self.queue = None
+        self.skipped = Counter()
 
     async def incoming(self, item):
         pass
@@ -44,41 +90,112 @@ class EventDispatcher(SlackDispatcher):
     async def incoming_rtm(self, event):
 
         try:
-            if event['type'] == 'message':
-                await self._incoming_message(event)
-            else:
-                await self._incoming(event)
+            if self.skip(event['type']) or await self._duplicate(event):
+                return
+
+            await self.dispatch(event)
         except Exception as e:
             logger.exception(e)
 
     async def incoming_web(self, request):
-        payload = await request.json()
+        payload = await request.json(loads=codec.loads)
 
         if payload['token'] != self._token:
             return Response(text='Invalid')
 
+        if self._recorder is not None:
+            self._recorder.record('events', codec.dumps(
+                {k: v for k, v in payload.items() if k != 'token'}
+            ))
+
         if payload['type'] == 'url_verification':
-            body = json.dumps({'challenge': payload['challenge']})
+            body = codec.dumps({'challenge': payload['challenge']})
             return Response(body=body, status=200)
 
+        retry = request.headers.get('X-Slack-Retry-Num')
+        if retry:
+            logger.debug('Events API retry #%s: %s', retry,
+                         request.headers.get('X-Slack-Retry-Reason'))
+
         try:
-            if payload['event']['type'] == 'message':
-                ensure_future(
-                    self._incoming_message(payload['event']),
-                    loop=self._loop,
-                    logger=logger
-                )
+            event = payload['event']
+            if self.skip(event['type']) or \
+                    await self._duplicate(event, payload.get('event_id')):
+                return Response(status=200)
+
+            if self.queue:
+                await self.queue.put(event, key=event_key(event))
             else:
-                ensure_future(
-                    self._incoming(payload['event']),
-                    loop=self._loop,
-                    logger=logger
-                )
+                ensure_future(self.dispatch(event), loop=self._loop,
+                              logger=logger)
             return Response(status=200)
         except Exception as e:
             logger.exception(e)
             return Response(status=500)
 
+    async def dispatch(self, event):
+        """
+        Dispatch an Events API event
+
+        :param event: Event to dispatch
+        """
+        if self._middlewares:
+            event = await self._run_middlewares(event)
+            if event is None:
+                return
+
+        if event['type'] == 'message':
+            await self._incoming_message(event)
+        else:
+            await self._incoming(event)
+
+    def skip(self, event_type):
+        """
+        Check if an event has no handler and is not saved
+
+        :param event_type: Type of the event
+        :return: True if the event can be dropped
+        """
+        if not self._skip_unhandled or self._save is True \
+                or event_type in self._wanted:
+            return False
+
+        self.skipped[event_type] += 1
+        return True
+
+    def skip_raw(self, raw):
+        """
+        Check if a JSON encoded event can be dropped without decoding it.
+
+        The frame is only dropped when none of the ``type`` keys it contains
+        is wanted, nested ones included.
+
+        :param raw: JSON encoded event
+        :return: True if the event can be dropped
+        """
+        if not self._skip_unhandled or self._save is True:
+            return False
+
+        types = EVENT_TYPE.findall(raw)
+        if not types or any(type_ in self._wanted for type_ in types):
+            return False
+
+        self.skipped[raw_event_type(raw) or types[0]] += 1
+        return True
+
+    def snapshot(self):
+        return {
+            'skipped': sum(self.skipped.values()),
+            'skipped_by_type': dict(self.skipped),
+        }
+
+    async def _duplicate(self, event, event_id=None):
+        if self._dedup is not None and \
+                await self._dedup.check(event_keys(event, event_id)):
+            logger.debug('Ignoring duplicate event: %s', event)
+            return True
+        return False
+
     async def _incoming_message(self, event):
         subtype = event.get('subtype') or event.get('message', {}).get(
             'subtype', 'message')
@@ -100,20 +217,40 @@ class EventDispatcher(SlackDispatcher):
             db = registry.get('database')
             await self._store_incoming(event, db)
 
-        for func in self._endpoints.get(event['type'], list()):
-            f = func(event, slack)
-            ensure_future(coroutine=f, loop=self._loop, logger=logger)
+        for func, serial in self._endpoints.get(event['type'], list()):
+            key = self._serial_key(event, serial)
+            self._run_handler('events', func, event, slack, key=key)
+
+    @staticmethod
+    def _serial_key(event, serial):
+        if not serial:
+            return None
+
+        user = event.get('user')
+        if isinstance(user, dict):
+            user = user.get('id')
+
+        item = event.get('item') or event.get('message') or dict()
+        thread = event.get('thread_ts') or item.get('thread_ts') \
+            or item.get('ts') or event.get('ts')
+
+        return serial_key(serial, event_key(event), thread, user)
 
-    def register(self, event, func):
+    def register(self, event, func, concurrency=None, timeout=None,
+                 overflow='queue', serial=None, executor=None):
+
+        check_serial(serial)
 
         logger.debug('Registering event: %s, %s from %s',
                      event,
                      func.__name__,
                      inspect.getabsfile(func))
 
-        if not asyncio.iscoroutinefunction(func):
-            func = asyncio.coroutine(func)
-        self._endpoints[event].append(func)
+        func = self._wrap(func, executor)
+
+        func = self._guard(func, concurrency, timeout, overflow)
+        self._endpoints[event].append((func, serial))
+        self._wanted.add(event)
 
     async def _store_incoming(self, event, db):
         """
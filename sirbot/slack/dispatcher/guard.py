@@ -0,0 +1,98 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ('queue', 'shed')
+
+
+class HandlerGuard:
+    """
+    Limit the concurrent invocations and the execution time of a handler.
+
+    When ``concurrency`` invocations are running new ones wait for a free
+    slot (``queue``) or are dropped (``shed``). An invocation running longer
+    than ``timeout`` seconds is cancelled.
+
+    :param func: Coroutine function of the handler
+    :param loop: Event loop
+    :param concurrency: Maximum number of concurrent invocations (None for no
+    limit)
+    :param timeout: Maximum execution time in seconds (None for no limit)
+    :param overflow: ``queue`` or ``shed``
+    """
+
+    def __init__(self, func, loop, concurrency=None, timeout=None,
+                 overflow='queue'):
+
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError('overflow must be one of {}'.format(
+                ', '.join(OVERFLOW_POLICIES)))
+
+        self._func = func
+        self._loop = loop
+        self._concurrency = concurrency
+        self._timeout = timeout
+        self._overflow = overflow
+        self._semaphore = None
+        if concurrency:
+            self._semaphore = asyncio.Semaphore(concurrency, loop=loop)
+
+        self.name = '{}.{}'.format(func.__module__,
+                                   getattr(func, '__qualname__',
+                                           func.__name__))
+        self.calls = 0
+        self.running = 0
+        self.queued = 0
+        self.shed = 0
+        self.cancelled = 0
+
+    def __getattr__(self, item):
+        return getattr(self._func, item)
+
+    async def __call__(self, *args, **kwargs):
+        self.calls += 1
+
+        if not self._semaphore:
+            return await self._run(*args, **kwargs)
+        elif self._overflow == 'shed' and self.running >= self._concurrency:
+            self.shed += 1
+            logger.warning('Handler %s at its concurrency limit (%s), '
+                           'dropping the call', self.name, self._concurrency)
+            return
+
+        self.queued += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+
+        try:
+            return await self._run(*args, **kwargs)
+        finally:
+            self._semaphore.release()
+
+    async def _run(self, *args, **kwargs):
+        self.running += 1
+        try:
+            if not self._timeout:
+                return await self._func(*args, **kwargs)
+
+            try:
+                return await asyncio.wait_for(self._func(*args, **kwargs),
+                                              self._timeout, loop=self._loop)
+            except asyncio.TimeoutError:
+                self.cancelled += 1
+                logger.warning('Handler %s cancelled after %ss', self.name,
+                               self._timeout)
+        finally:
+            self.running -= 1
+
+    def snapshot(self):
+        return {
+            'calls': self.calls,
+            'running': self.running,
+            'queued': self.queued,
+            'shed': self.shed,
+            'cancelled': self.cancelled,
+        }
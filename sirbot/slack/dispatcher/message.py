@@ -1,15 +1,14 @@
-import asyncio
 import inspect
 import logging
-import re
-from collections import defaultdict
 from sqlite3 import IntegrityError
 
 from sirbot.core import registry
-from sirbot.utils import ensure_future
 
 from .dispatcher import SlackDispatcher
+from .router import MessageRouter
 from .. import database
+from ..ingest import event_key
+from ..serial import check_serial, serial_key
 from ..store.channel import Channel
 from ..store.group import Group
 from ..store.message import SlackMessage
@@ -19,7 +18,8 @@ logger = logging.getLogger(__name__)
 
 class MessageDispatcher(SlackDispatcher):
     def __init__(self, http_client, users, channels, groups, plugins,
-                 threads, save, loop, ping):
+                 threads, save, loop, ping, lanes=None, executor=None,
+                 serial=None):
 
         super().__init__(
             http_client=http_client,
@@ -28,12 +28,15 @@ class MessageDispatcher(SlackDispatcher):
             groups=groups,
             plugins=plugins,
             save=save,
-            loop=loop
+            loop=loop,
+            lanes=lanes,
+            executor=executor,
+            serial=serial
         )
 
         self.bot = None
         self._threads = threads
-        self._endpoints = defaultdict(list)
+        self._router = MessageRouter()
 
         if ping:
             self._ping_emoji = ping
@@ -44,15 +47,22 @@ class MessageDispatcher(SlackDispatcher):
         Handler for the incoming events of type 'message'
 
         Create a message object from the incoming message and sent it
-        to the plugins
+        to the plugins. The middlewares are run on the raw message first.
+        The author and channel of the message are only
+        queried from the stores when a handler matches.
 
         :param msg: incoming message
         :return:
         """
         logger.debug('Message handler received %s', msg)
 
+        if self._middlewares:
+            msg = await self._run_middlewares(msg)
+            if msg is None:
+                return
+
         slack = registry.get('slack')
-        message = await SlackMessage.from_raw(msg, slack)
+        message = await SlackMessage.from_raw(msg, slack, resolve=False)
 
         if not message.frm:  # Message without frm (i.e: slackbot)
             logger.debug('Ignoring message without frm')
@@ -91,24 +101,29 @@ class MessageDispatcher(SlackDispatcher):
         await db.commit()
 
     def register(self, match, func, flags=0, mention=False, admin=False,
-                 channel_id='*'):
+                 channel_id='*', concurrency=None, timeout=None,
+                 overflow='queue', serial=None, executor=None):
+
+        check_serial(serial)
 
         logger.debug('Registering message: %s, %s from %s',
                      match,
                      func.__name__,
                      inspect.getabsfile(func))
 
-        if not asyncio.iscoroutinefunction(func):
-            func = asyncio.coroutine(func)
+        func = self._wrap(func, executor)
+
+        func = self._guard(func, concurrency, timeout, overflow)
 
         option = {
             'func': func,
             'mention': mention,
             'admin': admin,
-            'channel_id': channel_id
+            'channel_id': channel_id,
+            'serial': serial
         }
 
-        self._endpoints[re.compile(match, flags)].append(option)
+        self._router.add(match, flags, option)
 
     async def _dispatch(self, msg, slack):
         """
@@ -120,58 +135,44 @@ class MessageDispatcher(SlackDispatcher):
         """
         handlers = list()
 
-        if msg.thread in self._threads:
-            handlers.extend(self._find_thread_handlers(msg))
+        if self._threads is not None and msg.thread:
+            handlers.extend(await self._find_thread_handlers(msg))
 
-        handlers.extend(self._find_handlers(msg))
+        matches = self._find_handlers(msg)
+        if not handlers and not matches:
+            return
 
-        for func in handlers:
-            f = func[0](msg, slack, func[1])
-            ensure_future(coroutine=f, loop=self._loop, logger=logger)
+        await msg.resolve(slack)
+        if not msg.frm:
+            logger.debug('Ignoring message from an unknown user')
+            return
 
-    def _find_thread_handlers(self, msg):
-        handlers = list()
+        for command, n in matches:
+            if command.get('admin') and not msg.frm.admin:
+                continue
 
-        if msg.frm.id in self._threads[msg.thread]:
-            logger.debug('Located thread handler for "%s" and "%s"',
-                         msg.thread, msg.frm.id)
-            handlers.append((self._threads[msg.thread][msg.frm.id], None))
-            del self._threads[msg.thread][msg.frm.id]
-        elif 'all' in self._threads[msg.thread]:
-            logger.debug('Located thread handler for "%s"', msg.thread)
-            handlers.append((self._threads[msg.thread]['all'], None))
-            del self._threads[msg.thread]['all']
+            logger.debug('Located handler for "{}", invoking'.format(
+                msg.text))
+            handlers.append((command['func'], n, command.get('serial')))
 
-        return handlers
+        channel = event_key(msg.raw) or msg.to.id
+        for func, n, serial in handlers:
+            key = serial_key(serial, channel, msg.thread, msg.frm.id)
+            self._run_handler('messages', func, msg, slack, n, key=key)
 
-    def _find_handlers(self, msg):
+    async def _find_thread_handlers(self, msg):
         handlers = list()
 
-        for match, commands in self._endpoints.items():
-            commands = [
-                command for command in commands
-                if (
-                    command['channel_id'] == '*' or msg.to.id in
-                    command['channel_id']
-                )
-            ]
-
-            if commands:
-                n = match.search(msg.text)
-                if n:
-                    for command in commands:
-                        if command.get('mention') and not msg.mention:
-                            continue
-                        elif command.get('admin') and not msg.frm.admin:
-                            continue
-
-                        logger.debug(
-                            'Located handler for "{}", invoking'.format(
-                                msg.text))
-                        handlers.append((command['func'], n))
+        callback = await self._threads.claim(msg.thread, msg.frm.id)
+        if callback:
+            handlers.append((self._wrap(callback.func), None,
+                             callback.serial))
 
         return handlers
 
+    def _find_handlers(self, msg):
+        return self._router.find(msg)
+
     async def _ping(self, message, slack, *_):
 
         if isinstance(message.to, Channel) or isinstance(message.to, Group):
@@ -0,0 +1,66 @@
+import inspect
+import logging
+import time
+
+from ..executor import handler_name
+from ..metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+# Middlewares are expected to be fast: sub millisecond buckets
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05, 0.1,
+           float('inf'))
+
+
+class Middleware:
+    """
+    Stage of a dispatcher middleware chain.
+
+    The middleware is called with the raw payload of an incoming item before
+    any routing. It returns the payload to pass on (the same one, modified or
+    a new one) or None to drop the item. A middleware raising an exception is
+    logged and the item is dropped, or passed on unchanged when the
+    middleware fails open.
+
+    :param func: Function or coroutine function of the middleware
+    :param fail_open: Pass the payload on when the middleware raises
+    """
+
+    def __init__(self, func, fail_open=False):
+        self._func = func
+        self._fail_open = fail_open
+
+        self.name = handler_name(func)
+        self.calls = 0
+        self.dropped = 0
+        self.errors = 0
+        self.duration = Histogram(BUCKETS)
+
+    async def __call__(self, payload):
+        self.calls += 1
+        start = time.monotonic()
+        try:
+            result = self._func(payload)
+            if inspect.isawaitable(result):
+                result = await result
+        except Exception as e:
+            self.errors += 1
+            logger.exception(e)
+            if self._fail_open:
+                return payload
+            self.dropped += 1
+            return None
+        finally:
+            self.duration.observe(time.monotonic() - start)
+
+        if result is None:
+            self.dropped += 1
+        return result
+
+    def snapshot(self):
+        return {
+            'calls': self.calls,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'duration': self.duration.snapshot(),
+        }
@@ -0,0 +1,286 @@
+import logging
+import re
+
+try:
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_constants
+    import sre_parse
+
+logger = logging.getLogger(__name__)
+
+# Patterns with these flags are never part of a combined regex
+UNCOMBINABLE = re.VERBOSE | re.LOCALE
+
+
+def _flatten(items):
+    """
+    Inline the content of the plain groups of a parsed pattern
+    """
+    for op, av in items:
+        if op != sre_constants.SUBPATTERN:
+            yield op, av
+        elif len(av) == 4 and (av[1] or av[2]):
+            # Python >= 3.6 groups can set scoped flags: (?i:...)
+            yield op, av
+        else:
+            yield from _flatten(av[-1])
+
+
+def _keywords(branch, ascii_only):
+    """
+    Alternatives of a branch made of literals only
+    """
+    keywords = list()
+    for alternative in branch[1]:
+        alternative = list(_flatten(alternative))
+        if not alternative or any(
+                op != sre_constants.LITERAL or (ascii_only and av > 127)
+                for op, av in alternative):
+            return None
+        keywords.append(''.join(chr(av) for _, av in alternative))
+
+    return tuple(keywords)
+
+
+def _prefilter(pattern):
+    """
+    Literal text required by a pattern
+
+    Only the literals outside of a repetition are considered: a run of
+    literals the text must contain, or a branch of literals the text must
+    contain one of.
+
+    :param pattern: Compiled pattern
+    :return: Tuple of the longest literal (or None), True if the pattern must
+    start with it and the keywords of a branch (or None)
+    """
+    if pattern.flags & re.LOCALE or (
+            pattern.flags & re.IGNORECASE and not pattern.flags & re.ASCII):
+        # Unicode case folding can't be reproduced with str.lower()
+        return None, False, None
+
+    # With IGNORECASE the text is lowered: only the ASCII literals keep their
+    # meaning (i.e: 'Σ' becomes 'σ' or 'ς' depending on its position)
+    ascii_only = bool(pattern.flags & re.IGNORECASE)
+
+    try:
+        items = list(_flatten(sre_parse.parse(pattern.pattern,
+                                              pattern.flags)))
+    except Exception:
+        return None, False, None
+
+    anchored = False
+    if items and items[0][0] == sre_constants.AT:
+        if items[0][1] == sre_constants.AT_BEGINNING_STRING:
+            anchored = True
+        elif items[0][1] == sre_constants.AT_BEGINNING:
+            # With MULTILINE ^ also matches after each newline
+            anchored = not pattern.flags & re.MULTILINE
+        if anchored:
+            items = items[1:]
+
+    literal, prefix, keywords = '', False, None
+    run, run_prefix = '', anchored
+    for op, av in items + [(None, None)]:
+        if op == sre_constants.LITERAL and not (ascii_only and av > 127):
+            run += chr(av)
+            continue
+
+        if len(run) > len(literal):
+            literal, prefix = run, run_prefix
+        run, run_prefix = '', False
+
+        if op == sre_constants.BRANCH:
+            alternatives = _keywords(av, ascii_only)
+            if not alternatives:
+                continue
+            elif not keywords or \
+                    min(map(len, alternatives)) > min(map(len, keywords)):
+                keywords = alternatives
+
+    if pattern.flags & re.IGNORECASE:
+        literal = literal.lower()
+        keywords = keywords and tuple(k.lower() for k in keywords)
+
+    if literal and keywords and len(literal) >= min(map(len, keywords)):
+        keywords = None
+    elif keywords:
+        literal, prefix = '', False
+
+    return literal or None, prefix, keywords
+
+
+class Route:
+    """
+    Registered pattern of the message router
+
+    :param pattern: Compiled pattern
+    :param flags: Flags the pattern was registered with
+    """
+    __slots__ = ('pattern', 'commands', 'literal', 'prefix', 'keywords',
+                 'lower', 'combinable')
+
+    def __init__(self, pattern, flags):
+        self.pattern = pattern
+        self.commands = list()
+        self.literal, self.prefix, self.keywords = _prefilter(pattern)
+        prefiltered = bool(self.literal or self.keywords)
+        self.lower = prefiltered and bool(pattern.flags & re.IGNORECASE)
+
+        # Patterns without group and inline flag keep their meaning inside
+        # an alternation
+        inline_flags = pattern.flags != re.compile('', flags).flags
+        self.combinable = not any((pattern.groups, inline_flags,
+                                   pattern.flags & UNCOMBINABLE))
+
+
+class Bucket:
+    """
+    Routes of the messages of one channel
+
+    ``gates`` holds for each flag set a combined regex of the combinable
+    routes without literal prefilter: when it doesn't match none of these
+    routes can match.
+    """
+    __slots__ = ('routes', 'gates')
+
+    def __init__(self, routes):
+        self.routes = list()
+        self.gates = list()
+
+        combined = dict()
+        indexes = dict()
+        for route, commands in routes:
+            if route.combinable and not (route.literal or route.keywords):
+                combined.setdefault(route.pattern.flags, list()).append(route)
+
+        for flags, members in combined.items():
+            if len(members) < 2:
+                continue
+
+            try:
+                gate = re.compile('|'.join(
+                    '(?:{})'.format(route.pattern.pattern) for route in members
+                ), flags)
+            except (re.error, RecursionError, OverflowError):
+                continue
+
+            for route in members:
+                indexes[route] = len(self.gates)
+            self.gates.append(gate)
+
+        # Flattened for the matching loop
+        for route, commands in routes:
+            self.routes.append((route.literal, route.prefix, route.keywords,
+                                route.lower, indexes.get(route),
+                                route.pattern, commands))
+
+
+class MessageRouter:
+    """
+    Index of the message handlers.
+
+    The routes matching a channel are computed once by channel. For each
+    message a route is skipped without running its regex when the message
+    doesn't contain the literal text (or one of the keywords) required by the
+    pattern, or when the combined regex of its bucket doesn't match. Handlers
+    are found in registration order, with the same result as searching every
+    pattern.
+
+    The admin option of the handlers is not checked as it requires the
+    author of the message to be queried.
+    """
+
+    def __init__(self):
+        self._routes = dict()
+        self._buckets = dict()
+
+    def __len__(self):
+        return len(self._routes)
+
+    def add(self, match, flags, option):
+        """
+        Register a handler
+
+        :param match: Regex of the handler
+        :param flags: Flags of the regex
+        :param option: Handler options (func, mention, admin, channel_id)
+        """
+        pattern = re.compile(match, flags)
+        if pattern not in self._routes:
+            self._routes[pattern] = Route(pattern, flags)
+
+        self._routes[pattern].commands.append(option)
+        self._buckets.clear()
+
+    def _bucket(self, channel_id):
+        bucket = self._buckets.get(channel_id)
+        if bucket is None:
+            routes = list()
+            for route in self._routes.values():
+                commands = [
+                    command for command in route.commands
+                    if (
+                        command['channel_id'] == '*' or channel_id in
+                        command['channel_id']
+                    )
+                ]
+                if commands:
+                    routes.append((route, commands))
+
+            bucket = self._buckets[channel_id] = Bucket(routes)
+
+        return bucket
+
+    def find(self, msg):
+        """
+        Find the handlers of a message
+
+        :param msg: incoming message
+        :return: List of (handler options, match object)
+        """
+        handlers = list()
+        text = msg.text
+        lowered = None
+        bucket = self._bucket(msg.to.id)
+        gates = [None] * len(bucket.gates)
+
+        for literal, prefix, keywords, lower, gate, pattern, commands \
+                in bucket.routes:
+            if lower:
+                if lowered is None:
+                    lowered = text.lower()
+                haystack = lowered
+            else:
+                haystack = text
+
+            if literal:
+                if prefix:
+                    if not haystack.startswith(literal):
+                        continue
+                elif literal not in haystack:
+                    continue
+            elif keywords:
+                for keyword in keywords:
+                    if keyword in haystack:
+                        break
+                else:
+                    continue
+
+            if gate is not None:
+                matched = gates[gate]
+                if matched is None:
+                    matched = gates[gate] = bool(
+                        bucket.gates[gate].search(text))
+                if not matched:
+                    continue
+
+            n = pattern.search(text)
+            if n:
+                for command in commands:
+                    if command.get('mention') and not msg.mention:
+                        continue
+                    handlers.append((command, n))
+
+        return handlers
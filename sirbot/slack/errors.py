@@ -13,6 +13,10 @@ class SlackInactiveDispatcher(SlackSetupError):
     """Raised when adding endpoint to a missing dispatcher"""
 
 
+class SlackInactiveThreads(SlackSetupError):
+    """Raised when adding a thread callback while threads are deactivated"""
+
+
 class SlackClientError(SlackError):
     """Error with the slack API"""
 
@@ -21,10 +25,22 @@ class SlackConnectionError(SlackClientError):
     """Connection to slack server error"""
 
 
+class SlackRateLimitError(SlackConnectionError):
+    """Rate limited by slack (429 status code)"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
 class SlackServerError(SlackClientError):
     """Internal slack server error"""
 
 
+class SlackCircuitOpenError(SlackServerError):
+    """Slack is degraded, calls are failing fast"""
+
+
 class SlackRedirectionError(SlackClientError):
     """Redirection status code"""
 
@@ -42,6 +58,10 @@ class SlackMessageError(SlackError):
     """Generic slack message error"""
 
 
+class SlackOutboundCancelled(SlackMessageError):
+    """Outgoing message cancelled before being sent"""
+
+
 class SlackUnknownEndpoint(SlackError):
     """"""
 
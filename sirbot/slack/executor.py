@@ -0,0 +1,228 @@
+import asyncio
+import collections
+import functools
+import inspect
+import logging
+import threading
+import time
+import types
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+EXECUTORS = ('thread', 'process')
+
+
+def handler_name(func):
+    return '{}.{}'.format(func.__module__,
+                          getattr(func, '__qualname__', func.__name__))
+
+
+def check_executor(executor):
+    if executor and executor not in EXECUTORS:
+        raise ValueError('executor must be one of {}'.format(
+            ', '.join(EXECUTORS)))
+
+
+class HandlerExecutor:
+    """
+    Run the handlers without blocking the event loop.
+
+    Handlers run on the event loop unless registered with an ``executor``:
+
+        * ``thread``: the synchronous handler runs in the thread pool. It
+          can't use the event loop (i.e: ``asyncio.ensure_future``) but can
+          return an awaitable (i.e: ``return slack.send(message)``) awaited
+          on the event loop.
+        * ``process``: the synchronous handler runs in the process pool and
+          is called with the payload only (message, event, command or
+          action). The handler and the payload must be picklable.
+
+    CPU heavy work can also be sent to the pools with :meth:`run`.
+
+    Handlers running on the event loop are timed at each step: a step
+    holding the event loop longer than ``block_threshold`` seconds is logged
+    with the handler name. A watchdog thread also reports a handler holding
+    the loop while it is still blocked.
+
+    The duration of every invocation is recorded by handler.
+
+    :param loop: Event loop
+    :param threads: Number of threads of the thread pool
+    :param processes: Number of processes of the process pool (None for the
+    number of CPUs)
+    :param block_threshold: Time in seconds a handler can hold the event loop
+    (0 to deactivate the detection)
+    """
+
+    def __init__(self, loop, threads=8, processes=None, block_threshold=0.1):
+        self._loop = loop
+        self._threads = ThreadPoolExecutor(max_workers=threads)
+        self._processes = None
+        self._processes_count = processes
+        self._block_threshold = block_threshold
+        self._watchdog = None
+        self._stopped = threading.Event()
+        self._current = None
+        self._step_start = None
+
+        self.blocked = collections.Counter()
+        self.running = collections.Counter()
+        self.duration = collections.defaultdict(Histogram)
+
+    def wrap(self, func, executor=None):
+        """
+        Wrap a handler to run it in its executor and time it
+
+        :param func: Handler
+        :param executor: ``thread`` or ``process`` to run a synchronous
+        handler in the thread pool or in the process pool (None for the
+        event loop)
+        :return: Coroutine function
+        """
+        check_executor(executor)
+        name = handler_name(func)
+        coroutine = asyncio.iscoroutinefunction(func) or \
+            inspect.isgeneratorfunction(func)
+
+        if executor and coroutine:
+            raise ValueError('Coroutine handlers run on the event loop, they '
+                             'can\'t use an executor: {}'.format(name))
+        elif executor == 'process':
+            async def call(payload, *args):
+                return await self._loop.run_in_executor(
+                    self._process_pool(), func, payload
+                )
+        elif executor == 'thread':
+            async def call(*args, **kwargs):
+                result = await self._loop.run_in_executor(
+                    self._threads, functools.partial(func, *args, **kwargs)
+                )
+                if inspect.isawaitable(result):
+                    result = await result
+                return result
+        else:
+            coro = func if coroutine else asyncio.coroutine(func)
+            if not self._block_threshold:
+                call = coro
+            else:
+                async def call(*args, **kwargs):
+                    return await self._timed(coro(*args, **kwargs), name)
+
+        @functools.wraps(func)
+        async def measured(*args, **kwargs):
+            self.running[name] += 1
+            start = self._loop.time()
+            try:
+                return await call(*args, **kwargs)
+            finally:
+                self.running[name] -= 1
+                self.duration[name].observe(self._loop.time() - start)
+
+        return measured
+
+    async def run(self, func, *args, process=False):
+        """
+        Run a function in the thread pool or in the process pool
+
+        Functions and arguments sent to the process pool must be picklable.
+
+        :param func: Function
+        :param args: Arguments of the function
+        :param process: Use the process pool
+        :return: Result of the function
+        """
+        pool = self._process_pool() if process else self._threads
+        return await self._loop.run_in_executor(pool, func, *args)
+
+    def _process_pool(self):
+        if not self._processes:
+            self._processes = ProcessPoolExecutor(
+                max_workers=self._processes_count
+            )
+        return self._processes
+
+    @types.coroutine
+    def _timed(self, coro, name):
+        """
+        Drive a coroutine, timing each of its steps
+        """
+        value, error = None, None
+
+        while True:
+            # A timed handler can await another one
+            outer = self._current, self._step_start
+            start = time.monotonic()
+            self._current, self._step_start = name, start
+            try:
+                if error is not None:
+                    future = coro.throw(error)
+                else:
+                    future = coro.send(value)
+            except StopIteration as e:
+                return e.value
+            finally:
+                elapsed = time.monotonic() - start
+                self._current, self._step_start = outer
+                if elapsed > self._block_threshold:
+                    self.blocked[name] += 1
+                    logger.warning('Handler %s blocked the event loop for '
+                                   '%.3fs', name, elapsed)
+
+            try:
+                value, error = (yield future), None
+            except BaseException as e:
+                value, error = None, e
+
+    def start(self):
+        """
+        Start the watchdog thread
+        """
+        if self._block_threshold and not self._watchdog:
+            self._watchdog = threading.Thread(target=self._watch,
+                                              name='sirbot-slack-watchdog',
+                                              daemon=True)
+            self._watchdog.start()
+
+    def _watch(self):
+        reported = None
+        while not self._stopped.wait(self._block_threshold):
+            current, start = self._current, self._step_start
+            if current is None or start is None:
+                reported = None
+                continue
+
+            elapsed = time.monotonic() - start
+            if elapsed > self._block_threshold * 10 and reported != start:
+                reported = start
+                logger.warning('Handler %s is blocking the event loop since '
+                               '%.1fs', current, elapsed)
+
+    def stop(self):
+        """
+        Stop the watchdog thread and the pools
+        """
+        self._stopped.set()
+        if self._watchdog:
+            self._watchdog.join()
+            self._watchdog = None
+
+        self._threads.shutdown(wait=False)
+        if self._processes:
+            self._processes.shutdown(wait=False)
+
+    def snapshot(self):
+        return {
+            'running': sum(self.running.values()),
+            'blocked': sum(self.blocked.values()),
+            'blocked_by_handler': dict(self.blocked),
+            'handlers': {
+                name: {
+                    'running': self.running[name],
+                    'duration': duration.snapshot(),
+                }
+                for name, duration in self.duration.items()
+            }
+        }
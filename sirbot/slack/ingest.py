@@ -0,0 +1,276 @@
+import asyncio
+import logging
+import os
+import tempfile
+import threading
+
+from . import codec
+from .metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ('block', 'shed', 'spill')
+
+
+def event_key(event):
+    """
+    Ordering key of an incoming event (the channel id when available)
+    """
+    channel = event.get('channel') or event.get('item', {}).get('channel')
+    if isinstance(channel, dict):
+        channel = channel.get('id')
+    return channel
+
+
+class SpillFile:
+    """
+    Append only file of the events spilled by a partition.
+
+    The methods do blocking file I/O and are run in the default executor. The
+    file is removed once all the spilled events are read back.
+
+    :param path: Path of the file (default to a temporary file)
+    """
+
+    def __init__(self, path=None):
+        self._path = path
+        self._writer = None
+        self._reader = None
+        self._lock = threading.Lock()
+        self._final = False
+
+    def write(self, events):
+        """
+        Append events to the file
+
+        :param events: List of ``(key, queued_at, event)``
+        """
+        with self._lock:
+            if self._final:
+                return
+
+            if not self._writer:
+                path = self._path
+                if not path:
+                    fd, path = tempfile.mkstemp(prefix='sirbot-slack-',
+                                                suffix='.spill')
+                    os.close(fd)
+
+                logger.debug('Ingest queue full, spilling to %s', path)
+                self._writer = open(path, 'w', encoding='utf-8')
+                self._reader = open(path, 'r', encoding='utf-8')
+
+            self._writer.writelines(codec.dumps(event) + '\n'
+                                    for event in events)
+            self._writer.flush()
+
+    def read(self, count):
+        """
+        Read the oldest spilled events
+
+        :param count: Maximum number of events to read
+        :return: List of ``(key, queued_at, event)``
+        """
+        events = list()
+        with self._lock:
+            if not self._reader:
+                return events
+
+            for _ in range(count):
+                line = self._reader.readline()
+                if not line:
+                    break
+                events.append(codec.loads(line))
+        return events
+
+    def close(self, final=False):
+        """
+        Close and remove the file
+
+        :param final: Ignore the later writes
+        """
+        with self._lock:
+            self._final = self._final or final
+            if self._writer:
+                path = self._writer.name
+                self._writer.close()
+                self._reader.close()
+                self._writer = self._reader = None
+                os.remove(path)
+
+
+class IngestQueue:
+    """
+    Bounded queue of incoming events drained by a pool of workers.
+
+    Events are partitioned on their key (i.e: a channel id) between the
+    workers so events sharing a key are processed in FIFO order while
+    different keys are processed concurrently.
+
+    When the queue of a partition is full the ``block`` overflow policy makes
+    the producer wait for a free slot (backpressure), the ``shed`` policy
+    drops the event and the ``spill`` policy appends it to the spill file of
+    the partition. Once a partition started spilling every new event of the
+    partition is spilled until its file is drained back in the queue,
+    preserving the FIFO order. The other partitions are not affected.
+
+    :param callback: Coroutine function called with each event
+    :param loop: Event loop
+    :param workers: Number of workers
+    :param size: Maximum number of queued events
+    :param overflow: Overflow policy, one of ``block``, ``shed`` or ``spill``
+    :param spill_path: Path prefix of the spill files, suffixed by the
+    partition number (default to temporary files)
+    """
+
+    def __init__(self, callback, loop, workers=8, size=1000,
+                 overflow='block', spill_path=None):
+
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError('overflow must be one of {}'.format(
+                ', '.join(OVERFLOW_POLICIES)))
+
+        self._callback = callback
+        self._loop = loop
+        self._overflow = overflow
+        self._size = size
+        self._queues = [
+            asyncio.Queue(maxsize=max(1, size // workers), loop=loop)
+            for _ in range(workers)
+        ]
+        self._workers = list()
+
+        self._spills = [
+            SpillFile('{}.{}'.format(spill_path, i) if spill_path else None)
+            for i in range(workers)
+        ]
+        self._spill_buffers = [list() for _ in range(workers)]
+        self._spill_pending = [0] * workers
+        self._spill_ready = [asyncio.Event(loop=loop) for _ in range(workers)]
+
+        self.processed = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.wait = Histogram()
+
+    @property
+    def depth(self):
+        """int: Number of queued events (including the spilled ones)"""
+        return sum(queue.qsize() for queue in self._queues) + \
+            sum(self._spill_pending)
+
+    def start(self):
+        if not self._workers:
+            self._workers = [
+                asyncio.ensure_future(self._worker(queue), loop=self._loop)
+                for queue in self._queues
+            ]
+
+            if self._overflow == 'spill':
+                self._workers.extend(
+                    asyncio.ensure_future(self._unspill(partition),
+                                          loop=self._loop)
+                    for partition in range(len(self._queues))
+                )
+
+    def stop(self):
+        """
+        Cancel the workers and remove the spill files
+
+        The events still queued are dropped.
+        """
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = list()
+
+        if self.depth:
+            logger.warning('Stopping the ingest queue, dropping %s events',
+                           self.depth)
+
+        for spill in self._spills:
+            spill.close(final=True)
+
+    def _partition(self, key):
+        return hash(key) % len(self._queues)
+
+    async def put(self, event, key=None):
+        """
+        Queue an event
+
+        :param event: Event to queue
+        :param key: Ordering key of the event
+        :return: False if the event was dropped
+        """
+        partition = self._partition(key)
+        queue = self._queues[partition]
+
+        if self._overflow == 'spill' and \
+                (self._spill_pending[partition] or queue.full()):
+            self._spill_buffers[partition].append(
+                (self._loop.time(), event)
+            )
+            self._spill_pending[partition] += 1
+            self.spilled += 1
+            self._spill_ready[partition].set()
+            return True
+        elif self._overflow == 'shed' and queue.full():
+            self.dropped += 1
+            logger.debug('Ingest queue full, dropping event: %s', event)
+            return False
+
+        await queue.put((event, self._loop.time()))
+        return True
+
+    async def _unspill(self, partition):
+        """
+        Write the spilled events of a partition to its file and move them
+        back to the queue as room is available
+        """
+        queue = self._queues[partition]
+        spill = self._spills[partition]
+        buffer = self._spill_buffers[partition]
+        ready = self._spill_ready[partition]
+
+        while True:
+            await ready.wait()
+
+            if buffer:
+                events = list(buffer)
+                del buffer[:]
+                await self._loop.run_in_executor(None, spill.write, events)
+
+            events = await self._loop.run_in_executor(
+                None, spill.read, max(1, queue.maxsize - queue.qsize())
+            )
+            for queued_at, event in events:
+                await queue.put((event, queued_at))
+                self._spill_pending[partition] -= 1
+
+            if not self._spill_pending[partition]:
+                # Drained, start over with a new file
+                ready.clear()
+                await self._loop.run_in_executor(None, spill.close)
+
+    async def _worker(self, queue):
+        while True:
+            event, queued_at = await queue.get()
+            self.wait.observe(self._loop.time() - queued_at)
+            try:
+                await self._callback(event)
+            except Exception as e:
+                logger.exception(e)
+            finally:
+                queue.task_done()
+                self.processed += 1
+
+    def snapshot(self):
+        return {
+            'depth': self.depth,
+            'size': self._size,
+            'workers': len(self._queues),
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'spilled': self.spilled,
+            'spill_pending': sum(self._spill_pending),
+            'wait': self.wait.snapshot(),
+        }
@@ -0,0 +1,182 @@
+import asyncio
+import collections
+import heapq
+import itertools
+import logging
+
+from sirbot.utils import ensure_future
+
+from .metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+# Lanes by decreasing priority
+LANES = ('interactive', 'messages', 'events')
+
+
+class LaneScheduler:
+    """
+    Prioritized execution of the handlers.
+
+    Jobs are run in lanes. At most ``concurrency`` jobs run at once and each
+    lane has its own concurrency limit. When a slot frees up the waiting job
+    of the highest priority lane is started first, so interactive work
+    (slash commands and actions) always goes ahead of the messages and events
+    backlog. When ``queue`` jobs of a lane are waiting the new ones are
+    dropped.
+
+    :param loop: Event loop
+    :param concurrency: Maximum number of jobs running at once
+    :param limits: Maximum number of jobs running at once by lane
+    :param queue: Maximum number of waiting jobs by lane (None for no limit)
+    """
+
+    def __init__(self, loop, concurrency=64, limits=None, queue=None):
+        self._loop = loop
+        self._concurrency = concurrency
+        self._limits = limits or dict()
+        self._queue = queue
+        self._priority = {lane: i for i, lane in enumerate(LANES)}
+        self._seq = itertools.count()
+        self._waiting = list()
+        self._running = 0
+        self._jobs = set()
+        self._stopping = False
+
+        self.running = collections.Counter()
+        self.waiting = collections.Counter()
+        self.completed = collections.Counter()
+        self.shed = collections.Counter()
+        self.wait = {lane: Histogram() for lane in LANES}
+        self.duration = {lane: Histogram() for lane in LANES}
+
+    def submit(self, lane, func, *args, **kwargs):
+        """
+        Run a job in the background
+
+        :param lane: Lane of the job
+        :param func: Coroutine function to run
+        :return: Task of the job
+        """
+        return ensure_future(self.run(lane, func, *args, **kwargs),
+                             loop=self._loop, logger=logger)
+
+    async def run(self, lane, func, *args, **kwargs):
+        """
+        Wait for a slot in the lane and run a job
+
+        :param lane: Lane of the job
+        :param func: Coroutine function to run
+        :return: Result of the job, None if it was dropped
+        """
+        if self._stopping:
+            self.shed[lane] += 1
+            logger.debug('Lanes stopped, dropping the job')
+            return
+        elif self._queue and self.waiting[lane] >= self._queue:
+            self.shed[lane] += 1
+            logger.warning('Lane %s full (%s waiting jobs), dropping the job',
+                           lane, self.waiting[lane])
+            return
+
+        job = asyncio.ensure_future(self._run(lane, func, *args, **kwargs),
+                                    loop=self._loop)
+        self._jobs.add(job)
+        job.add_done_callback(self._jobs.discard)
+        return await job
+
+    async def _run(self, lane, func, *args, **kwargs):
+        await self._acquire(lane)
+        start = self._loop.time()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            self.duration[lane].observe(self._loop.time() - start)
+            self.completed[lane] += 1
+            self._release(lane)
+
+    async def _acquire(self, lane):
+        queued_at = self._loop.time()
+        future = self._loop.create_future()
+        heapq.heappush(
+            self._waiting,
+            (self._priority[lane], next(self._seq), lane, future)
+        )
+        self.waiting[lane] += 1
+        self._wakeup()
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was granted but the job is cancelled
+                self._release(lane)
+            else:
+                self.waiting[lane] -= 1
+            raise
+
+        self.wait[lane].observe(self._loop.time() - queued_at)
+
+    def _release(self, lane):
+        self._running -= 1
+        self.running[lane] -= 1
+        self._wakeup()
+
+    def _wakeup(self):
+        """
+        Grant the free slots to the waiting jobs by priority
+        """
+        skipped = list()
+
+        while self._waiting and self._running < self._concurrency:
+            item = heapq.heappop(self._waiting)
+            _, _, lane, future = item
+
+            if future.cancelled():
+                continue
+            elif self.running[lane] >= self._limits.get(lane,
+                                                        self._concurrency):
+                skipped.append(item)
+                continue
+
+            self._running += 1
+            self.running[lane] += 1
+            self.waiting[lane] -= 1
+            future.set_result(None)
+
+        for item in skipped:
+            heapq.heappush(self._waiting, item)
+
+    async def stop(self, timeout=None):
+        """
+        Stop accepting jobs and wait for the waiting and running jobs
+
+        :param timeout: Time in seconds before the remaining jobs are
+        cancelled (None to wait for all of them)
+        """
+        self._stopping = True
+        if not self._jobs:
+            return
+
+        logger.debug('Draining %s jobs', len(self._jobs))
+        _, pending = await asyncio.wait(list(self._jobs), timeout=timeout,
+                                        loop=self._loop)
+        if pending:
+            logger.warning('Cancelling %s jobs still running after %ss',
+                           len(pending), timeout)
+            for job in pending:
+                job.cancel()
+            await asyncio.wait(pending, loop=self._loop)
+
+    def snapshot(self):
+        return {
+            lane: {
+                'running': self.running[lane],
+                'waiting': self.waiting[lane],
+                'completed': self.completed[lane],
+                'shed': self.shed[lane],
+                'wait': self.wait[lane].snapshot(),
+                'duration': self.duration[lane].snapshot(),
+            }
+            for lane in LANES
+        }
@@ -0,0 +1,121 @@
+import bisect
+import collections
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (in seconds) of the latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+           float('inf'))
+
+
+class Histogram:
+    """
+    Fixed buckets histogram.
+
+    :param buckets: Sorted upper bounds of the buckets
+    """
+    __slots__ = ('buckets', 'counts', 'count', 'sum', 'max')
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def merge(self, snapshot):
+        """
+        Add the observations of a snapshot (i.e: of another process)
+
+        :param snapshot: Snapshot of a histogram with the same buckets
+        """
+        for i, bound in enumerate(self.buckets):
+            self.counts[i] += snapshot['buckets'].get(str(bound), 0)
+        self.count += snapshot['count']
+        self.sum += snapshot['sum']
+        self.max = max(self.max, snapshot['max'])
+
+    def percentile(self, percent):
+        """
+        Upper bound of the bucket containing the percentile
+
+        :param percent: Percentile to compute (0 - 100)
+        """
+        if not self.count:
+            return 0
+
+        rank = self.count * percent / 100
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            if total >= rank:
+                return min(bound, self.max)
+
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else 0,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+            'buckets': {
+                str(bound): count
+                for bound, count in zip(self.buckets, self.counts)
+            }
+        }
+
+
+class APIMetrics:
+    """
+    Metrics of the calls to the slack API, by method.
+
+    Calls outside of the slack API (i.e: response_url) are grouped under
+    ``response_url``.
+    """
+
+    def __init__(self):
+        self.latency = collections.defaultdict(Histogram)
+        self.status = collections.defaultdict(collections.Counter)
+        self.retries = collections.defaultdict(collections.Counter)
+        self.in_flight = collections.Counter()
+
+    def start(self, method):
+        self.in_flight[method] += 1
+
+    def end(self, method, status, duration):
+        """
+        Record the outcome of a call
+
+        :param method: Slack API method
+        :param status: HTTP status code or name of the exception
+        :param duration: Duration of the call in seconds
+        """
+        self.in_flight[method] -= 1
+        self.status[method][str(status)] += 1
+        self.latency[method].observe(duration)
+
+    def retry(self, method, reason):
+        self.retries[method][reason] += 1
+
+    def snapshot(self):
+        methods = set(self.latency) | set(self.in_flight)
+        return {
+            method: {
+                'latency': self.latency[method].snapshot(),
+                'status': dict(self.status[method]),
+                'retries': dict(self.retries[method]),
+                'in_flight': self.in_flight[method],
+            }
+            for method in methods
+        }
@@ -0,0 +1,376 @@
+"""
+Stand-in for the slack web API and RTM websocket, for offline load testing.
+
+    $ python -m sirbot.slack.mockserver --port 8080 --latency 0.05
+    $ SIRBOT_SLACK_API_ROOT=http://localhost:8080/api/ sirbot ...
+"""
+
+import argparse
+import asyncio
+import collections
+import itertools
+import logging
+import random
+import time
+
+from aiohttp import web, WSMsgType
+
+from . import codec
+
+logger = logging.getLogger(__name__)
+
+PAGINATED = {
+    'users.list': ('users', 'members'),
+    'channels.list': ('channels', 'channels'),
+    'groups.list': ('groups', 'groups'),
+}
+
+
+class MockSlack:
+    """
+    Mock of the slack web API and RTM API.
+
+    :param users: Number of synthetic users
+    :param channels: Number of synthetic channels
+    :param groups: Number of synthetic private channels
+    :param latency: Base latency in seconds of every API call
+    :param jitter: Random latency in seconds added to the base latency
+    :param rate_limit: Calls per minute allowed for each method before
+    answering with a 429 status code (None to deactivate)
+    :param error_rate: Fraction of calls answered with a 500 status code
+    :param events_per_second: Number of synthetic messages sent on each RTM
+    connection per second
+    :param loop: Event loop
+    """
+
+    def __init__(self, users=100, channels=20, groups=5, latency=0, jitter=0,
+                 rate_limit=None, error_rate=0, events_per_second=0,
+                 loop=None):
+
+        self._loop = loop or asyncio.get_event_loop()
+        self._latency = latency
+        self._jitter = jitter
+        self._rate_limit = rate_limit
+        self._error_rate = error_rate
+        self._events_per_second = events_per_second
+        self._ts = itertools.count(1)
+        self._calls = collections.defaultdict(list)
+        self._history = collections.defaultdict(list)
+
+        self.stats = collections.Counter()
+        self.bot_id = 'U0BOT0000'
+        self.users = self._create_users(users)
+        self.channels = self._create_channels('C', channels)
+        self.groups = self._create_channels('G', groups)
+
+        self._handlers = {
+            'auth.test': self._auth_test,
+            'bots.info': self._bots_info,
+            'channels.history': self._history_handler,
+            'channels.info': self._channel_info('channels', 'channel'),
+            'chat.delete': self._chat_delete,
+            'chat.postMessage': self._chat_post,
+            'chat.update': self._chat_update,
+            'groups.history': self._history_handler,
+            'groups.info': self._channel_info('groups', 'group'),
+            'im.history': self._history_handler,
+            'im.list': self._im_list,
+            'im.open': self._im_open,
+            'reactions.add': self._ok,
+            'reactions.get': self._reactions_get,
+            'reactions.remove': self._ok,
+            'rtm.connect': self._rtm_connect,
+            'rtm.start': self._rtm_connect,
+            'users.info': self._users_info,
+        }
+
+    def app(self):
+        """
+        Create the aiohttp application serving the mock API
+        """
+        app = web.Application(loop=self._loop)
+        app.router.add_route('POST', '/api/{method}', self._api)
+        app.router.add_route('GET', '/rtm', self._rtm)
+        app.router.add_route('GET', '/stats', self._stats)
+        return app
+
+    def _create_users(self, count):
+        users = dict()
+        for i in range(count):
+            id_ = 'U{:08d}'.format(i)
+            users[id_] = {
+                'id': id_,
+                'name': 'user{}'.format(i),
+                'deleted': False,
+                'is_admin': i == 0,
+                'is_bot': False,
+                'profile': {'real_name': 'User {}'.format(i)},
+            }
+
+        users[self.bot_id] = {
+            'id': self.bot_id,
+            'name': 'sirbot',
+            'deleted': False,
+            'is_admin': False,
+            'is_bot': True,
+            'profile': {'bot_id': 'B0BOT0000'},
+        }
+        return users
+
+    def _create_channels(self, prefix, count):
+        channels = dict()
+        members = list(self.users)
+        for i in range(count):
+            id_ = '{}{:08d}'.format(prefix, i)
+            channels[id_] = {
+                'id': id_,
+                'name': '{}-{}'.format(prefix.lower(), i),
+                'is_member': True,
+                'is_archived': False,
+                'members': members[:50],
+                'topic': {'value': ''},
+                'purpose': {'value': ''},
+            }
+        return channels
+
+    def _rate_limited(self, method):
+        if not self._rate_limit:
+            return False
+
+        now = time.time()
+        calls = self._calls[method]
+        while calls and calls[0] < now - 60:
+            calls.pop(0)
+
+        if len(calls) >= self._rate_limit:
+            return True
+
+        calls.append(now)
+        return False
+
+    async def _api(self, request):
+        method = request.match_info['method']
+        self.stats[method] += 1
+
+        if request.content_type == 'application/json':
+            data = await request.json(loads=codec.loads)
+        else:
+            data = dict(await request.post())
+
+        delay = self._latency + random.uniform(0, self._jitter)
+        if delay:
+            await asyncio.sleep(delay, loop=self._loop)
+
+        if self._rate_limited(method):
+            self.stats['429'] += 1
+            return web.Response(status=429, headers={'Retry-After': '1'})
+
+        if random.random() < self._error_rate:
+            self.stats['500'] += 1
+            return web.Response(status=500, text='Internal server error')
+
+        if method in PAGINATED:
+            rep = self._paginate(method, data)
+        elif method in self._handlers:
+            rep = self._handlers[method](data, request)
+        else:
+            rep = {'ok': False, 'error': 'unknown_method'}
+
+        return self._json(rep)
+
+    def _paginate(self, method, data):
+        store, key = PAGINATED[method]
+        items = list(getattr(self, store).values())
+        limit = int(data.get('limit') or 0) or len(items)
+        start = int(data.get('cursor') or 0)
+        end = start + limit
+
+        return {
+            'ok': True,
+            key: items[start:end],
+            'response_metadata': {
+                'next_cursor': str(end) if end < len(items) else ''
+            }
+        }
+
+    @staticmethod
+    def _json(data):
+        return web.Response(
+            text=codec.dumps(data),
+            content_type='application/json'
+        )
+
+    @staticmethod
+    def _ok(data, request):
+        return {'ok': True}
+
+    def _auth_test(self, data, request):
+        return {'ok': True, 'user_id': self.bot_id, 'user': 'sirbot'}
+
+    def _bots_info(self, data, request):
+        return {
+            'ok': True,
+            'bot': {'id': data.get('bot'), 'name': 'bot', 'deleted': False}
+        }
+
+    def _users_info(self, data, request):
+        user = self.users.get(data.get('user'))
+        if user:
+            return {'ok': True, 'user': user}
+        return {'ok': False, 'error': 'user_not_found'}
+
+    def _channel_info(self, store, key):
+        def handler(data, request):
+            channel = getattr(self, store).get(data.get('channel'))
+            if channel:
+                return {'ok': True, key: channel}
+            return {'ok': False, 'error': 'channel_not_found'}
+        return handler
+
+    def _im_open(self, data, request):
+        return {'ok': True, 'channel': {'id': 'D' + data['user'][1:]}}
+
+    def _im_list(self, data, request):
+        return {'ok': True, 'ims': []}
+
+    def _next_ts(self):
+        return '{:.6f}'.format(time.time() + next(self._ts) / 1e6)
+
+    def _chat_post(self, data, request):
+        ts = self._next_ts()
+        message = {
+            'type': 'message',
+            'user': self.bot_id,
+            'text': data.get('text', ''),
+            'ts': ts,
+        }
+        self._history[data.get('channel')].append(message)
+        return {
+            'ok': True,
+            'channel': data.get('channel'),
+            'ts': ts,
+            'message': message
+        }
+
+    def _history_handler(self, data, request):
+        oldest = float(data.get('oldest') or 0)
+        latest = float(data.get('latest') or 'inf')
+        count = int(data.get('count') or 100)
+
+        messages = [
+            message for message in reversed(self._history[data['channel']])
+            if oldest < float(message['ts']) < latest
+        ]
+        return {
+            'ok': True,
+            'messages': messages[:count],
+            'has_more': len(messages) > count,
+        }
+
+    def _chat_update(self, data, request):
+        return {
+            'ok': True,
+            'channel': data.get('channel'),
+            'ts': data.get('ts'),
+            'text': data.get('text', ''),
+        }
+
+    def _chat_delete(self, data, request):
+        return {'ok': True, 'channel': data.get('channel'),
+                'ts': data.get('ts')}
+
+    def _reactions_get(self, data, request):
+        return {'ok': True, 'type': 'message', 'message': {'reactions': []}}
+
+    def _rtm_connect(self, data, request):
+        url = request.url.with_path('/rtm').with_query(None)
+        return {
+            'ok': True,
+            'url': str(url.with_scheme('ws')),
+            'self': {'id': self.bot_id, 'name': 'sirbot'},
+            'team': {'id': 'T00000000', 'name': 'mock'},
+        }
+
+    async def _rtm(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.stats['rtm_connections'] += 1
+
+        await ws.send_str(codec.dumps({'type': 'hello'}))
+        flood = None
+        if self._events_per_second:
+            flood = asyncio.ensure_future(self._flood(ws), loop=self._loop)
+
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+
+                data = codec.loads(msg.data)
+                if data.get('type') == 'ping':
+                    self.stats['ping'] += 1
+                    data['type'] = 'pong'
+                    data['reply_to'] = data.get('id')
+                    await ws.send_str(codec.dumps(data))
+        finally:
+            if flood:
+                flood.cancel()
+
+        return ws
+
+    async def _flood(self, ws):
+        users = [id_ for id_ in self.users if id_ != self.bot_id]
+        channels = list(self.channels)
+        interval = 1 / self._events_per_second
+
+        while not ws.closed:
+            event = {
+                'type': 'message',
+                'channel': random.choice(channels),
+                'user': random.choice(users),
+                'text': 'synthetic message {}'.format(self.stats['events']),
+                'ts': self._next_ts(),
+            }
+            self.stats['events'] += 1
+            await ws.send_str(codec.dumps(event))
+            await asyncio.sleep(interval, loop=self._loop)
+
+    async def _stats(self, request):
+        return self._json(dict(self.stats))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mock slack API server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--channels', type=int, default=20)
+    parser.add_argument('--groups', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0,
+                        help='Base latency (s) of API calls')
+    parser.add_argument('--jitter', type=float, default=0,
+                        help='Random latency (s) added to API calls')
+    parser.add_argument('--rate-limit', type=int, default=None,
+                        help='Calls per minute allowed for each method')
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help='Fraction of calls answered with a 500')
+    parser.add_argument('--events-per-second', type=float, default=0,
+                        help='Synthetic RTM messages per second')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    mock = MockSlack(
+        users=args.users,
+        channels=args.channels,
+        groups=args.groups,
+        latency=args.latency,
+        jitter=args.jitter,
+        rate_limit=args.rate_limit,
+        error_rate=args.error_rate,
+        events_per_second=args.events_per_second
+    )
+    web.run_app(mock.app(), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+import asyncio
+import logging
+
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Documented slack web API tiers (requests per minute)
+TIERS = {
+    1: 1,
+    2: 20,
+    3: 50,
+    4: 100,
+    'post': 60,  # chat.postMessage: one message per second per channel
+}
+
+METHOD_TIERS = {
+    'channels.list': 2,
+    'groups.list': 2,
+    'users.list': 2,
+    'im.list': 2,
+
+    'channels.info': 3,
+    'channels.history': 3,
+    'groups.history': 3,
+    'im.history': 3,
+    'groups.info': 3,
+    'chat.update': 3,
+    'chat.delete': 3,
+    'reactions.add': 3,
+    'reactions.remove': 3,
+    'reactions.get': 3,
+    'im.open': 3,
+
+    'users.info': 4,
+    'bots.info': 4,
+    'auth.test': 4,
+
+    'chat.postMessage': 'post',
+}
+
+DEFAULT_TIER = 3
+
+# Not paced: the RTM reconnect policy already spaces these calls and a tier 1
+# bucket would delay every reconnection by a minute. A 429 response still
+# blocks them for the Retry-After delay.
+UNPACED = ('rtm.start', 'rtm.connect')
+
+# Time (s) between two removals of the idle per channel buckets
+SWEEP_INTERVAL = 60
+
+
+class TokenBucket:
+    """
+    Token bucket pacing the calls to one slack API method.
+
+    Callers waiting for a token are queued in FIFO order.
+
+    :param rate: Number of tokens added per second (None for no limit)
+    :param capacity: Maximum number of tokens in the bucket
+    :param loop: Event loop
+    """
+    __slots__ = ('rate', 'capacity', '_tokens', '_last', '_blocked_until',
+                 '_lock', '_loop', '_waiting')
+
+    def __init__(self, rate, capacity, loop):
+        self.rate = rate
+        self.capacity = capacity
+        self._loop = loop
+        self._tokens = capacity
+        self._last = loop.time()
+        self._blocked_until = 0
+        self._lock = asyncio.Lock(loop=loop)
+        self._waiting = 0
+
+    def _refill(self, now):
+        if self.rate is None:
+            self._tokens = self.capacity
+        else:
+            self._tokens = min(
+                self.capacity,
+                self._tokens + (now - self._last) * self.rate
+            )
+        self._last = now
+
+    async def acquire(self):
+        """
+        Wait until a token is available and consume it
+        """
+        self._waiting += 1
+        try:
+            async with self._lock:
+                while True:
+                    now = self._loop.time()
+                    self._refill(now)
+
+                    if self._blocked_until > now:
+                        delay = self._blocked_until - now
+                    elif self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    else:
+                        delay = (1 - self._tokens) / self.rate
+
+                    await asyncio.sleep(delay, loop=self._loop)
+        finally:
+            self._waiting -= 1
+
+    def idle(self, now):
+        """
+        Check if the bucket is full and nobody waits for it. An idle bucket
+        behaves like a new one.
+
+        :param now: Current loop time
+        """
+        if self._waiting or self._blocked_until > now:
+            return False
+
+        self._refill(now)
+        return self._tokens >= self.capacity
+
+    def block(self, delay):
+        """
+        Refuse to hand out tokens for ``delay`` seconds and empty the bucket
+
+        :param delay: Time to wait in seconds (i.e: slack Retry-After header)
+        """
+        now = self._loop.time()
+        self._refill(now)
+        self._tokens = 0
+        self._blocked_until = max(self._blocked_until, now + delay)
+
+
+class RateLimiter:
+    """
+    Keep the slack web API calls under the documented rate limits.
+
+    A token bucket is created for each API method (and for each channel in the
+    case of ``chat.postMessage``) with a rate slightly under the method tier
+    limit. Callers are queued until a token is available. The per channel
+    buckets are removed once idle.
+
+    :param loop: Event loop
+    :param margin: Fraction of the documented limit to use
+    :param burst: Number of seconds worth of calls allowed in a burst
+    :param retries: Number of retries on a 429 response before failing
+    """
+
+    def __init__(self, loop: Optional[asyncio.BaseEventLoop] = None,
+                 margin=0.9, burst=5, retries=5):
+        self._loop = loop or asyncio.get_event_loop()
+        self._margin = margin
+        self._burst = burst
+        self._buckets = dict()
+        self._next_sweep = self._loop.time() + SWEEP_INTERVAL
+
+        self.retries = retries
+
+    def _bucket(self, method, msg):
+        tier = METHOD_TIERS.get(method, DEFAULT_TIER)
+
+        if tier == 'post' and msg and msg.get('channel'):
+            key = (method, msg['channel'])
+        else:
+            key = (method, None)
+
+        bucket = self._buckets.get(key)
+        if not bucket:
+            now = self._loop.time()
+            if key[1] is not None and now >= self._next_sweep:
+                self._sweep(now)
+
+            if method in UNPACED:
+                rate, capacity = None, 1
+            else:
+                rate = TIERS[tier] * self._margin / 60
+                capacity = max(1, int(rate * self._burst))
+            bucket = TokenBucket(rate, capacity, self._loop)
+            self._buckets[key] = bucket
+
+        return bucket
+
+    def _sweep(self, now):
+        """
+        Remove the idle per channel buckets
+
+        :param now: Current loop time
+        """
+        self._next_sweep = now + SWEEP_INTERVAL
+        idle = [key for key, bucket in self._buckets.items()
+                if key[1] is not None and bucket.idle(now)]
+
+        for key in idle:
+            del self._buckets[key]
+
+        if idle:
+            logger.debug('Removed %s idle rate limit buckets', len(idle))
+
+    async def acquire(self, method, msg=None):
+        """
+        Wait for the permission to call a slack API method
+
+        :param method: Slack API method (i.e: ``chat.postMessage``)
+        :param msg: Payload of the call
+        """
+        await self._bucket(method, msg).acquire()
+
+    def throttled(self, method, msg=None, retry_after=1):
+        """
+        Notify the rate limiter of a 429 response from slack
+
+        :param method: Slack API method (i.e: ``chat.postMessage``)
+        :param msg: Payload of the call
+        :param retry_after: Value of the Retry-After header
+        """
+        logger.warning('Rate limited by slack on %s. Retrying in %ss',
+                       method, retry_after)
+        self._bucket(method, msg).block(retry_after)
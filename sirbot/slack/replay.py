@@ -0,0 +1,408 @@
+"""
+Record and replay the incoming RTM / Events API traffic.
+
+Recording is activated with the ``record`` configuration key. A recording can
+be replayed against a running bot events endpoint:
+
+    $ python -m sirbot.slack.replay traffic.jsonl.gz \\
+        --url http://localhost:8080/slack/events --speed 10 \\
+        --metrics-url http://localhost:8080/slack/metrics
+"""
+
+import argparse
+import asyncio
+import collections
+import gzip
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+
+from . import codec
+from .errors import SlackConnectionError
+from .metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+# Time in seconds between two polls of the bot metrics while draining
+DRAIN_INTERVAL = 0.1
+
+
+class Recorder:
+    """
+    Append the raw incoming payloads, with their reception time, to a gzip
+    compressed JSONL file.
+
+    Payloads are buffered and written by a background thread so the
+    compression doesn't hold the event loop.
+
+    :param path: Path of the file
+    :param flush_interval: Maximum time in seconds between two writes
+    :param buffer_size: Maximum number of buffered payloads
+    """
+
+    def __init__(self, path, flush_interval=1, buffer_size=1000):
+        self._file = gzip.open(path, 'at', encoding='utf-8')
+        self._flush_interval = flush_interval
+        self._buffer_size = buffer_size
+        self._buffer = list()
+        self._flushed_at = time.time()
+        self._closed = False
+        self._lock = threading.Lock()
+
+        # A single thread keeps the writes in order
+        self._writer = ThreadPoolExecutor(max_workers=1)
+
+        self.records = 0
+
+    def record(self, source, raw):
+        """
+        Record a payload
+
+        :param source: ``rtm`` or ``events``
+        :param raw: JSON payload as received
+        """
+        if self._closed:
+            return
+
+        now = time.time()
+
+        # JSON strings can't contain raw newlines, the ones outside of strings
+        # are whitespaces and can be dropped to keep one record per line.
+        self._buffer.append('{{"t": {:.6f}, "source": "{}", "payload": {}}}\n'
+                            .format(now, source, raw.replace('\n', ' ')))
+        self.records += 1
+
+        if now - self._flushed_at > self._flush_interval or \
+                len(self._buffer) >= self._buffer_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Send the buffered payloads to the writer thread
+        """
+        if self._buffer:
+            future = self._writer.submit(self._write, self._buffer)
+            future.add_done_callback(self._written)
+            self._buffer = list()
+        self._flushed_at = time.time()
+
+    def _write(self, lines):
+        with self._lock:
+            self._file.writelines(lines)
+            self._file.flush()
+
+    @staticmethod
+    def _written(future):
+        if future.exception():
+            logger.error('Failed to write the recording: %s',
+                         future.exception())
+
+    def close(self):
+        """
+        Write the buffered payloads and close the file
+
+        Blocks until the writer thread is done.
+        """
+        if self._closed:
+            return
+
+        self.flush()
+        self._closed = True
+        self._writer.shutdown(wait=True)
+        with self._lock:
+            self._file.close()
+
+
+def read_records(path):
+    """
+    Iterate over the records of a recording
+
+    :param path: Path of the recording
+    """
+    with gzip.open(path, 'rt', encoding='utf-8') as file:
+        try:
+            for line in file:
+                if line.strip():
+                    yield codec.loads(line)
+        except EOFError:
+            # Recording of a bot killed before closing the file
+            logger.warning('Truncated recording: %s', path)
+
+
+class Replayer:
+    """
+    Replay a recording at the recorded pace, N times faster or as fast as
+    possible.
+
+    Once every event is sent the replayer waits for the bot to be idle and
+    reports the duration of each handler, as measured by the bot executor.
+    The replay duration includes this drain.
+
+    :param path: Path of the recording
+    :param speed: Speed multiplier or None to replay as fast as possible
+    :param concurrency: Maximum number of events in flight
+    :param drain_timeout: Maximum time in seconds waiting for the bot to
+    process the events
+    :param loop: Event loop
+    """
+
+    def __init__(self, path, speed=1, concurrency=100, drain_timeout=60,
+                 loop=None):
+        self._path = path
+        self._speed = speed
+        self._drain_timeout = drain_timeout
+        self._loop = loop or asyncio.get_event_loop()
+        self._semaphore = asyncio.Semaphore(concurrency, loop=self._loop)
+        self._sent = 0
+        self._errors = 0
+
+    async def to_plugin(self, plugin):
+        """
+        Replay the recording in process, through the slack plugin
+
+        RTM events are passed to ``SirBotSlack._incoming_rtm`` and Events API
+        payloads to the event dispatcher.
+
+        :param plugin: Started :class:`SirBotSlack` instance
+        :return: Report of the replay
+        """
+        async def handle(record):
+            if record['source'] == 'rtm':
+                await plugin._incoming_rtm(record['payload'])
+            else:
+                await plugin._dispatcher['event'].incoming_rtm(
+                    record['payload']['event']
+                )
+
+        async def metrics():
+            return [plugin.metrics()]
+
+        return await self._replay(handle, metrics)
+
+    async def to_url(self, url, token=None, metrics_url=None, workers=1):
+        """
+        Replay the recording against an events endpoint
+
+        RTM events are wrapped in an Events API payload. Without
+        ``metrics_url`` the replay ends once the events are acknowledged and
+        no handler duration is reported.
+
+        :param url: Url of the events endpoint
+        :param token: Verification token of the bot
+        :param metrics_url: Url of the bot metrics endpoint
+        :param workers: Number of worker processes of the bot. Their metrics
+        are merged.
+        :return: Report of the replay
+        """
+        async with aiohttp.ClientSession(loop=self._loop) as session:
+
+            async def handle(record):
+                payload = record['payload']
+                if record['source'] == 'rtm':
+                    payload = {
+                        'type': 'event_callback',
+                        'event': payload
+                    }
+
+                if token:
+                    payload['token'] = token
+
+                async with session.post(url, data=codec.dumps(payload)) as rep:
+                    if rep.status >= 400:
+                        raise SlackConnectionError(
+                            'Status code: {}'.format(rep.status)
+                        )
+
+            async def metrics():
+                return await self._fetch_metrics(metrics_url, workers)
+
+            return await self._replay(handle,
+                                      metrics if metrics_url else None)
+
+    async def _fetch_metrics(self, url, workers):
+        """
+        Query the metrics of each worker process
+
+        Each query is sent on a new connection so the kernel balances them
+        between the workers.
+        """
+        found = dict()
+        connector = aiohttp.TCPConnector(force_close=True, loop=self._loop)
+        async with aiohttp.ClientSession(connector=connector,
+                                         loop=self._loop) as session:
+            for _ in range(workers * 20):
+                async with session.get(url) as rep:
+                    if rep.status >= 400:
+                        raise SlackConnectionError(
+                            'Status code: {}'.format(rep.status)
+                        )
+                    data = await rep.json(loads=codec.loads)
+
+                found[data['pid']] = data
+                if len(found) >= workers:
+                    break
+            else:
+                logger.warning('Metrics of %s out of %s workers',
+                               len(found), workers)
+
+        return list(found.values())
+
+    async def _replay(self, handle, metrics=None):
+        tasks = list()
+        start = self._loop.time()
+        first = None
+
+        for record in read_records(self._path):
+            if record['source'] == 'events' and \
+                    record['payload'].get('type') != 'event_callback':
+                continue
+
+            if first is None:
+                first = record['t']
+
+            if self._speed:
+                delay = (record['t'] - first) / self._speed - \
+                    (self._loop.time() - start)
+                if delay > 0:
+                    await asyncio.sleep(delay, loop=self._loop)
+
+            await self._semaphore.acquire()
+            tasks.append(asyncio.ensure_future(self._send(handle, record),
+                                               loop=self._loop))
+
+        if tasks:
+            await asyncio.wait(tasks, loop=self._loop)
+
+        handlers = dict()
+        if metrics is not None:
+            handlers = await self._drain(metrics)
+
+        return self._report(self._loop.time() - start, handlers)
+
+    async def _send(self, handle, record):
+        try:
+            await handle(record)
+        except Exception as e:
+            logger.debug('Replay error: %s', e)
+            self._errors += 1
+        else:
+            self._sent += 1
+        finally:
+            self._semaphore.release()
+
+    async def _drain(self, metrics):
+        """
+        Wait for the bot to be idle
+
+        :param metrics: Coroutine function returning the metrics of each bot
+        process
+        :return: Duration :class:`Histogram` by handler
+        """
+        limit = self._loop.time() + self._drain_timeout
+        idle = 0
+
+        # Handlers are scheduled in the background, a single idle snapshot
+        # could be taken between two of them.
+        while idle < 2:
+            snapshots = await metrics()
+            if all(_idle(snapshot) for snapshot in snapshots):
+                idle += 1
+            else:
+                idle = 0
+
+            if self._loop.time() > limit:
+                logger.warning('Bot still busy after %ss, reporting partial '
+                               'handler durations', self._drain_timeout)
+                break
+
+            await asyncio.sleep(DRAIN_INTERVAL, loop=self._loop)
+
+        handlers = collections.defaultdict(Histogram)
+        for snapshot in snapshots:
+            executor = snapshot.get('executor', {})
+            for name, handler in executor.get('handlers', {}).items():
+                handlers[name].merge(handler['duration'])
+        return handlers
+
+    def _report(self, duration, handlers):
+        count = self._sent + self._errors
+
+        return {
+            'events': count,
+            'errors': self._errors,
+            'duration': duration,
+            'events_per_second': count / duration if duration else 0,
+            'handlers': {
+                name: {
+                    'count': histogram.count,
+                    'p50': histogram.percentile(50),
+                    'p95': histogram.percentile(95),
+                    'p99': histogram.percentile(99),
+                    'max': histogram.max,
+                }
+                for name, histogram in handlers.items()
+            }
+        }
+
+
+def _idle(metrics):
+    """
+    Check the metrics of a bot process for pending work
+    """
+    for queue in ('rtm_queue', 'events_queue'):
+        if metrics.get(queue, {}).get('depth'):
+            return False
+
+    for lane in metrics.get('lanes', {}).values():
+        if lane['running'] or lane['waiting']:
+            return False
+
+    serial = metrics.get('serial', {})
+    if serial.get('workers') or serial.get('queued'):
+        return False
+
+    return not metrics.get('executor', {}).get('running')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Replay a recording against a bot events endpoint'
+    )
+    parser.add_argument('path', help='Path of the recording')
+    parser.add_argument('--url', required=True,
+                        help='Url of the bot events endpoint')
+    parser.add_argument('--speed', default='1',
+                        help='Speed multiplier or "max"')
+    parser.add_argument('--concurrency', type=int, default=100,
+                        help='Maximum number of events in flight')
+    parser.add_argument('--metrics-url',
+                        help='Url of the bot metrics endpoint, to report the '
+                             'handlers duration')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of worker processes of the bot')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    speed = None if args.speed == 'max' else float(args.speed)
+
+    loop = asyncio.get_event_loop()
+    replayer = Replayer(args.path, speed=speed,
+                        concurrency=args.concurrency, loop=loop)
+    report = loop.run_until_complete(replayer.to_url(
+        args.url, token=os.environ.get('SIRBOT_SLACK_VERIFICATION_TOKEN'),
+        metrics_url=args.metrics_url, workers=args.workers
+    ))
+
+    print('{events} events ({errors} errors) in {duration:.2f}s: '
+          '{events_per_second:.1f} events/s'.format(**report))
+    for name, handler in sorted(report['handlers'].items()):
+        print('{name}: {count} calls, p50: {p50:.4f}s p95: {p95:.4f}s '
+              'p99: {p99:.4f}s max: {max:.4f}s'.format(name=name, **handler))
+
+
+if __name__ == '__main__':
+    main()
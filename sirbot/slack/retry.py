@@ -0,0 +1,138 @@
+import logging
+import random
+
+from .errors import SlackCircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+# Slack API methods safe to call multiple times
+IDEMPOTENT_METHODS = (
+    'auth.test',
+    'bots.info',
+    'channels.history',
+    'channels.info',
+    'channels.list',
+    'groups.history',
+    'groups.info',
+    'groups.list',
+    'im.history',
+    'im.list',
+    'im.open',
+    'reactions.get',
+    'rtm.connect',
+    'rtm.start',
+    'users.info',
+    'users.list',
+)
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter.
+
+    :param attempts: Maximum number of attempts (including the first one)
+    :param backoff: Base delay in seconds
+    :param max_backoff: Maximum delay in seconds
+    """
+    __slots__ = ('attempts', 'backoff', 'max_backoff')
+
+    def __init__(self, attempts=3, backoff=0.5, max_backoff=10):
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def delay(self, attempt):
+        """
+        Time to wait before the next attempt
+
+        :param attempt: Number of failed attempts
+        :return: Delay in seconds
+        """
+        return random.uniform(
+            0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        )
+
+
+def policies_from_config(config):
+    """
+    Create the retry policies of the idempotent slack API methods
+
+    :param config: ``retry`` part of the plugin configuration
+    :return: Dictionary of RetryPolicy by slack API method
+    """
+    default = {
+        'attempts': config['attempts'],
+        'backoff': config['backoff'],
+        'max_backoff': config['max_backoff']
+    }
+    overrides = config.get('methods') or dict()
+
+    policies = dict()
+    for method in set(IDEMPOTENT_METHODS) | set(overrides):
+        settings = dict(default, **(overrides.get(method) or dict()))
+        if settings['attempts'] > 1:
+            policies[method] = RetryPolicy(**settings)
+
+    return policies
+
+
+class CircuitBreaker:
+    """
+    Fail fast while slack is degraded.
+
+    After ``threshold`` consecutive server errors the circuit opens and calls
+    raise :class:`SlackCircuitOpenError` without reaching slack. Every
+    ``timeout`` seconds one call is let through to probe slack, a success
+    closes the circuit.
+
+    :param loop: Event loop
+    :param threshold: Consecutive failures before opening the circuit
+    :param timeout: Time in seconds between two probes while open
+    """
+
+    def __init__(self, loop, threshold=5, timeout=30):
+        self._loop = loop
+        self._threshold = threshold
+        self._timeout = timeout
+        self._failures = 0
+        self._opened_at = None
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return 'closed'
+        elif self._loop.time() - self._opened_at < self._timeout:
+            return 'open'
+        else:
+            return 'half-open'
+
+    def check(self):
+        """
+        Raise if calls to slack are not allowed
+        """
+        state = self.state
+        if state == 'open':
+            raise SlackCircuitOpenError(
+                'Slack is degraded, circuit breaker open'
+            )
+        elif state == 'half-open':
+            logger.debug('Circuit breaker half-open, probing slack')
+            self._opened_at = self._loop.time()
+
+    def success(self):
+        if self._opened_at is not None:
+            logger.info('Slack is back, closing the circuit breaker')
+
+        self._failures = 0
+        self._opened_at = None
+
+    def failure(self):
+        self._failures += 1
+
+        if self._opened_at is not None:
+            self._opened_at = self._loop.time()
+        elif self._failures >= self._threshold:
+            logger.warning('%s consecutive slack server errors, opening the '
+                           'circuit breaker for %ss',
+                           self._failures, self._timeout)
+            self._opened_at = self._loop.time()
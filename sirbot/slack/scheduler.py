@@ -0,0 +1,94 @@
+import asyncio
+import collections
+import logging
+
+from .errors import SlackOutboundCancelled
+
+logger = logging.getLogger(__name__)
+
+
+class OutboundScheduler:
+    """
+    Scheduler for the outgoing slack messages.
+
+    Jobs sharing a key (i.e: a channel id) are run one after the other in
+    submission order. Jobs with different keys run concurrently. After a
+    paced job the next job of the same key waits ``interval`` seconds.
+
+    When the scheduler is stopped the futures of the unfinished jobs fail
+    with :class:`SlackOutboundCancelled`.
+
+    :param loop: Event loop
+    :param interval: Minimum time in seconds between two paced jobs of the
+    same key (0 to only keep the order)
+    """
+
+    def __init__(self, loop, interval=1):
+        self._loop = loop
+        self._interval = interval
+        self._queues = dict()
+        self._workers = dict()
+
+    def schedule(self, key, func, *args, pace=True, **kwargs):
+        """
+        Schedule a job
+
+        :param key: Ordering key of the job
+        :param func: Coroutine function to run
+        :param pace: Wait ``interval`` seconds before the next job of the key
+        :return: Future resolving to the result of the job
+        :rtype: asyncio.Future
+        """
+        future = self._loop.create_future()
+
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = collections.deque()
+            self._queues[key] = queue
+            self._workers[key] = asyncio.ensure_future(
+                self._worker(key, queue), loop=self._loop
+            )
+
+        queue.append((func, args, kwargs, pace, future))
+        return future
+
+    async def _worker(self, key, queue):
+        try:
+            while queue:
+                func, args, kwargs, pace, future = queue.popleft()
+                if future.cancelled():
+                    continue
+
+                try:
+                    result = await func(*args, **kwargs)
+                except asyncio.CancelledError:
+                    self._cancel(future)
+                    raise
+                except Exception as e:
+                    if not future.cancelled():
+                        future.set_exception(e)
+                else:
+                    if not future.cancelled():
+                        future.set_result(result)
+
+                if pace and self._interval:
+                    await asyncio.sleep(self._interval, loop=self._loop)
+        except asyncio.CancelledError:
+            while queue:
+                self._cancel(queue.popleft()[-1])
+            raise
+        finally:
+            del self._queues[key]
+            del self._workers[key]
+
+    @staticmethod
+    def _cancel(future):
+        if not future.done():
+            future.set_exception(SlackOutboundCancelled())
+
+    def stop(self):
+        """
+        Cancel the running and queued jobs
+        """
+        for worker in list(self._workers.values()):
+            worker.cancel()
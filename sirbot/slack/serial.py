@@ -0,0 +1,124 @@
+import collections
+import logging
+
+from sirbot.utils import ensure_future
+
+from .metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+SERIAL_KEYS = ('channel', 'thread', 'user')
+
+
+def serial_key(serial, channel, thread, user):
+    """
+    Ordering key of a handler invocation
+
+    :param serial: ``channel``, ``thread``, ``user`` or None
+    :param channel: Id of the channel
+    :param thread: Timestamp of the thread
+    :param user: Id of the user
+    :return: Key (or None to run the invocation concurrently)
+    """
+    if not serial:
+        return None
+    elif serial == 'channel':
+        value = channel
+    elif serial == 'thread':
+        value = '{}:{}'.format(channel, thread) if thread else None
+    else:
+        value = user
+
+    if not value:
+        return None
+    return '{}:{}'.format(serial, value)
+
+
+def check_serial(serial):
+    if serial and serial not in SERIAL_KEYS:
+        raise ValueError('serial must be one of {}'.format(
+            ', '.join(SERIAL_KEYS)))
+
+
+class KeyedExecutor:
+    """
+    Serial execution of the jobs sharing a key.
+
+    Jobs sharing a key (i.e: a channel id) are run one after the other in
+    submission order while jobs of different keys run concurrently. The keys
+    share a pool of at most ``workers`` workers: a worker runs one job of a
+    key then moves to the next key waiting, so a busy key can't starve the
+    other ones.
+
+    :param loop: Event loop
+    :param workers: Maximum number of jobs running at once
+    """
+
+    def __init__(self, loop, workers=32):
+        self._loop = loop
+        self._workers = workers
+        self._queues = dict()
+        self._ready = collections.deque()
+        self._running = 0
+
+        self.submitted = 0
+        self.completed = 0
+        self.max_depth = 0
+        self.wait = Histogram()
+
+    def submit(self, key, func, *args, **kwargs):
+        """
+        Queue a job behind the other jobs of its key
+
+        :param key: Ordering key of the job
+        :param func: Coroutine function to run
+        """
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = collections.deque()
+            self._ready.append(key)
+
+        queue.append((func, args, kwargs, self._loop.time()))
+        self.submitted += 1
+        self.max_depth = max(self.max_depth, len(queue))
+
+        if self._running < self._workers:
+            self._running += 1
+            ensure_future(self._worker(), loop=self._loop, logger=logger)
+
+    async def _worker(self):
+        try:
+            while self._ready:
+                key = self._ready.popleft()
+                queue = self._queues[key]
+                func, args, kwargs, queued_at = queue.popleft()
+                self.wait.observe(self._loop.time() - queued_at)
+
+                try:
+                    await func(*args, **kwargs)
+                except Exception as e:
+                    logger.exception(e)
+                finally:
+                    self.completed += 1
+                    # The key is only ready again once its job is done
+                    if queue:
+                        self._ready.append(key)
+                    else:
+                        del self._queues[key]
+        finally:
+            self._running -= 1
+
+    def snapshot(self):
+        return {
+            'workers': self._running,
+            'keys': len(self._queues),
+            'queued': sum(len(queue) for queue in self._queues.values()),
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'max_depth': self.max_depth,
+            'wait': self.wait.snapshot(),
+            'queued_by_key': {
+                key: len(queue) for key, queue in self._queues.items()
+                if queue
+            },
+        }
@@ -0,0 +1,92 @@
+import collections
+import copy
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class StoreCache:
+    """
+    Bounded in-memory cache of the items of a store.
+
+    An item is served from the cache as long as it is fresher than the
+    ``refresh`` time of its store, so a cached item expires exactly when the
+    store would query the slack API for it. When the cache is full the least
+    recently used item is evicted.
+
+    The items are copied in and out of the cache: a caller modifying an item
+    (i.e: the bot ``type``) doesn't modify the items of the other callers.
+
+    :param refresh: Maximum age in seconds of a cached item (``last_update``)
+    :param size: Maximum number of items (0 to deactivate the cache)
+    """
+
+    def __init__(self, refresh=3600, size=5000):
+        self._refresh = refresh
+        self._size = size
+        self._items = collections.OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, id_):
+        """
+        Return a fresh cached item
+
+        :param id_: Id of the item
+        :return: Item or None
+        """
+        item = self._items.get(id_)
+        if item is None:
+            self.misses += 1
+            return None
+        elif (item.last_update or 0) < time.time() - self._refresh:
+            del self._items[id_]
+            self.expired += 1
+            self.misses += 1
+            return None
+
+        self._items.move_to_end(id_)
+        self.hits += 1
+        return copy.copy(item)
+
+    def set(self, item):
+        """
+        Add or replace an item
+
+        :param item: Item with an ``id`` and a ``last_update``
+        """
+        if not self._size:
+            return
+
+        self._items[item.id] = copy.copy(item)
+        self._items.move_to_end(item.id)
+
+        while len(self._items) > self._size:
+            self._items.popitem(last=False)
+            self.evicted += 1
+
+    def pop(self, id_):
+        """
+        Remove an item
+
+        :param id_: Id of the item
+        """
+        self._items.pop(id_, None)
+
+    def snapshot(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._items),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0,
+            'expired': self.expired,
+            'evicted': self.evicted,
+        }
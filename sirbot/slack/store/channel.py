@@ -1,11 +1,10 @@
-import json
 import logging
 import time
 
 from sirbot.core import registry
 
 from .store import SlackStore, SlackChannelItem
-from .. import database
+from .. import codec, database
 
 logger = logging.getLogger(__name__)
 
@@ -35,23 +34,57 @@ class ChannelStore(SlackStore):
     Store for the slack channels
     """
 
-    def __init__(self, client, refresh=3600):
-        super().__init__(client, refresh)
+    def __init__(self, client, refresh=3600, cache_size=5000):
+        super().__init__(client, refresh, cache_size)
 
     async def all(self):
+        """
+        Retrieve all the channels of the slack team
+
+        :return: list of Channel
+        """
+        return [channel async for channel in self.iter_all()]
+
+    async def iter_all(self):
+        """
+        Asynchronously iterate over all the channels of the slack team
+
+        Channels are queried and stored page by page, only one page is held
+        in memory at a time.
+
+        :Example:
+
+        >>> async for channel in slack.channels.iter_all():
+        ...     print(channel.name)
+        """
+        db = registry.get('database')
+        page_size = self._client.page_size
+        count = 0
 
-        channels = list()
-        channels_raw = await self._client.get_channels()
-        for channel_raw in channels_raw:
-            channel = await self.get(channel_raw['id'])
-            channels.append(channel)
+        async for channel_raw in self._client.iter_channels():
+            channel = Channel(
+                id_=channel_raw['id'],
+                raw=channel_raw,
+                last_update=time.time()
+            )
+            await database.__dict__[db.type].channel.add(db, channel)
+            self._cache.set(channel)
 
-        return channels
+            count += 1
+            if not count % page_size:
+                await db.commit()
+
+            yield channel
+
+        await db.commit()
 
     async def get(self, id_=None, name=None, fetch=False):
         """
         Return a Channel from the Channel Manager
 
+        Fresh channels looked up by id are served from the in-memory cache
+        without querying the database.
+
         :param id_: id of the channel
         :param name: name of the channel
         :param update: query the slack api for updated channel info
@@ -60,6 +93,11 @@ class ChannelStore(SlackStore):
         if not id_ and not name:
             raise SyntaxError('id_ or name must be supplied')
 
+        if id_ and not name and not fetch:
+            channel = self._cache.get(id_)
+            if channel:
+                return channel
+
         db = registry.get('database')
         if name:
             data = await database.__dict__[db.type].channel.find_by_name(db,
@@ -74,14 +112,15 @@ class ChannelStore(SlackStore):
             if channel:
                 await self._add(channel, db=db)
             else:
-                await self._delete(channel, db=db)
+                await self._delete(data['id'], db=db)
 
         elif data:
             channel = Channel(
                 id_=data['id'],
-                raw=json.loads(data['raw']),
+                raw=codec.loads(data['raw']),
                 last_update=data['last_update']
             )
+            self._cache.set(channel)
         else:
             logger.debug('Channel "%s" not found in the channel store. '
                          'Querying the Slack API', (id_ or name))
@@ -105,6 +144,7 @@ class ChannelStore(SlackStore):
 
         await database.__dict__[db.type].channel.add(db, channel)
         await db.commit()
+        self._cache.set(channel)
 
     async def _delete(self, id_, db=None):
         """
@@ -119,6 +159,7 @@ class ChannelStore(SlackStore):
 
         await database.__dict__[db.type].channel.delete(db, id_)
         await db.commit()
+        self._cache.pop(id_)
 
     async def _query_by_id(self, id_):
         raw = await self._client.get_channel(id_)
@@ -131,8 +172,7 @@ class ChannelStore(SlackStore):
         return channel
 
     async def _query_by_name(self, name):
-        channels = await self._client.get_channels()
-        for channel in channels:
+        async for channel in self._client.iter_channels():
             if channel['name'] == name:
                 c = await self.get(id_=channel['id'])
                 return c
@@ -1,11 +1,10 @@
-import json
 import logging
 import time
 
 from sirbot.core import registry
 
 from .store import SlackStore, SlackChannelItem
-from .. import database
+from .. import codec, database
 
 logger = logging.getLogger(__name__)
 
@@ -24,14 +23,19 @@ class GroupStore(SlackStore):
     Store for the slack groups (private channels)
     """
 
-    def __init__(self, client, refresh=3600):
-        super().__init__(client, refresh)
+    def __init__(self, client, refresh=3600, cache_size=5000):
+        super().__init__(client, refresh, cache_size)
 
     async def all(self):
         pass
 
     async def get(self, id_=None, fetch=False):
 
+        if not fetch:
+            group = self._cache.get(id_)
+            if group:
+                return group
+
         db = registry.get('database')
         data = await database.__dict__[db.type].group.find(db, id_)
 
@@ -42,14 +46,15 @@ class GroupStore(SlackStore):
             if group:
                 await self._add(group, db=db)
             else:
-                await self._delete(group, db=db)
+                await self._delete(id_, db=db)
 
         elif data:
             group = Group(
                 id_=data['id'],
-                raw=json.loads(data['raw']),
+                raw=codec.loads(data['raw']),
                 last_update=data['last_update']
             )
+            self._cache.set(group)
         else:
             logger.debug('Group "%s" not found in the channel store. '
                          'Querying the Slack API', id_)
@@ -68,6 +73,7 @@ class GroupStore(SlackStore):
 
         await database.__dict__[db.type].group.add(db, group)
         await db.commit()
+        self._cache.set(group)
 
     async def _delete(self, id_, db=None):
 
@@ -76,6 +82,7 @@ class GroupStore(SlackStore):
 
         await database.__dict__[db.type].group.delete(db, id_)
         await db.commit()
+        self._cache.pop(id_)
 
     async def _query(self, id_):
         raw = await self._client.get_group(id_)
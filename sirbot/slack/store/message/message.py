@@ -1,8 +1,10 @@
-import json
 import logging
 import asyncio
 
+from ..channel import Channel
+from ..group import Group
 from ..user import User
+from ... import codec
 from ...errors import SlackMessageError
 
 logger = logging.getLogger('sirbot.slack')
@@ -29,6 +31,7 @@ class SlackMessage:
         self.content.text = text
         self.response_url = response_url
         self._thread_callback = (None, None)
+        self.resolved = True
 
     @property
     def to(self):
@@ -149,8 +152,17 @@ class SlackMessage:
         )
 
     @classmethod
-    async def from_raw(cls, data, slack):
+    async def from_raw(cls, data, slack, resolve=True):
+        """
+        Create a message from an incoming slack message
 
+        :param data: Incoming message
+        :param slack: Slack wrapper
+        :param resolve: Query the stores for the author and the channel. When
+        False ``frm`` and ``to`` only hold the ids until :meth:`resolve` is
+        called
+        :return: Message
+        """
         text = data.get('text') or data.get('message', {}).get('text', '')
         channel_id = data.get('channel') or data.get('message', {}).get(
             'channel')
@@ -159,20 +171,24 @@ class SlackMessage:
 
         user_id = cls._find_user(data)
 
-        if user_id:
+        if not user_id:
+            frm = None
+        elif resolve:
             frm = await slack.users.get(user_id)
         else:
-            frm = None
+            frm = User(id_=user_id)
 
         if channel_id.startswith('D'):
             mention = True
             to = slack.bot
         elif channel_id.startswith('C'):
             mention = False
-            to = await slack.channels.get(channel_id)
+            to = await slack.channels.get(channel_id) if resolve else \
+                Channel(id_=channel_id)
         else:
             mention = False
-            to = await slack.groups.get(channel_id)
+            to = await slack.groups.get(channel_id) if resolve else \
+                Group(id_=channel_id)
 
         if slack.bot and slack.bot.id in text:
             mention = True
@@ -193,9 +209,30 @@ class SlackMessage:
             content=content,
             raw=data,
         )
+        message.resolved = resolve
 
         return message
 
+    async def resolve(self, slack):
+        """
+        Query the stores for the author and the channel of a message created
+        with ``from_raw(..., resolve=False)``
+
+        :param slack: Slack wrapper
+        """
+        if self.resolved:
+            return
+
+        if self.frm:
+            self.frm = await slack.users.get(self.frm.id)
+
+        if isinstance(self._to, Channel):
+            self._to = await slack.channels.get(self._to.id)
+        elif isinstance(self._to, Group):
+            self._to = await slack.groups.get(self._to.id)
+
+        self.resolved = True
+
     @staticmethod
     def _find_user(data):
         if 'user' in data:
@@ -238,7 +275,7 @@ class SlackContent:
                            self.attachments]
 
             if attachment_type == 'json':
-                data['attachments'] = json.dumps(attachments)
+                data['attachments'] = codec.dumps(attachments)
             else:
                 data['attachments'] = attachments
 
@@ -1,13 +1,16 @@
 import logging
 
+from .cache import StoreCache
+
 logger = logging.getLogger(__name__)
 
 
 class SlackStore:
 
-    def __init__(self, client, refresh=3600):
+    def __init__(self, client, refresh=3600, cache_size=5000):
         self._client = client
         self._refresh = refresh
+        self._cache = StoreCache(refresh=refresh, size=cache_size)
 
     async def all(self):
         pass
@@ -21,6 +24,9 @@ class SlackStore:
     async def _delete(self, id_):
         pass
 
+    def snapshot(self):
+        return self._cache.snapshot()
+
 
 class SlackItem:
 
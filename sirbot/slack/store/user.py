@@ -1,10 +1,9 @@
-import json
 import logging
 import time
 
 from sirbot.core import registry
 
-from .. import database
+from .. import codec, database
 from .store import SlackStore, SlackItem
 
 logger = logging.getLogger(__name__)
@@ -58,8 +57,8 @@ class UserStore(SlackStore):
     Manager for the user object
     """
 
-    def __init__(self, client, refresh=3600):
-        super().__init__(client, refresh)
+    def __init__(self, client, refresh=3600, cache_size=5000):
+        super().__init__(client, refresh, cache_size)
 
     async def all(self, fetch=False, deleted=False):
         """
@@ -71,12 +70,29 @@ class UserStore(SlackStore):
         :param deleted:
         :return:
         """
+        return [user async for user in self.iter_all(fetch, deleted)]
+
+    async def iter_all(self, fetch=False, deleted=False):
+        """
+        Asynchronously iterate over all the users of the slack team
+
+        Users are queried and stored page by page, only one page is held in
+        memory at a time. When fetch is True no dm_id are provided.
+
+        :Example:
+
+        >>> async for user in slack.users.iter_all(fetch=True):
+        ...     print(user.name)
+
+        :param fetch: Query the users from the slack API
+        :param deleted: Include the deleted users
+        """
         db = registry.get('database')
+        page_size = self._client.page_size
 
         if fetch:
-            users = list()
-            fetched_data = await self._client.get_users()
-            for data in fetched_data:
+            count = 0
+            async for data in self._client.iter_users():
                 user = User(
                     id_=data['id'],
                     raw=data,
@@ -86,35 +102,45 @@ class UserStore(SlackStore):
 
                 await database.__dict__[db.type].user.add(db, user,
                                                           dm_id=False)
-                if deleted:
-                    users.append(user)
-                elif not deleted and not user.deleted:
-                    users.append(user)
+                # The stored dm_id is kept but this user doesn't have it
+                self._cache.pop(user.id)
+
+                count += 1
+                if not count % page_size:
+                    await db.commit()
+
+                if deleted or not user.deleted:
+                    yield user
             await db.commit()
         else:
-            data = await database.__dict__[db.type].user.get_all(
-                db, deleted=deleted)
-            users = [User(
-                id_=raw_data['id'],
-                raw=raw_data['raw'],
-                last_update=raw_data['last_update'],
-                dm_id=raw_data['dm_id'],
-                deleted=raw_data['deleted']
-            ) for raw_data in data]
-
-        return users
+            async for raw_data in database.__dict__[db.type].user.iter_all(
+                    db, deleted=deleted, size=page_size):
+                yield User(
+                    id_=raw_data['id'],
+                    raw=codec.loads(raw_data['raw']),
+                    last_update=raw_data['last_update'],
+                    dm_id=raw_data['dm_id'],
+                    deleted=raw_data['deleted']
+                )
 
     async def get(self, id_, fetch=False, dm=False):
         """
         Return an User from the User Manager
 
-        If the user doesn't exist query the slack API for it
+        If the user doesn't exist query the slack API for it. Fresh users are
+        served from the in-memory cache without querying the database.
 
         :param id_: id of the user
         :param dm: Query the direct message channel id
         :param update: query the slack api for updated user info
         :return: User
         """
+        user = None if fetch else self._cache.get(id_)
+        if user:
+            if dm:
+                await self.ensure_dm(user)
+            return user
+
         db = registry.get('database')
         data = await database.__dict__[db.type].user.find(db, id_)
 
@@ -130,11 +156,12 @@ class UserStore(SlackStore):
         elif data:
             user = User(
                 id_=id_,
-                raw=json.loads(data['raw']),
+                raw=codec.loads(data['raw']),
                 dm_id=data['dm_id'],
                 last_update=data['last_update'],
                 deleted=data['deleted']
             )
+            self._cache.set(user)
         else:
             user = await self._query(id_)
             if user:
@@ -156,6 +183,7 @@ class UserStore(SlackStore):
 
         await database.__dict__[db.type].user.add(db, user)
         await db.commit()
+        self._cache.set(user)
 
     async def _delete(self, id_, db=None):
         """
@@ -170,6 +198,7 @@ class UserStore(SlackStore):
 
         await database.__dict__[db.type].user.delete(db, id_)
         await db.commit()
+        self._cache.pop(id_)
 
     async def _query(self, id_, dm_id=None):
 
@@ -197,3 +226,4 @@ class UserStore(SlackStore):
             await database.__dict__[db.type].user.update_dm_id(
                 db, user.id, user.dm_id)
             await db.commit()
+            self._cache.set(user)
@@ -0,0 +1,327 @@
+import asyncio
+import collections
+import heapq
+import importlib
+import inspect
+import itertools
+import logging
+import time
+import uuid
+
+from sirbot.core import registry
+from sirbot.utils import ensure_future
+
+from . import database
+from .executor import handler_name
+
+logger = logging.getLogger(__name__)
+
+# Minimum time in seconds between two removals of the expired callbacks from
+# the database
+CLEANUP_INTERVAL = 60
+
+
+class ThreadCallback:
+    __slots__ = ('func', 'expires_at', 'on_expire', 'seq', 'serial')
+
+    def __init__(self, func, expires_at, on_expire, seq, serial=None):
+        self.func = func
+        self.expires_at = expires_at
+        self.on_expire = on_expire
+        self.seq = seq
+        self.serial = serial
+
+
+class ThreadRegistry:
+    """
+    Bounded registry of the thread callbacks.
+
+    A callback is registered for a thread and a user (or ``all``) and is
+    removed when it is used, after ``ttl`` seconds or when the registry is
+    full (least recently registered first). The ``on_expire`` callback of an
+    expired or evicted entry is called with the thread and the user id.
+
+    :param loop: Event loop
+    :param ttl: Default lifetime in seconds of a callback (0 for no expiry)
+    :param size: Maximum number of callbacks
+    """
+
+    def __init__(self, loop, ttl=86400, size=10000):
+        self._loop = loop
+        self._ttl = ttl
+        self._size = size
+        self._callbacks = collections.OrderedDict()
+        self._threads = collections.Counter()
+        self._expiry = list()
+        self._seq = itertools.count()
+        self._timer = None
+        self._timer_at = None
+
+        self.added = 0
+        self.matched = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._callbacks)
+
+    def __contains__(self, thread):
+        return thread in self._threads
+
+    def add(self, thread, func, user_id='all', ttl=None, on_expire=None,
+            serial=None):
+        """
+        Register a thread callback
+
+        :param thread: Timestamp of the thread
+        :param func: Callback
+        :param user_id: Id of the user or ``all``
+        :param ttl: Lifetime in seconds (default to the registry ttl)
+        :param on_expire: Function or coroutine function called with the
+        thread and user id when the callback expires unused
+        :param serial: Run the callback after the handlers of the same
+        ``channel``, ``thread`` or ``user``
+        """
+        ttl = self._ttl if ttl is None else ttl
+        expires_at = self._loop.time() + ttl if ttl else None
+        seq = next(self._seq)
+
+        key = (thread, user_id)
+        if self._callbacks.pop(key, None) is None:
+            self._threads[thread] += 1
+
+        self._callbacks[key] = ThreadCallback(func, expires_at, on_expire,
+                                              seq, serial)
+        self.added += 1
+
+        if expires_at is not None:
+            heapq.heappush(self._expiry, (expires_at, seq, key))
+            self._schedule()
+
+        while len(self._callbacks) > self._size:
+            key, callback = self._callbacks.popitem(last=False)
+            self._forget(key[0])
+            self.evicted += 1
+            self._notify(key, callback)
+
+        if len(self._expiry) > 2 * len(self._callbacks) + 100:
+            self._compact()
+
+    def pop(self, thread, user_id):
+        """
+        Remove and return the callback of a user in a thread (or the callback
+        of every user of the thread)
+
+        :param thread: Timestamp of the thread
+        :param user_id: Id of the user
+        :return: :class:`ThreadCallback` or None
+        """
+        if thread not in self._threads:
+            return None
+
+        for key in ((thread, user_id), (thread, 'all')):
+            callback = self._callbacks.pop(key, None)
+            if callback:
+                logger.debug('Located thread handler for "%s" and "%s"',
+                             thread, key[1])
+                self._forget(thread)
+                self.matched += 1
+                return callback
+
+        return None
+
+    async def claim(self, thread, user_id):
+        """
+        Remove and return the callback of a user in a thread (or the callback
+        of every user of the thread)
+
+        :param thread: Timestamp of the thread
+        :param user_id: Id of the user
+        :return: :class:`ThreadCallback` or None
+        """
+        return self.pop(thread, user_id)
+
+    def _forget(self, thread):
+        self._threads[thread] -= 1
+        if not self._threads[thread]:
+            del self._threads[thread]
+
+    def _notify(self, key, callback):
+        if not callback.on_expire:
+            return
+
+        try:
+            result = callback.on_expire(*key)
+            if asyncio.iscoroutine(result):
+                ensure_future(result, loop=self._loop, logger=logger)
+        except Exception as e:
+            logger.exception(e)
+
+    def _schedule(self):
+        """
+        Arm the timer for the next expiry
+        """
+        if not self._expiry:
+            return
+
+        # TimerHandle.when() is only available on python >= 3.7
+        when = self._expiry[0][0]
+        if self._timer is not None and self._timer_at <= when:
+            return
+        elif self._timer is not None:
+            self._timer.cancel()
+
+        self._timer = self._loop.call_at(when, self._expire)
+        self._timer_at = when
+
+    def _expire(self):
+        self._timer = self._timer_at = None
+        now = self._loop.time()
+
+        while self._expiry and self._expiry[0][0] <= now:
+            _, seq, key = heapq.heappop(self._expiry)
+            callback = self._callbacks.get(key)
+            if callback is None or callback.seq != seq:
+                continue
+
+            del self._callbacks[key]
+            self._forget(key[0])
+            self.expired += 1
+            logger.debug('Thread handler for "%s" and "%s" expired', *key)
+            self._notify(key, callback)
+
+        self._schedule()
+
+    def _compact(self):
+        """
+        Drop the heap entries of the removed callbacks
+        """
+        self._expiry = [
+            (callback.expires_at, callback.seq, key)
+            for key, callback in self._callbacks.items()
+            if callback.expires_at is not None
+        ]
+        heapq.heapify(self._expiry)
+
+    def snapshot(self):
+        return {
+            'size': len(self._callbacks),
+            'threads': len(self._threads),
+            'added': self.added,
+            'matched': self.matched,
+            'expired': self.expired,
+            'evicted': self.evicted,
+        }
+
+
+class SharedThreadRegistry(ThreadRegistry):
+    """
+    Thread registry shared by the worker processes through the database.
+
+    The callbacks are recorded in the database by name so the reply can be
+    handled by any worker: the first worker claiming a callback runs it. They
+    must be module level functions. The ``on_expire`` callback is only called
+    by the worker that registered the callback, if no worker claimed it.
+
+    :param loop: Event loop
+    :param ttl: Default lifetime in seconds of a callback (0 for no expiry)
+    :param size: Maximum number of callbacks registered by the worker
+    """
+
+    def __init__(self, loop, ttl=86400, size=10000):
+        super().__init__(loop, ttl, size)
+        self._prefix = uuid.uuid4().hex
+        self._cleaned_at = time.time()
+
+    def add(self, thread, func, user_id='all', ttl=None, on_expire=None,
+            serial=None):
+        name = handler_name(func)
+        if inspect.ismethod(func) or \
+                getattr(func, '__qualname__', None) != func.__name__:
+            raise ValueError('Thread callbacks shared between workers must '
+                             'be module level functions: {}'.format(name))
+
+        super().add(thread, func, user_id=user_id, ttl=ttl,
+                    on_expire=on_expire, serial=serial)
+
+        callback = self._callbacks[(thread, user_id)]
+        ttl = self._ttl if ttl is None else ttl
+        ensure_future(
+            self._store(thread, user_id, self._token(callback), name, serial,
+                        time.time() + ttl if ttl else None),
+            loop=self._loop, logger=logger
+        )
+
+    def _token(self, callback):
+        return '{}.{}'.format(self._prefix, callback.seq)
+
+    async def _store(self, thread, user_id, token, name, serial, expires_at):
+        db = registry.get('database')
+        await database.__dict__[db.type].thread.add(
+            db, thread, user_id, token, name, serial, expires_at
+        )
+
+        now = time.time()
+        if now - self._cleaned_at > CLEANUP_INTERVAL:
+            await database.__dict__[db.type].thread.expire(db, now)
+            self._cleaned_at = now
+
+        await db.commit()
+
+    async def claim(self, thread, user_id):
+        db = registry.get('database')
+        rows = await database.__dict__[db.type].thread.find(
+            db, thread, user_id, time.time()
+        )
+
+        for row in rows:
+            claimed = await database.__dict__[db.type].thread.delete(
+                db, row['thread'], row['user_id'], row['token']
+            )
+            await db.commit()
+            if not claimed:
+                # Claimed by another worker
+                continue
+
+            logger.debug('Located thread handler for "%s" and "%s"',
+                         thread, row['user_id'])
+            self.matched += 1
+
+            key = (thread, row['user_id'])
+            callback = self._callbacks.get(key)
+            if callback and self._token(callback) == row['token']:
+                del self._callbacks[key]
+                self._forget(thread)
+                return callback
+
+            return ThreadCallback(_resolve(row['callback']),
+                                  row['expires_at'], None, None,
+                                  row['serial'])
+
+        return None
+
+    def _notify(self, key, callback):
+        ensure_future(self._expire_shared(key, callback), loop=self._loop,
+                      logger=logger)
+
+    async def _expire_shared(self, key, callback):
+        """
+        Remove an expired or evicted callback from the database and notify
+        its expiry if no other worker claimed it
+        """
+        db = registry.get('database')
+        removed = await database.__dict__[db.type].thread.delete(
+            db, key[0], key[1], self._token(callback)
+        )
+        await db.commit()
+
+        if removed:
+            super()._notify(key, callback)
+
+
+def _resolve(name):
+    """
+    Import a module level function from its name
+    """
+    module, _, qualname = name.rpartition('.')
+    return getattr(importlib.import_module(module), qualname)
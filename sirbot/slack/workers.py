@@ -0,0 +1,240 @@
+"""
+Multi-process deployment of the bot.
+
+N worker processes share the listening socket, each one running its own
+event loop, bot and dispatchers:
+
+    $ python -m sirbot.slack.workers --config sirbot.yml --port 8080 \\
+        --workers 4
+
+With ``SO_REUSEPORT`` (the default when available) every worker binds its own
+socket and the kernel balances the connections between them. Otherwise the
+socket is bound once by the parent and inherited by the forked workers
+(pre-fork).
+
+Workers don't share memory, the state is handled as follow:
+
+    * The deduplication index and the thread callbacks are shared through
+      the database (``dedup.shared`` and ``threads.shared`` are activated).
+    * The users, channels and groups stores are shared through the
+      database. Each worker keeps its own cache.
+    * Only the first worker connects to the RTM API, the other ones only
+      serve the webhook endpoints.
+    * The rate limits are split between the workers (``rate_limit.margin``
+      is divided by the number of workers).
+    * The ingest queues are local to a worker. Events of a channel are
+      processed in order by a worker, not across workers.
+    * Recording and spill files are suffixed with the worker number.
+"""
+
+import argparse
+import asyncio
+import copy
+import logging
+import os
+import signal
+import socket
+import sys
+
+import yaml
+from aiohttp import web
+from sirbot.core import SirBot
+
+logger = logging.getLogger(__name__)
+
+REUSE_PORT = hasattr(socket, 'SO_REUSEPORT')
+
+
+def bind(host, port, reuse_port=REUSE_PORT, backlog=128):
+    """
+    Create a listening socket
+
+    :param host: Host to listen on
+    :param port: Port to listen on
+    :param reuse_port: Allow multiple sockets to bind the same port
+    :param backlog: Size of the pending connections queue
+    :return: Listening socket
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.setblocking(False)
+    return sock
+
+
+def _suffix(path, worker):
+    root, ext = os.path.splitext(path)
+    if ext == '.gz':
+        root, inner = os.path.splitext(root)
+        ext = inner + ext
+    return '{}.{}{}'.format(root, worker, ext)
+
+
+def _default_config():
+    path = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'config.yml'
+    )
+    with open(path) as file:
+        return yaml.load(file)['slack']
+
+
+class WorkerBot(SirBot):
+    """
+    Sir Bot-a-lot able to serve an already bound socket
+    """
+
+    def run(self, host='0.0.0.0', port=8080, sock=None):
+        """
+        Start sirbot
+
+        Same as :meth:`SirBot.run`, serving ``sock`` when given instead of
+        binding host and port.
+
+        :param host: Host
+        :param port: Port
+        :param sock: Listening socket
+        """
+        if sock is None:
+            return super().run(host=host, port=port)
+
+        self._loop.run_until_complete(self._configure_plugins())
+        web.run_app(self.app, sock=sock, loop=self._loop,
+                    print=lambda *args: None)
+
+
+def worker_config(config, worker, workers):
+    """
+    Configuration of a worker
+
+    :param config: Bot configuration
+    :param worker: Number of the worker (starting at 0)
+    :param workers: Number of workers
+    :return: Configuration of the worker
+    """
+    config = copy.deepcopy(config)
+    slack = config.setdefault('slack', dict())
+    default = _default_config()
+
+    if worker:
+        slack['rtm'] = False
+
+    if workers > 1:
+        for key in ('dedup', 'threads'):
+            if slack.get(key) is not False:
+                slack[key] = dict(slack.get(key) or dict(), shared=True)
+
+    rate_limit = slack.setdefault('rate_limit', dict())
+    rate_limit['margin'] = rate_limit.get(
+        'margin', default['rate_limit']['margin']) / workers
+
+    if slack.get('record'):
+        slack['record'] = _suffix(slack['record'], worker)
+
+    spill = slack.get('events_queue', dict()).get('spill')
+    if spill:
+        slack['events_queue']['spill'] = _suffix(spill, worker)
+
+    return config
+
+
+def run_worker(config, sock, worker):
+    """
+    Run a bot on an already bound socket (in the worker process)
+    """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    logger.info('Starting worker %s (pid %s)', worker, os.getpid())
+    WorkerBot(config=config, loop=loop).run(sock=sock)
+
+
+def run(config, host='0.0.0.0', port=8080, workers=os.cpu_count(),
+        reuse_port=REUSE_PORT):
+    """
+    Fork the workers and wait for them
+
+    A SIGINT or SIGTERM received by the parent is forwarded to the workers.
+
+    :param config: Bot configuration
+    :param host: Host to listen on
+    :param port: Port to listen on
+    :param workers: Number of worker processes
+    :param reuse_port: Use SO_REUSEPORT instead of a shared socket
+    :return: Exit code
+    """
+    sock = None if reuse_port else bind(host, port, reuse_port=False)
+    pids = dict()
+
+    for worker in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                if reuse_port:
+                    sock = bind(host, port, reuse_port=True)
+                run_worker(worker_config(config, worker, workers), sock,
+                           worker)
+            except Exception as e:
+                logger.exception(e)
+                code = 1
+            finally:
+                os._exit(code)
+        pids[pid] = worker
+
+    if sock:
+        sock.close()
+
+    def stop(signum, frame):
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    code = 0
+    while pids:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        worker = pids.pop(pid, None)
+        if os.WIFEXITED(status) and os.WEXITSTATUS(status):
+            logger.warning('Worker %s exited with status %s', worker,
+                           os.WEXITSTATUS(status))
+            code = 1
+
+    return code
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Run the bot in multiple worker processes'
+    )
+    parser.add_argument('--config', required=True,
+                        help='Path of the bot configuration file')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='Number of worker processes')
+    parser.add_argument('--no-reuse-port', action='store_true',
+                        help='Share one socket between the workers')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    with open(args.config) as file:
+        config = yaml.load(file)
+
+    sys.exit(run(config, host=args.host, port=args.port,
+                 workers=args.workers,
+                 reuse_port=REUSE_PORT and not args.no_reuse_port))
+
+
+if __name__ == '__main__':
+    main()
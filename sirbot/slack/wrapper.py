@@ -1,7 +1,10 @@
+import asyncio
 import logging
 
 from .store.user import User
-from .errors import SlackInactiveDispatcher, SlackNoThread
+from .errors import (SlackInactiveDispatcher, SlackInactiveThreads,
+                     SlackNoThread)
+from .serial import check_serial
 
 logger = logging.getLogger(__name__)
 
@@ -15,9 +18,11 @@ class SlackWrapper:
     """
 
     def __init__(self, http_client, users, channels, groups, messages, threads,
-                 bot, dispatcher):
+                 bot, dispatcher, scheduler, executor):
 
         self._http_client = http_client
+        self._scheduler = scheduler
+        self._executor = executor
         self._threads = threads
         self._dispatcher = dispatcher
 
@@ -27,66 +32,121 @@ class SlackWrapper:
         self.groups = groups
         self.bot = bot
 
-    async def send(self, *messages):
+    async def send(self, *messages, wait=True):
         """
         Send the messages provided and update their timestamp
 
+        Messages to the same channel are sent in order, messages to different
+        channels are sent concurrently. Responses to actions and slash
+        commands (``response_url``) are sent in order but never paced.
+
         :param messages: Messages to send
+        :param wait: Wait for the messages to be sent
+        :return: List of futures resolving to the raw content of the sent
+        messages if wait is False, else the list of raw content
         """
+        futures = list()
         for message in messages:
-            message.frm = self.bot
-
-            if self.bot.type == 'rtm' and isinstance(message.to, User):
-                await self.users.ensure_dm(message.to)
-
             if message.response_url:
-                # Message with a response url are response to actions or slash
-                # commands
-                data = message.serialize(type_='response')
-                await self._http_client.response(
-                    data=data,
-                    url=message.response_url
-                )
-            elif isinstance(message.to, User) and self.bot.type == 'rtm':
-                data = message.serialize(type_='send', to=self.bot.type)
-                message.raw = await self._http_client.message_send(
-                    data=data,
-                    token='bot'
+                future = self._scheduler.schedule(
+                    message.response_url, self._send, message, pace=False
                 )
-            elif isinstance(message.to, User) and self.bot.type == 'event':
-                data = message.serialize(type_='send', to=self.bot.type)
-                message.raw = await self._http_client.message_send(data=data)
             else:
-                data = message.serialize(type_='send', to=self.bot.type)
-                message.raw = await self._http_client.message_send(data=data)
+                future = self._scheduler.schedule(message.to.id, self._send,
+                                                  message)
+            futures.append(future)
+
+        return await self._wait(futures, wait)
+
+    async def _send(self, message):
+        message.frm = self.bot
+
+        if self.bot.type == 'rtm' and isinstance(message.to, User):
+            await self.users.ensure_dm(message.to)
+
+        if message.response_url:
+            # Message with a response url are response to actions or slash
+            # commands
+            data = message.serialize(type_='response')
+            await self._http_client.response(
+                data=data,
+                url=message.response_url
+            )
+        elif isinstance(message.to, User) and self.bot.type == 'rtm':
+            data = message.serialize(type_='send', to=self.bot.type)
+            message.raw = await self._http_client.message_send(
+                data=data,
+                token='bot'
+            )
+        elif isinstance(message.to, User) and self.bot.type == 'event':
+            data = message.serialize(type_='send', to=self.bot.type)
+            message.raw = await self._http_client.message_send(data=data)
+        else:
+            data = message.serialize(type_='send', to=self.bot.type)
+            message.raw = await self._http_client.message_send(data=data)
+
+        return message.raw
 
-    async def update(self, *messages):
+    async def update(self, *messages, wait=True):
         """
         Update the messages provided and update their timestamp
 
+        Updates are sent in order with the other messages of their channel.
+
         :param messages: Messages to update
+        :param wait: Wait for the messages to be updated
+        :return: List of futures resolving to the raw content of the updated
+        messages if wait is False, else the list of raw content
         """
-        for message in messages:
+        futures = [
+            self._scheduler.schedule(message.to.id, self._update, message,
+                                     pace=False)
+            for message in messages
+        ]
+        return await self._wait(futures, wait)
+
+    async def _update(self, message):
 
-            if isinstance(message.to, User):
-                await self.users.ensure_dm(message.to)
+        if isinstance(message.to, User):
+            await self.users.ensure_dm(message.to)
 
-            message.frm = self.bot
-            message.subtype = 'message_changed'
-            message.raw = await self._http_client.message_update(
-                message=message)
-            message.ts = message.raw.get('ts')
+        message.frm = self.bot
+        message.subtype = 'message_changed'
+        message.raw = await self._http_client.message_update(
+            message=message)
+        message.ts = message.raw.get('ts')
 
-            # await self._save_outgoing_message(message)
+        # await self._save_outgoing_message(message)
+        return message.raw
 
-    async def delete(self, *messages):
+    async def delete(self, *messages, wait=True):
         """
         Delete the messages provided
 
+        Deletions are sent in order with the other messages of their channel.
+
         :param messages: Messages to delete
+        :param wait: Wait for the messages to be deleted
+        :return: List of futures resolving to the timestamp of the deleted
+        messages if wait is False, else the list of timestamp
         """
-        for message in messages:
-            message.timestamp = await self._http_client.message_delete(message)
+        futures = [
+            self._scheduler.schedule(message.to.id, self._delete, message,
+                                     pace=False)
+            for message in messages
+        ]
+        return await self._wait(futures, wait)
+
+    async def _delete(self, message):
+        # The timestamp of a message is read-only (taken from its raw data)
+        return await self._http_client.message_delete(message)
+
+    @staticmethod
+    async def _wait(futures, wait):
+        if wait:
+            return await asyncio.gather(*futures)
+        else:
+            return futures
 
     async def add_reaction(self, message, reaction):
         """
@@ -133,35 +193,103 @@ class SlackWrapper:
         message.reactions = reactions
         return reactions
 
-    def add_action(self, id_, func, public=False):
+    async def run_in_executor(self, func, *args, process=False):
+        """
+        Run a blocking or CPU heavy function without blocking the event loop
+
+        :param func: Function to run
+        :param args: Arguments of the function
+        :param process: Run the function in the process pool, the function
+        and its arguments must be picklable
+        :return: Result of the function
+        """
+        return await self._executor.run(func, *args, process=process)
+
+    def add_action(self, id_, func, public=False, concurrency=None,
+                   timeout=None, overflow='queue', executor=None):
         if 'action' in self._dispatcher:
-            self._dispatcher['action'].register(id_, func, public=public)
+            self._dispatcher['action'].register(
+                id_, func, public=public, concurrency=concurrency,
+                timeout=timeout, overflow=overflow, executor=executor
+            )
         else:
             raise SlackInactiveDispatcher
 
-    def add_event(self, event, func):
+    def add_event(self, event, func, concurrency=None, timeout=None,
+                  overflow='queue', serial=None, executor=None):
         if 'event' in self._dispatcher:
-            self._dispatcher['event'].register(event, func)
+            self._dispatcher['event'].register(
+                event, func, concurrency=concurrency, timeout=timeout,
+                overflow=overflow, serial=serial, executor=executor
+            )
         else:
             raise SlackInactiveDispatcher
 
-    def add_command(self, command, func):
+    def add_command(self, command, func, concurrency=None, timeout=None,
+                    overflow='queue', executor=None):
         if 'command' in self._dispatcher:
-            self._dispatcher['command'].register(command, func)
+            self._dispatcher['command'].register(
+                command, func, concurrency=concurrency, timeout=timeout,
+                overflow=overflow, executor=executor
+            )
         else:
             raise SlackInactiveDispatcher
 
     def add_message(self, match, func, flags=0, mention=False, admin=False,
-                    channel_id='*'):
+                    channel_id='*', concurrency=None, timeout=None,
+                    overflow='queue', serial=None, executor=None):
         if 'action' in self._dispatcher:
-            self._dispatcher['message'].register(match, func, flags, mention,
-                                                 admin, channel_id)
+            self._dispatcher['message'].register(
+                match, func, flags, mention, admin, channel_id,
+                concurrency=concurrency, timeout=timeout, overflow=overflow,
+                serial=serial, executor=executor
+            )
         else:
             raise SlackInactiveDispatcher
 
-    def add_thread(self, message, func, user_id='all'):
+    def add_middleware(self, dispatcher, func, fail_open=False):
+        """
+        Add a middleware run on the raw incoming payloads of a dispatcher
+        before routing
+
+        The middleware is called with the payload (message or event
+        dictionary, slash command form data or action payload) and returns
+        the payload to dispatch, possibly modified, or None to drop it. The
+        payload is dropped if the middleware raises, unless ``fail_open``.
+
+        :param dispatcher: ``message``, ``event``, ``command`` or ``action``
+        :param func: Function or coroutine function
+        :param fail_open: Dispatch the payload when the middleware raises
+        """
+        if dispatcher in self._dispatcher:
+            self._dispatcher[dispatcher].add_middleware(func,
+                                                        fail_open=fail_open)
+        else:
+            raise SlackInactiveDispatcher
+
+    def add_thread(self, message, func, user_id='all', ttl=None,
+                   on_expire=None, serial=None):
+        """
+        Register a callback for the replies in the thread of a message
+
+        :param message: Message starting or part of the thread
+        :param func: Callback
+        :param user_id: Id of the user or ``all``
+        :param ttl: Lifetime in seconds of the callback (default to the
+        ``threads.ttl`` configuration)
+        :param on_expire: Function or coroutine function called with the
+        thread and user id if the callback expires unused
+        :param serial: Run the callback after the handlers of the same
+        ``channel``, ``thread`` or ``user``
+        """
+        check_serial(serial)
+
+        if self._threads is None:
+            raise SlackInactiveThreads()
 
         if message.thread or message.timestamp:
-            self._threads[message.thread or message.timestamp][user_id] = func
+            self._threads.add(message.thread or message.timestamp, func,
+                              user_id=user_id, ttl=ttl, on_expire=on_expire,
+                              serial=serial)
         else:
             raise SlackNoThread()
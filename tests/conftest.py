@@ -0,0 +1,19 @@
+import sqlite3
+
+import pytest
+from sirbot.core import registry
+from sirbot.plugins.sqlite import SQLiteWrapper
+
+from sirbot.slack import database
+
+
+@pytest.fixture
+def db(loop):
+    connection = sqlite3.connect(':memory:')
+    connection.row_factory = sqlite3.Row
+    registry['database'] = lambda: SQLiteWrapper(connection,
+                                                 connection.cursor())
+
+    db = registry.get('database')
+    loop.run_until_complete(database.sqlite.create_table(db))
+    return db
@@ -0,0 +1,123 @@
+import asyncio
+
+import aiohttp
+import pytest
+
+from sirbot.slack.api import APICaller, APIPath, HTTPClient
+from sirbot.slack.errors import SlackAPIError
+from sirbot.slack.retry import CircuitBreaker, RetryPolicy
+
+
+class Response:
+    def __init__(self, status=200, body=None, gate=None):
+        self.status = status
+        self.headers = {'Content-Type': 'application/json'}
+        self.body = body or {'ok': True}
+        self.gate = gate
+
+    async def json(self, loads):
+        return self.body
+
+    async def text(self):
+        return ''
+
+    async def __aenter__(self):
+        if self.gate is not None:
+            await self.gate.wait()
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+
+class Session:
+    closed = True
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def post(self, url, **kwargs):
+        self.calls += 1
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def caller(loop, session, attempts=3):
+    return APICaller('token', loop=loop, session=session,
+                     retry_policies={
+                         'users.info': RetryPolicy(attempts=attempts,
+                                                   backoff=0)
+                     },
+                     circuit_breaker=CircuitBreaker(loop, threshold=2))
+
+
+@pytest.mark.parametrize('error', [aiohttp.ClientOSError(),
+                                   asyncio.TimeoutError()])
+async def test_retry_connection_errors(loop, error):
+    session = Session(error, Response())
+    client = caller(loop, session)
+
+    url = APIPath.SLACK_API_ROOT.format('users.info')
+    assert await client._do_post(url) == {'ok': True}
+    assert session.calls == 2
+    assert client._circuit_breaker.state == 'closed'
+
+
+async def test_connection_errors_open_the_breaker(loop):
+    session = Session(asyncio.TimeoutError(), asyncio.TimeoutError())
+    client = caller(loop, session, attempts=2)
+
+    url = APIPath.SLACK_API_ROOT.format('users.info')
+    with pytest.raises(asyncio.TimeoutError):
+        await client._do_post(url)
+    assert client._circuit_breaker.state == 'open'
+
+
+async def test_single_flight(loop):
+    gate = asyncio.Event(loop=loop)
+    channel = {'ok': True, 'channel': {'id': 'C1'}}
+    session = Session(Response(body=channel, gate=gate),
+                      Response(body=channel))
+    client = HTTPClient('token', loop=loop, session=session)
+
+    calls = [asyncio.ensure_future(client.get_channel('C1'), loop=loop)
+             for _ in range(5)]
+    await asyncio.sleep(0, loop=loop)
+    gate.set()
+
+    assert await asyncio.gather(*calls, loop=loop) == [{'id': 'C1'}] * 5
+    assert session.calls == 1
+    assert not client._inflight
+
+    assert await client.get_channel('C1') == {'id': 'C1'}
+    assert session.calls == 2
+
+
+async def test_single_flight_error(loop):
+    gate = asyncio.Event(loop=loop)
+    session = Session(Response(body={'ok': False}, gate=gate))
+    client = HTTPClient('token', loop=loop, session=session)
+
+    calls = [asyncio.ensure_future(client.get_channel('C1'), loop=loop)
+             for _ in range(3)]
+    await asyncio.sleep(0, loop=loop)
+    gate.set()
+
+    results = await asyncio.gather(*calls, loop=loop, return_exceptions=True)
+    assert all(isinstance(result, SlackAPIError) for result in results)
+    assert session.calls == 1
+    assert not client._inflight
+
+
+async def test_single_flight_arguments(loop):
+    session = Session(Response(body={'ok': True, 'channel': 'C1'}),
+                      Response(body={'ok': True, 'channel': 'C2'}))
+    client = HTTPClient('token', loop=loop, session=session)
+
+    # Different arguments are different calls
+    await asyncio.gather(client.get_channel('C1'), client.get_channel('C2'),
+                         loop=loop)
+    assert session.calls == 2
@@ -0,0 +1,34 @@
+import pytest
+
+from sirbot.slack import codec
+
+DATA = {'type': 'message', 'text': 'héllo :wave:', 'ts': '1500000000.000001',
+        'attachments': [{'fields': [{'short': True, 'value': 1}]}]}
+
+
+@pytest.fixture
+def backends():
+    available = [name for name in codec.BACKENDS
+                 if name == 'json' or getattr(codec, name)]
+    default = codec.backend
+    yield available
+    codec.use(default)
+
+
+def test_default_backend():
+    assert codec.backend in codec.BACKENDS
+    assert codec.loads and codec.dumps
+
+
+def test_roundtrip(backends):
+    for name in backends:
+        codec.use(name)
+        encoded = codec.dumps(DATA)
+        assert isinstance(encoded, str)
+        assert codec.loads(encoded) == DATA
+        assert codec.loads(encoded.encode('utf-8')) == DATA
+
+
+def test_unknown_backend(backends):
+    with pytest.raises(ValueError):
+        codec.use('pickle')
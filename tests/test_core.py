@@ -1,2 +1,75 @@
+import asyncio
+
+from sirbot.slack.core import SirBotSlack
+from sirbot.slack.ingest import IngestQueue
+
+
+class Consumer:
+    def __init__(self, loop):
+        self.events = list()
+        self.release = asyncio.Event(loop=loop)
+
+    async def __call__(self, event):
+        await self.release.wait()
+        self.events.append(event)
+
+
+def rtm_plugin(loop, consumer, **kwargs):
+    plugin = SirBotSlack(loop=loop)
+    plugin._rtm_queue = IngestQueue(consumer, loop=loop, **kwargs)
+    plugin._rtm_queue.start()
+    return plugin
+
+
+def message(channel, i):
+    return {'type': 'message', 'channel': channel, 'ts': '{}.0'.format(i)}
+
+
 async def test_placeholder(loop, test_server):
     pass
+
+
+async def test_incoming_rtm_frame_order(loop):
+    consumer = Consumer(loop)
+    consumer.release.set()
+    plugin = rtm_plugin(loop, consumer, workers=2)
+
+    # Frames received before hello are ignored
+    await plugin._incoming_rtm_frame(message('C1', 0))
+    await plugin._incoming_rtm_frame({'type': 'hello'})
+    assert plugin.started
+
+    for i in range(1, 6):
+        await plugin._incoming_rtm_frame(message('C1', i))
+        await plugin._incoming_rtm_frame(message('C2', i))
+    await asyncio.sleep(0.01, loop=loop)
+
+    for channel in ('C1', 'C2'):
+        assert [e['ts'] for e in consumer.events if e['channel'] == channel] \
+            == ['{}.0'.format(i) for i in range(1, 6)]
+    assert plugin._rtm_last_seen == {'C1': '5.0', 'C2': '5.0'}
+    plugin._rtm_queue.stop()
+
+
+async def test_incoming_rtm_frame_full_queue(loop):
+    consumer = Consumer(loop)
+    plugin = rtm_plugin(loop, consumer, workers=1, size=1)
+    await plugin._incoming_rtm_frame({'type': 'hello'})
+
+    await plugin._incoming_rtm_frame(message('C1', 0))
+    await asyncio.sleep(0, loop=loop)
+    await plugin._incoming_rtm_frame(message('C1', 1))
+
+    # The websocket reader waits for room in the queue
+    frame = asyncio.ensure_future(
+        plugin._incoming_rtm_frame(message('C1', 2)), loop=loop
+    )
+    await asyncio.sleep(0.01, loop=loop)
+    assert not frame.done()
+    assert plugin._rtm_queue.depth == 1
+
+    consumer.release.set()
+    await frame
+    await asyncio.sleep(0.01, loop=loop)
+    assert [e['ts'] for e in consumer.events] == ['0.0', '1.0', '2.0']
+    plugin._rtm_queue.stop()
@@ -0,0 +1,77 @@
+import asyncio
+
+from sirbot.slack.dedup import DedupIndex, SharedDedupIndex, event_keys
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0
+
+    def time(self):
+        return self.now
+
+
+def test_event_keys():
+    event = {'type': 'message', 'channel': 'C1', 'ts': '1.0'}
+    assert event_keys(event, 'Ev1') == ['Ev1', ('message', 'C1', '1.0', None)]
+
+    event = {'type': 'channel_created', 'channel': {'id': 'C1'},
+             'event_ts': '2.0'}
+    assert event_keys(event) == [('channel_created', 'C1', '2.0', None)]
+    assert event_keys({'type': 'hello'}) == []
+
+
+def test_seen():
+    dedup = DedupIndex(Clock())
+
+    assert not dedup.seen(['Ev1', 'key1'])
+    assert dedup.seen(['Ev1'])
+    assert dedup.seen(['Ev2', 'key1'])
+    assert not dedup.seen([])
+    assert dedup.snapshot()['hits'] == 2
+    assert dedup.snapshot()['misses'] == 1
+
+
+def test_window():
+    clock = Clock()
+    dedup = DedupIndex(clock, window=10)
+
+    dedup.seen(['Ev1'])
+    clock.now = 5
+    dedup.seen(['Ev2'])
+
+    clock.now = 11
+    assert not dedup.seen(['Ev1'])
+    assert dedup.seen(['Ev2'])
+
+
+def test_size():
+    dedup = DedupIndex(Clock(), size=2)
+
+    for key in ('Ev1', 'Ev2', 'Ev3'):
+        dedup.seen([key])
+
+    assert len(dedup) == 2
+    assert not dedup.seen(['Ev1'])
+
+
+async def test_shared(loop, db):
+    first = SharedDedupIndex(loop)
+    second = SharedDedupIndex(loop)
+
+    assert not await first.check(['Ev1', ('message', 'C1', '1.0', None)])
+    assert await second.check(['Ev1'])
+    assert await second.check(['Ev2', ('message', 'C1', '1.0', None)])
+    assert not await second.check(['Ev3'])
+    assert not await second.check([])
+    assert second.snapshot()['hits'] == 2
+    assert second.snapshot()['misses'] == 1
+
+
+async def test_shared_window(loop, db):
+    first = SharedDedupIndex(loop, window=0.01)
+    second = SharedDedupIndex(loop, window=0.01)
+
+    assert not await first.check(['Ev1'])
+    await asyncio.sleep(0.02, loop=loop)
+    assert not await second.check(['Ev1'])
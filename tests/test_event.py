@@ -0,0 +1,63 @@
+from sirbot.slack import codec
+from sirbot.slack.dispatcher import EventDispatcher
+from sirbot.slack.dispatcher.event import raw_event_type
+
+
+def dispatcher(loop, save=None, skip_unhandled=True):
+    return EventDispatcher(
+        http_client=None, users=None, channels=None, groups=None,
+        plugins=None, event_save=save, message_dispatcher=None, loop=loop,
+        token='secret', skip_unhandled=skip_unhandled
+    )
+
+
+async def handler(event, slack):
+    pass
+
+
+def test_raw_event_type():
+    raw = codec.dumps({'item': {'type': 'message', 'text': '"type": "x"'},
+                       'type': 'reaction_added'})
+    assert raw_event_type(raw) == 'reaction_added'
+    assert raw_event_type('{"items": [{"type": "file"}]}') is None
+    assert raw_event_type('{"type" : "hello"}') == 'hello'
+
+
+def test_skip(loop):
+    events = dispatcher(loop)
+    events.register('reaction_added', handler)
+
+    assert not events.skip('message')
+    assert not events.skip('reaction_added')
+    assert events.skip('user_typing')
+    assert events.skip('user_typing')
+    assert events.snapshot() == {
+        'skipped': 2, 'skipped_by_type': {'user_typing': 2}
+    }
+
+
+def test_skip_saved(loop):
+    assert not dispatcher(loop, save=True).skip('user_typing')
+    assert not dispatcher(loop, save=['user_typing']).skip('user_typing')
+    assert not dispatcher(loop, skip_unhandled=False).skip('user_typing')
+
+
+def test_skip_raw(loop):
+    events = dispatcher(loop)
+    events.register('reaction_added', handler)
+
+    assert not events.skip_raw(codec.dumps({'type': 'reaction_added'}))
+    # A wanted nested type keeps the frame
+    assert not events.skip_raw(codec.dumps({
+        'type': 'pin_added', 'item': {'type': 'message'}
+    }))
+    assert not events.skip_raw('{"ok": true}')
+
+    # Dropped frames are counted by their top level type
+    assert events.skip_raw(codec.dumps({
+        'item': {'type': 'file_comment'}, 'type': 'star_added'
+    }))
+    assert events.skip_raw(codec.dumps({'type': 'user_typing'}))
+    assert events.snapshot()['skipped_by_type'] == {
+        'star_added': 1, 'user_typing': 1
+    }
@@ -0,0 +1,155 @@
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+from sirbot.slack.executor import HandlerExecutor
+
+
+def process_handler(payload):
+    return payload, os.getpid()
+
+
+async def test_sync_handler(loop):
+    executor = HandlerExecutor(loop, threads=2)
+
+    def handler(value):
+        return value, threading.current_thread()
+
+    value, thread = await executor.wrap(handler)(1)
+    assert value == 1
+    assert thread is threading.main_thread()
+
+    value, thread = await executor.wrap(handler, 'thread')(1)
+    assert value == 1
+    assert thread is not threading.main_thread()
+    executor.stop()
+
+
+async def test_sync_handler_awaitable(loop):
+    executor = HandlerExecutor(loop, threads=2)
+
+    async def send(value):
+        return value * 2
+
+    def handler(value):
+        return send(value)
+
+    assert await executor.wrap(handler)(2) == 4
+    assert await executor.wrap(handler, 'thread')(2) == 4
+    executor.stop()
+
+
+async def test_process_handler(loop):
+    executor = HandlerExecutor(loop, processes=1)
+
+    # Only the payload is sent to the process
+    payload, pid = await executor.wrap(process_handler, 'process')(
+        {'type': 'message'}, object()
+    )
+    assert payload == {'type': 'message'}
+    assert pid != os.getpid()
+    executor.stop()
+
+
+async def test_wrap_invalid_executor(loop):
+    executor = HandlerExecutor(loop)
+
+    async def handler():
+        pass
+
+    with pytest.raises(ValueError):
+        executor.wrap(handler, 'thread')
+    with pytest.raises(ValueError):
+        executor.wrap(process_handler, 'fiber')
+    executor.stop()
+
+
+async def test_blocking_coroutine(loop):
+    executor = HandlerExecutor(loop, block_threshold=0.01)
+
+    async def inner():
+        time.sleep(0.02)
+
+    async def handler(value):
+        await asyncio.sleep(0, loop=loop)
+        await executor.wrap(inner)()
+        return value
+
+    async def polite():
+        await asyncio.sleep(0.02, loop=loop)
+
+    def sync_handler():
+        time.sleep(0.02)
+
+    wrapped = executor.wrap(handler)
+    assert wrapped.__name__ == 'handler'
+    assert await wrapped(3) == 3
+    await executor.wrap(polite)()
+    await executor.wrap(sync_handler)()
+
+    # The step of the outer handler includes the blocking inner one
+    blocked = executor.snapshot()['blocked_by_handler']
+    assert sorted(name.rsplit('.', 1)[-1] for name in blocked) == \
+        ['handler', 'inner', 'sync_handler']
+    executor.stop()
+
+
+async def test_blocking_detection_disabled(loop):
+    executor = HandlerExecutor(loop, block_threshold=0)
+
+    async def handler():
+        time.sleep(0.02)
+
+    await executor.wrap(handler)()
+    assert executor.snapshot()['blocked'] == 0
+    executor.stop()
+
+
+async def test_duration(loop):
+    executor = HandlerExecutor(loop, threads=2)
+
+    async def handler():
+        await asyncio.sleep(0.02, loop=loop)
+
+    def sync_handler():
+        pass
+
+    wrapped = executor.wrap(handler)
+    await asyncio.gather(wrapped(), wrapped(), executor.wrap(sync_handler)(),
+                         loop=loop)
+    task = asyncio.ensure_future(wrapped(), loop=loop)
+    await asyncio.sleep(0, loop=loop)
+
+    snapshot = executor.snapshot()
+    assert snapshot['running'] == 1
+    handlers = {name.rsplit('.', 1)[-1]: handler
+                for name, handler in snapshot['handlers'].items()}
+    assert handlers['handler']['running'] == 1
+    assert handlers['handler']['duration']['count'] == 2
+    assert handlers['handler']['duration']['max'] >= 0.02
+    assert handlers['sync_handler']['duration']['count'] == 1
+
+    await task
+    assert executor.snapshot()['running'] == 0
+    executor.stop()
+
+
+async def test_watchdog_stop(loop):
+    executor = HandlerExecutor(loop, block_threshold=0.01)
+    executor.start()
+    watchdog = executor._watchdog
+    assert watchdog.is_alive()
+
+    executor.stop()
+    assert not watchdog.is_alive()
+
+
+async def test_run(loop):
+    executor = HandlerExecutor(loop, threads=1)
+
+    assert await executor.run(sum, [1, 2, 3]) == 6
+    assert await executor.run(abs, -1, process=True) == 1
+    executor.stop()
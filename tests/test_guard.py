@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from sirbot.slack.dispatcher.guard import HandlerGuard
+
+
+def test_overflow_policy(loop):
+    async def handler():
+        pass
+
+    with pytest.raises(ValueError):
+        HandlerGuard(handler, loop, overflow='drop')
+
+
+async def test_passthrough(loop):
+    async def handler(value):
+        return value
+    handler.attribute = 'value'
+
+    guard = HandlerGuard(handler, loop)
+    assert await guard(1) == 1
+    assert guard.attribute == 'value'
+    assert guard.name.endswith('test_passthrough.<locals>.handler')
+
+
+async def test_queue(loop):
+    running = list()
+    peak = list()
+
+    async def handler():
+        running.append(1)
+        peak.append(len(running))
+        await asyncio.sleep(0.01, loop=loop)
+        running.pop()
+
+    guard = HandlerGuard(handler, loop, concurrency=2)
+    calls = [asyncio.ensure_future(guard(), loop=loop) for _ in range(5)]
+    await asyncio.sleep(0, loop=loop)
+    assert guard.snapshot()['queued'] == 3
+
+    await asyncio.gather(*calls, loop=loop)
+    assert max(peak) == 2
+    assert guard.snapshot() == {'calls': 5, 'running': 0, 'queued': 0,
+                                'shed': 0, 'cancelled': 0}
+
+
+async def test_shed(loop):
+    async def handler():
+        await asyncio.sleep(0.01, loop=loop)
+        return True
+
+    guard = HandlerGuard(handler, loop, concurrency=1, overflow='shed')
+    first = asyncio.ensure_future(guard(), loop=loop)
+    await asyncio.sleep(0, loop=loop)
+
+    assert await guard() is None
+    assert await first
+    assert guard.shed == 1
+
+
+async def test_timeout(loop):
+    cancelled = list()
+
+    async def handler():
+        try:
+            await asyncio.sleep(1, loop=loop)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    guard = HandlerGuard(handler, loop, timeout=0.01)
+    assert await guard() is None
+    await asyncio.sleep(0, loop=loop)
+    assert cancelled
+    assert guard.cancelled == 1
+    assert guard.running == 0
@@ -0,0 +1,136 @@
+import asyncio
+import os
+
+import pytest
+
+from sirbot.slack.ingest import IngestQueue, SpillFile, event_key
+
+
+class Consumer:
+    def __init__(self, loop):
+        self.events = list()
+        self.release = asyncio.Event(loop=loop)
+
+    async def __call__(self, event):
+        await self.release.wait()
+        self.events.append(event)
+
+
+def test_event_key():
+    assert event_key({'channel': 'C1'}) == 'C1'
+    assert event_key({'channel': {'id': 'C1'}}) == 'C1'
+    assert event_key({'item': {'channel': 'C1'}}) == 'C1'
+    assert event_key({}) is None
+
+
+def test_overflow_policy():
+    with pytest.raises(ValueError):
+        IngestQueue(None, loop=None, overflow='drop')
+
+
+def test_spill_file():
+    spill = SpillFile()
+    assert spill.read(1) == []
+
+    spill.write([[1, {'i': 0}], [2, {'i': 1}]])
+    path = spill._writer.name
+    assert spill.read(1) == [[1, {'i': 0}]]
+    assert spill.read(5) == [[2, {'i': 1}]]
+
+    spill.close()
+    assert not os.path.exists(path)
+
+    spill.close(final=True)
+    spill.write([[3, {'i': 2}]])
+    assert spill.read(1) == []
+
+
+async def test_block(loop):
+    consumer = Consumer(loop)
+    queue = IngestQueue(consumer, loop=loop, workers=1, size=1)
+    queue.start()
+
+    await queue.put({'i': 0})
+    await asyncio.sleep(0, loop=loop)
+    await queue.put({'i': 1})
+
+    put = asyncio.ensure_future(queue.put({'i': 2}), loop=loop)
+    await asyncio.sleep(0.01, loop=loop)
+    assert not put.done()
+
+    consumer.release.set()
+    assert await put
+    await asyncio.sleep(0.01, loop=loop)
+    assert consumer.events == [{'i': 0}, {'i': 1}, {'i': 2}]
+    queue.stop()
+
+
+async def test_shed(loop):
+    consumer = Consumer(loop)
+    queue = IngestQueue(consumer, loop=loop, workers=1, size=1,
+                        overflow='shed')
+    queue.start()
+
+    assert await queue.put({'i': 0})
+    await asyncio.sleep(0, loop=loop)
+    assert await queue.put({'i': 1})
+    assert not await queue.put({'i': 2})
+    assert queue.dropped == 1
+
+    consumer.release.set()
+    await asyncio.sleep(0.01, loop=loop)
+    assert consumer.events == [{'i': 0}, {'i': 1}]
+    queue.stop()
+
+
+async def test_spill(loop, tmpdir):
+    consumer = Consumer(loop)
+    spill = str(tmpdir.join('events'))
+    queue = IngestQueue(consumer, loop=loop, workers=2, size=2,
+                        overflow='spill', spill_path=spill)
+    queue.start()
+
+    keys = dict()
+    for key in ('C{}'.format(i) for i in range(10)):
+        keys.setdefault(queue._partition(key), key)
+    full, other = keys[0], keys[1]
+
+    for i in range(5):
+        assert await queue.put({'key': full, 'i': i}, key=full)
+    assert queue.spilled == 4
+    assert queue.snapshot()['spill_pending'] == 4
+
+    # Spilling is per partition
+    await queue.put({'key': other, 'i': 0}, key=other)
+    assert queue.spilled == 4
+
+    await asyncio.sleep(0.05, loop=loop)
+    assert os.path.exists(spill + '.0')
+
+    consumer.release.set()
+    for _ in range(100):
+        if queue.depth == 0 and len(consumer.events) == 6:
+            break
+        await asyncio.sleep(0.01, loop=loop)
+
+    assert [e['i'] for e in consumer.events if e['key'] == full] == \
+        [0, 1, 2, 3, 4]
+    assert not os.path.exists(spill + '.0')
+    queue.stop()
+
+
+async def test_stop_removes_spill_files(loop, tmpdir):
+    consumer = Consumer(loop)
+    spill = str(tmpdir.join('events'))
+    queue = IngestQueue(consumer, loop=loop, workers=1, size=1,
+                        overflow='spill', spill_path=spill)
+    queue.start()
+
+    for i in range(3):
+        await queue.put({'i': i})
+    await asyncio.sleep(0.05, loop=loop)
+    assert os.path.exists(spill + '.0')
+
+    queue.stop()
+    assert not os.path.exists(spill + '.0')
+    assert not queue._workers
@@ -0,0 +1,123 @@
+import asyncio
+
+from sirbot.slack.lanes import LaneScheduler
+
+
+class Jobs:
+    def __init__(self, loop):
+        self.loop = loop
+        self.started = list()
+        self.done = list()
+        self.release = asyncio.Event(loop=loop)
+
+    async def __call__(self, name):
+        self.started.append(name)
+        await self.release.wait()
+        self.done.append(name)
+        return name
+
+
+async def test_priority(loop):
+    jobs = Jobs(loop)
+    lanes = LaneScheduler(loop, concurrency=1)
+
+    lanes.submit('events', jobs, 'first')
+    await asyncio.sleep(0, loop=loop)
+
+    for lane in ('events', 'messages', 'interactive', 'events', 'messages'):
+        lanes.submit(lane, jobs, lane)
+    await asyncio.sleep(0.01, loop=loop)
+    assert jobs.started == ['first']
+    assert lanes.snapshot()['events']['waiting'] == 2
+
+    jobs.release.set()
+    await asyncio.sleep(0.01, loop=loop)
+    assert jobs.started == ['first', 'interactive', 'messages', 'messages',
+                            'events', 'events']
+    assert sum(lane['completed'] for lane in lanes.snapshot().values()) == 6
+
+
+async def test_lane_limit(loop):
+    jobs = Jobs(loop)
+    lanes = LaneScheduler(loop, concurrency=10, limits={'events': 2})
+
+    for i in range(4):
+        lanes.submit('events', jobs, 'events')
+    lanes.submit('messages', jobs, 'messages')
+    await asyncio.sleep(0.01, loop=loop)
+
+    snapshot = lanes.snapshot()
+    assert snapshot['events']['running'] == 2
+    assert snapshot['events']['waiting'] == 2
+    # The other lanes are not affected
+    assert snapshot['messages']['running'] == 1
+
+    jobs.release.set()
+    await asyncio.sleep(0.01, loop=loop)
+    assert lanes.snapshot()['events']['completed'] == 4
+    assert lanes.snapshot()['events']['wait']['count'] == 4
+
+
+async def test_queue_overflow(loop):
+    jobs = Jobs(loop)
+    lanes = LaneScheduler(loop, concurrency=1, queue=1)
+
+    running = asyncio.ensure_future(lanes.run('events', jobs, 0), loop=loop)
+    waiting = asyncio.ensure_future(lanes.run('events', jobs, 1), loop=loop)
+    await asyncio.sleep(0.01, loop=loop)
+
+    assert await lanes.run('events', jobs, 2) is None
+    assert lanes.snapshot()['events']['shed'] == 1
+
+    # The limit is by lane
+    other = asyncio.ensure_future(lanes.run('interactive', jobs, 3),
+                                  loop=loop)
+    await asyncio.sleep(0.01, loop=loop)
+    assert lanes.snapshot()['interactive']['shed'] == 0
+
+    jobs.release.set()
+    assert await asyncio.gather(running, waiting, other, loop=loop) == \
+        [0, 1, 3]
+    assert jobs.done == [0, 3, 1]
+
+
+async def test_stop_drains(loop):
+    jobs = Jobs(loop)
+    lanes = LaneScheduler(loop, concurrency=1)
+
+    running = asyncio.ensure_future(lanes.run('events', jobs, 0), loop=loop)
+    waiting = asyncio.ensure_future(lanes.run('messages', jobs, 1),
+                                    loop=loop)
+    await asyncio.sleep(0.01, loop=loop)
+
+    stop = asyncio.ensure_future(lanes.stop(), loop=loop)
+    await asyncio.sleep(0.01, loop=loop)
+    assert not stop.done()
+
+    # New jobs are dropped while stopping
+    assert await lanes.run('interactive', jobs, 2) is None
+
+    jobs.release.set()
+    await stop
+    assert jobs.done == [0, 1]
+    assert await running == 0
+    assert await waiting == 1
+
+
+async def test_stop_timeout(loop):
+    jobs = Jobs(loop)
+    lanes = LaneScheduler(loop, concurrency=1)
+
+    running = asyncio.ensure_future(lanes.run('events', jobs, 0), loop=loop)
+    waiting = asyncio.ensure_future(lanes.run('events', jobs, 1), loop=loop)
+    await asyncio.sleep(0.01, loop=loop)
+
+    await lanes.stop(timeout=0.01)
+
+    assert jobs.started == [0]
+    assert jobs.done == []
+    assert running.cancelled()
+    assert waiting.cancelled()
+    snapshot = lanes.snapshot()['events']
+    assert snapshot['running'] == 0
+    assert snapshot['waiting'] == 0
@@ -0,0 +1,97 @@
+from sirbot.core import registry
+
+from sirbot.slack.dispatcher import MessageDispatcher
+from sirbot.slack.store.channel import Channel
+from sirbot.slack.store.group import Group
+from sirbot.slack.store.message import SlackMessage
+from sirbot.slack.store.user import User
+
+
+class Store:
+    def __init__(self, cls, calls):
+        self.cls = cls
+        self.calls = calls
+
+    async def get(self, id_):
+        self.calls.append(id_)
+        return self.cls(id_=id_)
+
+
+class Slack:
+    def __init__(self):
+        self.calls = list()
+        self.bot = User(id_='B1')
+        self.users = Store(User, self.calls)
+        self.channels = Store(Channel, self.calls)
+        self.groups = Store(Group, self.calls)
+
+
+async def test_from_raw_resolve(loop):
+    slack = Slack()
+    data = {'type': 'message', 'channel': 'C1', 'user': 'U1', 'text': 'hi'}
+
+    message = await SlackMessage.from_raw(data, slack)
+    assert message.resolved
+    assert slack.calls == ['U1', 'C1']
+
+
+async def test_from_raw_lazy(loop):
+    slack = Slack()
+    data = {'type': 'message', 'channel': 'G1', 'user': 'U1', 'text': 'hi'}
+
+    message = await SlackMessage.from_raw(data, slack, resolve=False)
+    assert not message.resolved
+    assert not slack.calls
+    assert message.frm.id == 'U1' and message.to.id == 'G1'
+    assert isinstance(message.to, Group)
+
+    frm, to = message.frm, message.to
+    await message.resolve(slack)
+    assert message.resolved
+    assert slack.calls == ['U1', 'G1']
+    assert message.frm is not frm and message.frm.id == 'U1'
+    assert message.to is not to and message.to.id == 'G1'
+
+    await message.resolve(slack)
+    assert slack.calls == ['U1', 'G1']
+
+
+async def test_resolve_im(loop):
+    slack = Slack()
+    data = {'type': 'message', 'channel': 'D1', 'text': 'hi'}
+
+    message = await SlackMessage.from_raw(data, slack, resolve=False)
+    assert message.frm is None
+    assert message.to is slack.bot and message.mention
+
+    await message.resolve(slack)
+    assert not slack.calls
+    assert message.to is slack.bot
+
+
+async def test_dispatch_resolve_matched(loop):
+    slack = Slack()
+    registry['slack'] = lambda: slack
+    dispatcher = MessageDispatcher(
+        http_client=None, users=None, channels=None, groups=None,
+        plugins=None, threads=None, save=False, loop=loop, ping=False
+    )
+    dispatcher.bot = slack.bot
+    ran = list()
+    dispatcher._run_handler = lambda lane, func, message, *args, key=None: \
+        ran.append(message)
+
+    async def deploy(message, slack):
+        pass
+
+    dispatcher.register('deploy', deploy)
+
+    # The stores are only queried for the messages matching a handler
+    await dispatcher.incoming({'type': 'message', 'channel': 'C1',
+                               'user': 'U1', 'text': 'hello'})
+    assert not slack.calls and not ran
+
+    await dispatcher.incoming({'type': 'message', 'channel': 'C1',
+                               'user': 'U1', 'text': 'deploy'})
+    assert slack.calls == ['U1', 'C1']
+    assert len(ran) == 1 and ran[0].resolved
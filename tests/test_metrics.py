@@ -0,0 +1,113 @@
+from aiohttp import web
+
+from sirbot.slack import codec
+from sirbot.slack.core import SirBotSlack
+from sirbot.slack.metrics import APIMetrics, Histogram
+
+
+def test_histogram_bucket_boundaries():
+    histogram = Histogram(buckets=(0.1, 1, float('inf')))
+    for value in (0.05, 0.1, 0.5, 1, 1.5):
+        histogram.observe(value)
+
+    # Upper bounds are inclusive
+    assert histogram.counts == [2, 2, 1]
+    assert histogram.count == 5
+    assert histogram.sum == 3.15
+    assert histogram.max == 1.5
+
+
+def test_histogram_percentile():
+    histogram = Histogram(buckets=(0.1, 1, float('inf')))
+    assert histogram.percentile(50) == 0
+
+    for _ in range(8):
+        histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(3)
+
+    assert histogram.percentile(50) == 0.1
+    assert histogram.percentile(90) == 1
+    # The last bucket is bounded by the largest value observed
+    assert histogram.percentile(99) == 3
+
+
+def test_histogram_cumulative_counts():
+    histogram = Histogram(buckets=(0.1, 1, float('inf')))
+    histogram.observe(0.5)
+    snapshot = histogram.snapshot()
+
+    histogram.observe(0.5)
+    histogram.observe(0.01)
+
+    assert snapshot['count'] == 1
+    assert histogram.snapshot() == {
+        'count': 3,
+        'sum': 1.01,
+        'mean': 1.01 / 3,
+        'max': 0.5,
+        'p50': 0.5,
+        'p95': 0.5,
+        'p99': 0.5,
+        'buckets': {'0.1': 1, '1': 2, 'inf': 0},
+    }
+
+
+def test_histogram_merge():
+    histogram = Histogram(buckets=(0.1, 1, float('inf')))
+    histogram.observe(0.5)
+    other = Histogram(buckets=(0.1, 1, float('inf')))
+    other.observe(0.05)
+    other.observe(2)
+
+    histogram.merge(codec.loads(codec.dumps(other.snapshot())))
+    assert histogram.counts == [1, 1, 1]
+    assert histogram.count == 3
+    assert histogram.sum == 2.55
+    assert histogram.max == 2
+
+
+def test_api_metrics_snapshot():
+    metrics = APIMetrics()
+    metrics.start('chat.postMessage')
+    metrics.start('chat.postMessage')
+    metrics.end('chat.postMessage', 200, 0.02)
+    metrics.retry('chat.postMessage', 'rate_limited')
+    metrics.start('users.info')
+    metrics.end('users.info', 'TimeoutError', 0.5)
+
+    snapshot = metrics.snapshot()
+    assert set(snapshot) == {'chat.postMessage', 'users.info'}
+
+    post = snapshot['chat.postMessage']
+    assert set(post) == {'latency', 'status', 'retries', 'in_flight'}
+    assert post['status'] == {'200': 1}
+    assert post['retries'] == {'rate_limited': 1}
+    assert post['in_flight'] == 1
+    assert post['latency']['count'] == 1
+    assert post['latency']['buckets']['0.025'] == 1
+
+    assert snapshot['users.info']['status'] == {'TimeoutError': 1}
+    assert snapshot['users.info']['in_flight'] == 0
+
+
+async def test_metrics_endpoint(loop, test_client):
+    plugin = SirBotSlack(loop=loop)
+    plugin._api_metrics.start('auth.test')
+    plugin._api_metrics.end('auth.test', 200, 0.2)
+
+    app = web.Application(loop=loop)
+    app.router.add_route('GET', '/slack/metrics', plugin._metrics_endpoint)
+    client = await test_client(app)
+
+    rep = await client.get('/slack/metrics')
+    assert rep.status == 200
+    assert rep.content_type == 'application/json'
+
+    data = codec.loads(await rep.text())
+    assert data['middlewares'] == {}
+    assert data['handlers'] == {}
+    latency = data['api']['auth.test']['latency']
+    assert latency['count'] == 1
+    assert latency['buckets']['0.25'] == 1
+    assert data['api']['auth.test']['status'] == {'200': 1}
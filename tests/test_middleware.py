@@ -0,0 +1,108 @@
+from multidict import MultiDict, MultiDictProxy
+
+from sirbot.slack.dispatcher import CommandDispatcher
+from sirbot.slack.dispatcher.dispatcher import SlackDispatcher
+from sirbot.slack.dispatcher.middleware import Middleware
+
+
+def dispatcher(loop):
+    return SlackDispatcher(http_client=None, users=None, channels=None,
+                           groups=None, plugins=None, loop=loop)
+
+
+async def test_middleware(loop):
+    def tag(payload):
+        payload['tagged'] = True
+        return payload
+
+    async def replace(payload):
+        return {'replaced': True}
+
+    assert await Middleware(tag)({}) == {'tagged': True}
+    assert await Middleware(replace)({}) == {'replaced': True}
+
+
+async def test_middleware_drop(loop):
+    middleware = Middleware(lambda payload: None)
+
+    assert await middleware({'text': 'spam'}) is None
+    assert middleware.snapshot()['dropped'] == 1
+
+
+async def test_middleware_error(loop):
+    def fail(payload):
+        raise ValueError()
+
+    middleware = Middleware(fail)
+    payload = {'text': 'hello'}
+
+    assert await middleware(payload) is None
+    assert middleware.snapshot()['errors'] == 1
+    assert middleware.snapshot()['dropped'] == 1
+    assert middleware.snapshot()['duration']['count'] == 1
+
+    middleware = Middleware(fail, fail_open=True)
+    assert await middleware(payload) is payload
+    assert middleware.snapshot()['errors'] == 1
+    assert middleware.snapshot()['dropped'] == 0
+
+
+class Request:
+    def __init__(self, data):
+        self.data = MultiDictProxy(MultiDict(data))
+
+    async def post(self):
+        return self.data
+
+
+async def test_command_middleware(loop):
+    commands = CommandDispatcher(http_client=None, users=None, channels=None,
+                                 groups=None, plugins=None, save=False,
+                                 loop=loop, token='token')
+    received = list()
+
+    def tag(payload):
+        payload['tagged'] = True
+        received.append(payload)
+
+    commands.add_middleware(tag)
+    request = Request({'token': 'token', 'command': '/deploy'})
+
+    response = await commands._incoming(request)
+    assert response.status == 200
+    assert received == [{'token': 'token', 'command': '/deploy',
+                         'tagged': True}]
+    assert 'tagged' not in request.data
+
+
+async def test_chain(loop):
+    slack = dispatcher(loop)
+    calls = list()
+
+    def first(payload):
+        calls.append('first')
+        return dict(payload, first=True)
+
+    async def drop(payload):
+        calls.append('drop')
+        if payload.get('spam'):
+            return None
+        return payload
+
+    def last(payload):
+        calls.append('last')
+        return payload
+
+    for func in (first, drop, last):
+        slack.add_middleware(func)
+
+    assert await slack._run_middlewares({'text': 'hi'}) == \
+        {'text': 'hi', 'first': True}
+    assert calls == ['first', 'drop', 'last']
+
+    del calls[:]
+    assert await slack._run_middlewares({'spam': True}) is None
+    assert calls == ['first', 'drop']
+
+    snapshot = slack.middlewares_snapshot()
+    assert [s['calls'] for s in snapshot.values()] == [2, 2, 1]
@@ -0,0 +1,40 @@
+import pytest
+
+from sirbot.slack.api import APIPath, HTTPClient
+from sirbot.slack.mockserver import MockSlack
+
+
+@pytest.fixture
+def api_root():
+    root = APIPath.SLACK_API_ROOT
+    yield
+    APIPath.set_root(root)
+
+
+async def test_mock_history(loop, test_server, api_root):
+    mock = MockSlack(users=3, channels=1, groups=0, loop=loop)
+    server = await test_server(mock.app())
+    APIPath.set_root(str(server.make_url('/api/')))
+    assert APIPath.CHANNEL_HISTORY == str(
+        server.make_url('/api/channels.history')
+    )
+
+    client = HTTPClient('token', loop=loop, page_size=2)
+    try:
+        channel = list(mock.channels)[0]
+        sent = [
+            await client.message_send({'channel': channel, 'text': str(i)})
+            for i in range(5)
+        ]
+
+        messages = await client.get_history(channel, oldest=sent[0]['ts'])
+        assert [m['text'] for m in messages] == ['1', '2', '3', '4']
+
+        messages = await client.get_history(channel, oldest=sent[0]['ts'],
+                                            latest=sent[4]['ts'])
+        assert [m['text'] for m in messages] == ['1', '2', '3']
+    finally:
+        client._session.close()
+
+    assert mock.stats['chat.postMessage'] == 5
+    assert mock.stats['channels.history'] == 4
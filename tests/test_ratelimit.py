@@ -0,0 +1,73 @@
+from sirbot.slack.ratelimit import RateLimiter, TokenBucket
+
+
+async def test_bucket_burst(loop):
+    bucket = TokenBucket(rate=1, capacity=3, loop=loop)
+
+    start = loop.time()
+    for _ in range(3):
+        await bucket.acquire()
+    assert loop.time() - start < 0.1
+
+
+async def test_bucket_pacing(loop):
+    bucket = TokenBucket(rate=20, capacity=1, loop=loop)
+
+    start = loop.time()
+    for _ in range(3):
+        await bucket.acquire()
+    assert loop.time() - start >= 0.09
+
+
+async def test_bucket_block(loop):
+    bucket = TokenBucket(rate=100, capacity=10, loop=loop)
+    bucket.block(0.1)
+
+    start = loop.time()
+    await bucket.acquire()
+    assert loop.time() - start >= 0.09
+
+
+async def test_bucket_idle(loop):
+    bucket = TokenBucket(rate=1, capacity=2, loop=loop)
+    assert bucket.idle(loop.time())
+
+    await bucket.acquire()
+    assert not bucket.idle(loop.time())
+    assert bucket.idle(loop.time() + 2)
+
+
+async def test_limiter_buckets_by_channel(loop):
+    limiter = RateLimiter(loop=loop)
+
+    assert limiter._bucket('chat.postMessage', {'channel': 'C1'}) is not \
+        limiter._bucket('chat.postMessage', {'channel': 'C2'})
+    assert limiter._bucket('users.info', {'user': 'U1'}) is \
+        limiter._bucket('users.info', {'user': 'U2'})
+
+
+async def test_limiter_sweep_idle_channels(loop):
+    limiter = RateLimiter(loop=loop)
+
+    for i in range(10):
+        await limiter.acquire('chat.postMessage', {'channel': 'C{}'.format(i)})
+    await limiter.acquire('users.info')
+
+    limiter._sweep(loop.time())
+    assert len(limiter._buckets) == 11
+
+    limiter._sweep(loop.time() + 60)
+    assert list(limiter._buckets) == [('users.info', None)]
+
+
+async def test_limiter_rtm_connect_unpaced(loop):
+    limiter = RateLimiter(loop=loop)
+
+    start = loop.time()
+    for _ in range(3):
+        await limiter.acquire('rtm.connect')
+    assert loop.time() - start < 0.1
+
+    limiter.throttled('rtm.connect', retry_after=0.1)
+    await limiter.acquire('rtm.connect')
+    assert loop.time() - start >= 0.09
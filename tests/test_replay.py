@@ -0,0 +1,127 @@
+import asyncio
+
+from sirbot.slack import codec
+from sirbot.slack.dispatcher import EventDispatcher
+from sirbot.slack.executor import HandlerExecutor
+from sirbot.slack.replay import Recorder, Replayer, read_records
+
+
+class Request:
+    headers = {}
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    async def json(self, loads):
+        return loads(codec.dumps(self.payload))
+
+
+def test_recorder(tmpdir):
+    path = str(tmpdir.join('traffic.jsonl.gz'))
+    recorder = Recorder(path)
+
+    recorder.record('rtm', '{\n"type": "message"}')
+    recorder.close()
+    recorder.record('rtm', '{"type": "message"}')
+
+    records = list(read_records(path))
+    assert len(records) == 1
+    assert records[0]['source'] == 'rtm'
+    assert records[0]['payload'] == {'type': 'message'}
+
+
+def test_recorder_buffer(tmpdir):
+    path = str(tmpdir.join('traffic.jsonl.gz'))
+    recorder = Recorder(path, flush_interval=60, buffer_size=3)
+
+    for i in range(4):
+        recorder.record('rtm', codec.dumps({'i': i}))
+    assert len(recorder._buffer) == 1
+
+    # The first records are written by the writer thread
+    recorder._writer.submit(lambda: None).result()
+    assert [r['payload']['i'] for r in read_records(path)] == [0, 1, 2]
+
+    recorder.close()
+    assert [r['payload']['i'] for r in read_records(path)] == [0, 1, 2, 3]
+
+
+async def test_record_validated_events(loop, tmpdir):
+    path = str(tmpdir.join('traffic.jsonl.gz'))
+    recorder = Recorder(path)
+    dispatcher = EventDispatcher(
+        http_client=None, users=None, channels=None, groups=None,
+        plugins=None, event_save=None, message_dispatcher=None, loop=loop,
+        token='secret', recorder=recorder
+    )
+
+    await dispatcher.incoming_web(Request({'token': 'wrong',
+                                           'type': 'url_verification',
+                                           'challenge': 'a'}))
+    await dispatcher.incoming_web(Request({'token': 'secret',
+                                           'type': 'url_verification',
+                                           'challenge': 'b'}))
+    recorder.close()
+
+    assert [r['payload'] for r in read_records(path)] == [
+        {'type': 'url_verification', 'challenge': 'b'}
+    ]
+
+
+async def test_replay_report(loop, tmpdir):
+    path = str(tmpdir.join('traffic.jsonl.gz'))
+    recorder = Recorder(path)
+    for i in range(3):
+        recorder.record('events', codec.dumps({
+            'type': 'event_callback',
+            'event': {'type': 'message', 'ts': str(i)}
+        }))
+    recorder.record('events', codec.dumps({'type': 'url_verification'}))
+    recorder.close()
+
+    handled = list()
+
+    async def handle(record):
+        handled.append(record['payload']['event']['ts'])
+        if record['payload']['event']['ts'] == '2':
+            raise ValueError()
+
+    replayer = Replayer(path, speed=None, loop=loop)
+    report = await replayer._replay(handle)
+
+    assert sorted(handled) == ['0', '1', '2']
+    assert report['events'] == 3
+    assert report['errors'] == 1
+    assert report['handlers'] == {}
+
+
+async def test_replay_handlers_duration(loop, tmpdir):
+    path = str(tmpdir.join('traffic.jsonl.gz'))
+    recorder = Recorder(path)
+    for i in range(3):
+        recorder.record('rtm', codec.dumps({'type': 'message'}))
+    recorder.close()
+
+    executor = HandlerExecutor(loop)
+
+    async def slow():
+        await asyncio.sleep(0.05, loop=loop)
+
+    async def handle(record):
+        # The handler runs in the background, after the ack
+        asyncio.ensure_future(executor.wrap(slow)(), loop=loop)
+
+    async def metrics():
+        # Metrics of two worker processes
+        return [{'executor': executor.snapshot()},
+                {'executor': executor.snapshot()}]
+
+    replayer = Replayer(path, speed=None, loop=loop)
+    report = await replayer._replay(handle, metrics)
+
+    assert report['events'] == 3
+    assert report['duration'] >= 0.05
+    handler, = report['handlers'].values()
+    assert handler['count'] == 6
+    assert 0.05 <= handler['p50'] <= handler['max'] < 0.1
+    executor.stop()
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from sirbot.slack.errors import SlackCircuitOpenError
+from sirbot.slack.retry import (CircuitBreaker, RetryPolicy,
+                                policies_from_config)
+
+CONFIG = {'attempts': 3, 'backoff': 0.5, 'max_backoff': 10, 'methods': {}}
+
+
+def test_delay():
+    policy = RetryPolicy(attempts=5, backoff=1, max_backoff=3)
+
+    for _ in range(100):
+        assert 0 <= policy.delay(1) <= 1
+        assert 0 <= policy.delay(2) <= 2
+        assert 0 <= policy.delay(10) <= 3
+
+
+def test_policies_from_config():
+    config = dict(CONFIG, methods={'users.info': {'attempts': 5},
+                                   'chat.postMessage': {'attempts': 2},
+                                   'im.open': {'attempts': 1}})
+    policies = policies_from_config(config)
+
+    assert policies['channels.info'].attempts == 3
+    assert policies['users.info'].attempts == 5
+    assert policies['chat.postMessage'].attempts == 2
+    assert 'im.open' not in policies
+    assert 'chat.update' not in policies
+
+
+def test_policies_disabled():
+    assert policies_from_config(dict(CONFIG, attempts=1)) == {}
+
+
+async def test_breaker(loop):
+    breaker = CircuitBreaker(loop=loop, threshold=2, timeout=0.05)
+    breaker.check()
+
+    breaker.failure()
+    assert breaker.state == 'closed'
+    breaker.failure()
+    assert breaker.state == 'open'
+
+    with pytest.raises(SlackCircuitOpenError):
+        breaker.check()
+
+    await asyncio.sleep(0.06, loop=loop)
+    assert breaker.state == 'half-open'
+    breaker.check()
+    assert breaker.state == 'open'
+
+    breaker.success()
+    assert breaker.state == 'closed'
+    breaker.check()
+
+
+async def test_breaker_failed_probe(loop):
+    breaker = CircuitBreaker(loop=loop, threshold=1, timeout=0.05)
+    breaker.failure()
+
+    await asyncio.sleep(0.06, loop=loop)
+    breaker.check()
+    breaker.failure()
+    assert breaker.state == 'open'
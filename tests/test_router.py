@@ -0,0 +1,190 @@
+import itertools
+import re
+
+import pytest
+
+from sirbot.slack.dispatcher import MessageDispatcher
+from sirbot.slack.executor import HandlerExecutor
+from sirbot.slack.threads import ThreadRegistry
+from sirbot.slack.dispatcher.router import MessageRouter, _prefilter
+
+PATTERNS = [
+    ('hello', 0),
+    ('^help', 0),
+    ('^deploy (\\w+)', re.IGNORECASE),
+    ('(?:start|stop) server', 0),
+    ('ping|pong', re.IGNORECASE | re.ASCII),
+    ('\\d{3,}', 0),
+    ('\\btest\\b', 0),
+    ('^$', 0),
+    ('^line$', re.MULTILINE),
+    ('Σ', re.IGNORECASE | re.ASCII),
+    ('café', re.IGNORECASE | re.ASCII),
+    ('(?i)straße', 0),
+    ('İstanbul|ankara', re.IGNORECASE | re.ASCII),
+    ('status', re.IGNORECASE),
+    ('a.c', re.DOTALL),
+]
+
+TEXTS = [
+    '', 'hello', 'Hello world', 'help me', 'please help', 'Deploy prod',
+    'deploy', 'START server', 'stop server', 'PING', 'pong!', 'ping pong',
+    'call 12345', '12', 'a test.', 'testing', 'first\nline', 'line',
+    'AΣ', 'ΣA', 'σ', 'CAFÉ', 'café', 'Café au lait', 'STRASSE', 'straße',
+    'İstanbul', 'i̇stanbul', 'ANKARA', 'Status', 'STATUS?', 'a\nc', 'abc',
+]
+
+
+class Channel:
+    def __init__(self, id_):
+        self.id = id_
+
+
+class Message:
+    def __init__(self, text, channel='C1', mention=False):
+        self.text = text
+        self.to = Channel(channel)
+        self.mention = mention
+
+
+def router(patterns):
+    routes = MessageRouter()
+    options = list()
+    for i, (match, flags) in enumerate(patterns):
+        option = {
+            'func': i,
+            'mention': i % 5 == 4,
+            'admin': False,
+            'channel_id': '*' if i % 3 else ['C1'],
+        }
+        routes.add(match, flags, option)
+        options.append((re.compile(match, flags), option))
+    return routes, options
+
+
+def search(options, msg):
+    handlers = list()
+    for pattern, option in options:
+        if option['channel_id'] != '*' and \
+                msg.to.id not in option['channel_id']:
+            continue
+        if option['mention'] and not msg.mention:
+            continue
+        n = pattern.search(msg.text)
+        if n:
+            handlers.append((option['func'], n.span(), n.groups()))
+    return handlers
+
+
+@pytest.mark.parametrize('channel,mention', itertools.product(
+    ('C1', 'C2'), (True, False)))
+def test_equivalence(channel, mention):
+    routes, options = router(PATTERNS)
+
+    for text in TEXTS:
+        msg = Message(text, channel, mention)
+        found = [(option['func'], n.span(), n.groups())
+                 for option, n in routes.find(msg)]
+        assert found == search(options, msg), text
+
+
+def test_prefilter():
+    assert _prefilter(re.compile('^help')) == ('help', True, None)
+    assert _prefilter(re.compile('deploy (\\w+)', re.I | re.A)) == \
+        ('deploy ', False, None)
+    assert _prefilter(re.compile('ping|pong')) == (None, False,
+                                                   ('ing', 'ong'))
+    assert _prefilter(re.compile('start|stop')) == ('st', False, None)
+    assert _prefilter(re.compile('status', re.I)) == (None, False, None)
+
+
+def test_prefilter_ascii_ignorecase():
+    assert _prefilter(re.compile('Σ', re.I | re.A)) == (None, False, None)
+    assert _prefilter(re.compile('^caféine', re.I | re.A)) == \
+        ('caf', True, None)
+    assert _prefilter(re.compile('^éclair', re.I | re.A)) == \
+        ('clair', False, None)
+    assert _prefilter(re.compile('İstanbul|ankara', re.I | re.A)) == \
+        (None, False, None)
+
+    routes, _ = router([('Σ', re.I | re.A)])
+    assert routes.find(Message('AΣ'))
+
+
+class Author:
+    def __init__(self, admin):
+        self.id = 'U1'
+        self.admin = admin
+
+
+class Incoming(Message):
+    thread = None
+    raw = {'channel': 'C1'}
+
+    def __init__(self, text, admin):
+        super().__init__(text)
+        self.author = Author(admin)
+        self.frm = None
+
+    async def resolve(self, slack):
+        self.frm = self.author
+
+
+async def test_dispatch_admin(loop):
+    dispatcher = MessageDispatcher(
+        http_client=None, users=None, channels=None, groups=None,
+        plugins=None, threads=None, save=False, loop=loop, ping=False
+    )
+    ran = list()
+    dispatcher._run_handler = lambda lane, func, *args, key=None: \
+        ran.append((func, args[2].group(0), key))
+
+    async def everyone(message, slack):
+        pass
+
+    async def admins(message, slack):
+        pass
+
+    dispatcher.register('deploy', everyone)
+    dispatcher.register('deploy', admins, admin=True)
+
+    await dispatcher._dispatch(Incoming('deploy', admin=False), None)
+    assert ran == [(everyone, 'deploy', None)]
+
+    del ran[:]
+    await dispatcher._dispatch(Incoming('deploy', admin=True), None)
+    assert ran == [(everyone, 'deploy', None), (admins, 'deploy', None)]
+
+
+class Reply(Incoming):
+    thread = '1.0'
+
+    def __init__(self, text, admin):
+        super().__init__(text, admin)
+        self.frm = self.author
+
+
+async def test_dispatch_thread_executor(loop):
+    executor = HandlerExecutor(loop)
+    threads = ThreadRegistry(loop, ttl=0)
+    dispatcher = MessageDispatcher(
+        http_client=None, users=None, channels=None, groups=None,
+        plugins=None, threads=threads, save=False, loop=loop, ping=False,
+        executor=executor
+    )
+    ran = list()
+    dispatcher._run_handler = lambda lane, func, *args, key=None: \
+        ran.append(func)
+
+    def callback(message, slack, match):
+        pass
+
+    threads.add('1.0', callback)
+    await dispatcher._dispatch(Reply('yes', admin=False), None)
+
+    # Thread callbacks are run by the executor like the other handlers
+    assert len(ran) == 1 and ran[0].__wrapped__ is callback
+    await ran[0](None, None, None)
+    assert [name.rsplit('.', 1)[-1] for name in executor.duration] == \
+        ['callback']
+    executor.stop()
@@ -0,0 +1,170 @@
+import asyncio
+
+import aiohttp
+
+from sirbot.slack import codec
+from sirbot.slack.api import RTMClient
+from sirbot.slack.retry import RetryPolicy
+
+
+class Policy(RetryPolicy):
+    def __init__(self):
+        super().__init__(backoff=0)
+        self.failures = list()
+
+    def delay(self, attempt):
+        self.failures.append(attempt)
+        return 0
+
+
+class Session:
+    closed = True
+
+    def __init__(self, error):
+        self.error = error
+        self.connections = 0
+
+    def ws_connect(self, url):
+        self.connections += 1
+        raise self.error
+
+
+class WebSocket:
+    def __init__(self, loop, pong=True):
+        self.pong = pong
+        self.sent = list()
+        self.closed = False
+        self.frames = asyncio.Queue(loop=loop)
+
+    async def send_str(self, data):
+        data = codec.loads(data)
+        self.sent.append(data)
+        if self.pong:
+            pong = codec.dumps({'type': 'pong', 'reply_to': data['id']})
+            self.frames.put_nowait(
+                aiohttp.WSMessage(aiohttp.WSMsgType.TEXT, pong, None)
+            )
+
+    async def close(self):
+        self.closed = True
+        self.frames.put_nowait(None)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        frame = await self.frames.get()
+        if frame is None:
+            raise StopAsyncIteration
+        return frame
+
+
+class WebSocketSession:
+    closed = True
+
+    def __init__(self, loop, pong=True):
+        self.loop = loop
+        self.pong = pong
+        self.connections = list()
+
+    def ws_connect(self, url):
+        ws = WebSocket(self.loop, pong=self.pong)
+        self.connections.append(ws)
+        return ws
+
+
+def keepalive_client(loop, session):
+    client = RTMClient('token', None, loop=loop, session=session,
+                       reconnect_policy=Policy(), ping_interval=0.01,
+                       ping_timeout=0.03)
+
+    async def negotiate():
+        return {'url': 'wss://example.com'}
+    client._negotiate_rtm_url = negotiate
+
+    return client, asyncio.ensure_future(
+        client.connect(url='wss://example.com'), loop=loop
+    )
+
+
+async def test_connect_survives_unexpected_errors(loop):
+    session = Session(asyncio.TimeoutError())
+    policy = Policy()
+    client = RTMClient('token', None, loop=loop, session=session,
+                       reconnect_policy=policy)
+
+    async def negotiate():
+        return {'url': 'wss://example.com'}
+    client._negotiate_rtm_url = negotiate
+
+    task = asyncio.ensure_future(client.connect(), loop=loop)
+    while session.connections < 3:
+        await asyncio.sleep(0, loop=loop)
+
+    assert not task.done()
+    assert policy.failures[:2] == [1, 2]
+    assert client.is_closed
+
+    task.cancel()
+    await task
+
+
+async def test_keepalive_pings(loop):
+    session = WebSocketSession(loop)
+    client, task = keepalive_client(loop, session)
+
+    # Pongs reset the deadline: the connection outlives the ping timeout
+    await asyncio.sleep(0.1, loop=loop)
+    task.cancel()
+    await task
+
+    assert len(session.connections) == 1
+    sent = session.connections[0].sent
+    assert len(sent) >= 5
+    assert [ping['id'] for ping in sent] == \
+        list(range(1, len(sent) + 1))
+    assert all(ping['type'] == 'ping' for ping in sent)
+    # The last pong may still be queued when the client is cancelled
+    assert client.pings == len(sent)
+    assert client.pongs in (len(sent) - 1, len(sent))
+    assert client.latency.count == client.pongs
+    assert client.dead_connections == 0
+
+
+async def test_keepalive_missing_pong(loop):
+    session = WebSocketSession(loop, pong=False)
+    client, task = keepalive_client(loop, session)
+
+    for _ in range(100):
+        if len(session.connections) >= 2:
+            break
+        await asyncio.sleep(0.01, loop=loop)
+    task.cancel()
+    await task
+
+    assert len(session.connections) >= 2
+    assert session.connections[0].closed
+    assert session.connections[0].sent
+    assert client.dead_connections >= 1
+    assert client.pongs == 0
+
+
+def test_pong(loop):
+    client = RTMClient('token', None, loop=loop, session=Session(None))
+    client._last_pong = loop.time() - 10
+    client._pings = {1: loop.time() - 2, 2: loop.time() - 1,
+                     3: loop.time()}
+
+    client._pong({'type': 'pong', 'reply_to': 2})
+
+    assert loop.time() - client._last_pong < 1
+    assert client.pongs == 1
+    assert client.latency.count == 1
+    # Older pings will never be answered
+    assert client._pings.keys() == {3}
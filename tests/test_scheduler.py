@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+
+from sirbot.slack.errors import SlackOutboundCancelled
+from sirbot.slack.scheduler import OutboundScheduler
+from sirbot.slack.store.message import SlackMessage
+from sirbot.slack.store.user import User
+from sirbot.slack.wrapper import SlackWrapper
+
+
+async def test_order_by_key(loop):
+    scheduler = OutboundScheduler(loop=loop, interval=0)
+    done = list()
+
+    async def job(key, i, delay):
+        await asyncio.sleep(delay, loop=loop)
+        done.append((key, i))
+        return i
+
+    futures = [
+        scheduler.schedule(key, job, key, i, 0.03 - i * 0.01)
+        for i in range(3) for key in ('C1', 'C2')
+    ]
+
+    assert await asyncio.gather(*futures, loop=loop) == [0, 0, 1, 1, 2, 2]
+    assert [i for key, i in done if key == 'C1'] == [0, 1, 2]
+    assert [i for key, i in done if key == 'C2'] == [0, 1, 2]
+
+
+async def test_pacing(loop):
+    scheduler = OutboundScheduler(loop=loop, interval=0.05)
+
+    async def job():
+        return loop.time()
+
+    paced = [scheduler.schedule('C1', job) for _ in range(2)]
+    first, second = await asyncio.gather(*paced, loop=loop)
+    assert second - first >= 0.04
+
+    unpaced = [scheduler.schedule('C2', job, pace=False) for _ in range(2)]
+    first, second = await asyncio.gather(*unpaced, loop=loop)
+    assert second - first < 0.04
+
+
+async def test_error(loop):
+    scheduler = OutboundScheduler(loop=loop, interval=0)
+
+    async def fail():
+        raise ValueError()
+
+    async def job():
+        return True
+
+    first = scheduler.schedule('C1', fail)
+    second = scheduler.schedule('C1', job)
+
+    with pytest.raises(ValueError):
+        await first
+    assert await second
+
+
+async def test_stop(loop):
+    scheduler = OutboundScheduler(loop=loop, interval=0)
+
+    async def job():
+        await asyncio.sleep(10, loop=loop)
+
+    futures = [scheduler.schedule('C1', job) for _ in range(3)]
+    await asyncio.sleep(0.01, loop=loop)
+    scheduler.stop()
+
+    results = await asyncio.gather(*futures, loop=loop,
+                                   return_exceptions=True)
+    assert all(isinstance(r, SlackOutboundCancelled) for r in results)
+    assert not scheduler._queues
+
+
+class Channel:
+    id = send_id = 'C1'
+
+
+class HTTPClient:
+    def __init__(self, loop):
+        self.loop = loop
+        self.calls = list()
+
+    async def message_send(self, data, token=None):
+        # Slower than the update and the deletion
+        await asyncio.sleep(0.02, loop=self.loop)
+        self.calls.append('send')
+        return {'ts': '1.0'}
+
+    async def message_update(self, message):
+        await asyncio.sleep(0.01, loop=self.loop)
+        self.calls.append('update')
+        return {'ts': '1.0'}
+
+    async def message_delete(self, message):
+        self.calls.append('delete')
+        return '1.0'
+
+
+async def test_send_update_delete_order(loop):
+    http_client = HTTPClient(loop)
+    bot = User(id_='B1')
+    bot.type = 'event'
+    slack = SlackWrapper(http_client=http_client, users=None, channels=None,
+                         groups=None, messages=None, threads=None, bot=bot,
+                         dispatcher=dict(),
+                         scheduler=OutboundScheduler(loop=loop, interval=0),
+                         executor=None)
+
+    message = SlackMessage(to=Channel(), text='hello')
+    sent = await slack.send(message, wait=False)
+    updated = await slack.update(message, wait=False)
+    deleted = await slack.delete(message, wait=False)
+
+    await asyncio.gather(*sent, *updated, *deleted, loop=loop)
+    assert http_client.calls == ['send', 'update', 'delete']
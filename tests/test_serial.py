@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from sirbot.slack.serial import KeyedExecutor, check_serial, serial_key
+
+
+def test_serial_key():
+    assert serial_key(None, 'C1', '1.0', 'U1') is None
+    assert serial_key('channel', 'C1', '1.0', 'U1') == 'channel:C1'
+    assert serial_key('thread', 'C1', '1.0', 'U1') == 'thread:C1:1.0'
+    assert serial_key('thread', 'C1', None, 'U1') is None
+    assert serial_key('user', 'C1', '1.0', 'U1') == 'user:U1'
+    assert serial_key('user', 'C1', '1.0', None) is None
+
+
+def test_check_serial():
+    check_serial(None)
+    check_serial('thread')
+    with pytest.raises(ValueError):
+        check_serial('team')
+
+
+async def wait_completed(executor, count, loop):
+    for _ in range(100):
+        if executor.completed == count:
+            return
+        await asyncio.sleep(0.01, loop=loop)
+    raise AssertionError('{} jobs completed'.format(executor.completed))
+
+
+async def test_order_by_key(loop):
+    executor = KeyedExecutor(loop, workers=4)
+    done = list()
+
+    async def job(key, i):
+        # Later jobs are faster, they would overtake without ordering
+        await asyncio.sleep(0.01 * (3 - i), loop=loop)
+        done.append((key, i))
+
+    for i in range(3):
+        for key in ('C1', 'C2'):
+            executor.submit(key, job, key, i)
+
+    await wait_completed(executor, 6, loop)
+    assert [i for key, i in done if key == 'C1'] == [0, 1, 2]
+    assert [i for key, i in done if key == 'C2'] == [0, 1, 2]
+    assert executor.max_depth == 3
+    assert executor.snapshot()['keys'] == 0
+
+
+async def test_keys_run_concurrently(loop):
+    executor = KeyedExecutor(loop, workers=2)
+    running = list()
+    peak = list()
+
+    async def job():
+        running.append(1)
+        peak.append(len(running))
+        await asyncio.sleep(0.01, loop=loop)
+        running.pop()
+
+    for key in ('C1', 'C2', 'C3', 'C4'):
+        executor.submit(key, job)
+
+    await wait_completed(executor, 4, loop)
+    assert max(peak) == 2
+
+
+async def test_busy_key_does_not_starve(loop):
+    executor = KeyedExecutor(loop, workers=1)
+    done = list()
+
+    async def job(key):
+        await asyncio.sleep(0, loop=loop)
+        done.append(key)
+
+    for _ in range(3):
+        executor.submit('C1', job, 'C1')
+    executor.submit('C2', job, 'C2')
+
+    await wait_completed(executor, 4, loop)
+    assert done == ['C1', 'C2', 'C1', 'C1']
+
+
+async def test_error(loop):
+    executor = KeyedExecutor(loop)
+    done = list()
+
+    async def fail():
+        raise ValueError()
+
+    async def job():
+        done.append(True)
+
+    executor.submit('C1', fail)
+    executor.submit('C1', job)
+
+    await wait_completed(executor, 2, loop)
+    assert done == [True]
@@ -0,0 +1,154 @@
+import time
+
+from sirbot.slack.store import ChannelStore, UserStore
+from sirbot.slack.store.cache import StoreCache
+
+
+class Client:
+    page_size = 2
+
+    def __init__(self, users=(), channels=()):
+        self.users = list(users)
+        self.channels = list(channels)
+        self.yielded = 0
+        self.queried = 0
+
+    async def get_user(self, id_):
+        self.queried += 1
+        return user(id_)
+
+    async def iter_users(self):
+        for user in self.users:
+            self.yielded += 1
+            yield user
+
+    async def iter_channels(self):
+        for channel in self.channels:
+            self.yielded += 1
+            yield channel
+
+
+class Item:
+    def __init__(self, id_, age=0):
+        self.id = id_
+        self.last_update = time.time() - age
+
+
+def user(id_, deleted=False):
+    return {'id': id_, 'name': id_.lower(), 'deleted': deleted}
+
+
+def channel(id_):
+    return {'id': id_, 'name': id_.lower()}
+
+
+async def test_users_iter_all_fetch(loop, db):
+    client = Client(users=[user('U1'), user('U2', deleted=True), user('U3')])
+    users = UserStore(client=client)
+
+    iterator = users.iter_all(fetch=True)
+    first = await iterator.__anext__()
+    assert first.id == 'U1'
+    assert client.yielded == 1
+
+    assert [u.id async for u in iterator] == ['U3']
+    assert [u.id for u in await users.all()] == ['U1', 'U3']
+    assert [u.id for u in await users.all(deleted=True)] == \
+        ['U1', 'U2', 'U3']
+
+
+async def test_users_all_fetch_deleted(loop, db):
+    client = Client(users=[user('U1'), user('U2', deleted=True)])
+    users = UserStore(client=client)
+
+    fetched = await users.all(fetch=True, deleted=True)
+    assert [u.id for u in fetched] == ['U1', 'U2']
+
+
+async def test_channels_iter_all(loop, db):
+    client = Client(channels=[channel('C1'), channel('C2'), channel('C3')])
+    channels = ChannelStore(client=client)
+
+    iterator = channels.iter_all()
+    first = await iterator.__anext__()
+    assert first.id == 'C1'
+    assert client.yielded == 1
+
+    assert [c.id async for c in iterator] == ['C2', 'C3']
+
+    await db.execute('SELECT id FROM slack_channels ORDER BY id')
+    assert [row['id'] for row in await db.fetchall()] == ['C1', 'C2', 'C3']
+
+
+def test_cache():
+    cache = StoreCache(refresh=60, size=10)
+    item = Item('U1')
+
+    assert cache.get('U1') is None
+    cache.set(item)
+    assert cache.get('U1').id == 'U1'
+
+    cache.pop('U1')
+    assert cache.get('U1') is None
+    assert cache.snapshot()['hits'] == 1
+    assert cache.snapshot()['misses'] == 2
+
+
+def test_cache_copy():
+    cache = StoreCache(refresh=60, size=10)
+    item = Item('U1')
+    cache.set(item)
+
+    # Modifying an item doesn't modify the cached one
+    item.type = 'rtm'
+    first = cache.get('U1')
+    first.type = 'event'
+    assert first is not item
+    assert not hasattr(cache.get('U1'), 'type')
+
+
+def test_cache_refresh():
+    cache = StoreCache(refresh=60, size=10)
+    cache.set(Item('U1', age=61))
+
+    assert cache.get('U1') is None
+    assert cache.expired == 1
+    assert len(cache) == 0
+
+
+def test_cache_lru():
+    cache = StoreCache(refresh=60, size=2)
+    for id_ in ('U1', 'U2'):
+        cache.set(Item(id_))
+
+    cache.get('U1')
+    cache.set(Item('U3'))
+
+    assert cache.get('U2') is None
+    assert cache.get('U1') and cache.get('U3')
+    assert cache.evicted == 1
+
+
+def test_cache_deactivated():
+    cache = StoreCache(size=0)
+    cache.set(Item('U1'))
+
+    assert cache.get('U1') is None
+    assert len(cache) == 0
+
+
+async def test_users_get_cached(loop, db):
+    client = Client()
+    users = UserStore(client=client)
+
+    first = await users.get('U1')
+    first.type = 'rtm'
+    assert client.queried == 1
+
+    second = await users.get('U1')
+    assert client.queried == 1
+    assert second.id == first.id and second is not first
+    assert not hasattr(second, 'type')
+
+    await users.get('U1', fetch=True)
+    assert client.queried == 2
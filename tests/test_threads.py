@@ -0,0 +1,139 @@
+import asyncio
+
+import pytest
+
+from sirbot.slack.threads import SharedThreadRegistry, ThreadRegistry
+
+
+async def user_callback(message, slack):
+    pass
+
+
+async def all_callback(message, slack):
+    pass
+
+
+async def test_pop(loop):
+    threads = ThreadRegistry(loop)
+    threads.add('1.0', 'user', user_id='U1')
+    threads.add('1.0', 'all')
+
+    assert '1.0' in threads
+    assert threads.pop('1.0', 'U2').func == 'all'
+    assert threads.pop('1.0', 'U1').func == 'user'
+    assert threads.pop('1.0', 'U1') is None
+    assert '1.0' not in threads
+    assert threads.matched == 2
+
+
+async def test_ttl(loop):
+    expired = list()
+    threads = ThreadRegistry(loop, ttl=0.05)
+
+    threads.add('1.0', 'short', on_expire=lambda *key: expired.append(key))
+    threads.add('2.0', 'long', ttl=10)
+    threads.add('3.0', 'shorter', ttl=0.01,
+                on_expire=lambda *key: expired.append(key))
+    threads.add('4.0', 'forever', ttl=0)
+
+    await asyncio.sleep(0.02, loop=loop)
+    assert expired == [('3.0', 'all')]
+
+    await asyncio.sleep(0.05, loop=loop)
+    assert expired == [('3.0', 'all'), ('1.0', 'all')]
+    assert '2.0' in threads and '4.0' in threads
+    assert threads.expired == 2
+    threads._timer.cancel()
+
+
+async def test_replace_resets_ttl(loop):
+    expired = list()
+    threads = ThreadRegistry(loop, ttl=0.02)
+
+    threads.add('1.0', 'first', on_expire=lambda *key: expired.append(key))
+    threads.add('1.0', 'second', ttl=10)
+
+    await asyncio.sleep(0.05, loop=loop)
+    assert not expired
+    assert threads.pop('1.0', 'U1').func == 'second'
+    threads._timer.cancel()
+
+
+async def test_evict(loop):
+    evicted = list()
+    threads = ThreadRegistry(loop, ttl=0, size=2)
+
+    for thread in ('1.0', '2.0', '3.0'):
+        threads.add(thread, thread,
+                    on_expire=lambda *key: evicted.append(key))
+
+    assert evicted == [('1.0', 'all')]
+    assert len(threads) == 2
+    assert '1.0' not in threads
+    assert threads.evicted == 1
+
+
+async def test_coroutine_on_expire(loop):
+    expired = asyncio.Event(loop=loop)
+    threads = ThreadRegistry(loop, ttl=0.01)
+
+    async def on_expire(thread, user_id):
+        expired.set()
+
+    threads.add('1.0', 'func', on_expire=on_expire)
+    await asyncio.wait_for(expired.wait(), 1, loop=loop)
+
+
+async def test_shared_claim(loop, db):
+    first = SharedThreadRegistry(loop)
+    second = SharedThreadRegistry(loop)
+
+    first.add('1.0', user_callback, user_id='U1', serial='thread')
+    first.add('1.0', all_callback)
+    await asyncio.sleep(0.01, loop=loop)
+
+    callback = await second.claim('1.0', 'U2')
+    assert callback.func is all_callback
+    callback = await second.claim('1.0', 'U1')
+    assert callback.func is user_callback
+    assert callback.serial == 'thread'
+
+    assert await first.claim('1.0', 'U1') is None
+    assert second.matched == 2
+
+
+async def test_shared_claim_local(loop, db):
+    threads = SharedThreadRegistry(loop)
+    threads.add('1.0', user_callback, user_id='U1')
+    await asyncio.sleep(0.01, loop=loop)
+
+    callback = await threads.claim('1.0', 'U1')
+    assert callback.func is user_callback
+    assert len(threads) == 0
+    assert await threads.claim('1.0', 'U1') is None
+
+
+async def test_shared_expire(loop, db):
+    expired = list()
+    first = SharedThreadRegistry(loop, ttl=0.02)
+    second = SharedThreadRegistry(loop)
+
+    for thread in ('1.0', '2.0'):
+        first.add(thread, all_callback,
+                  on_expire=lambda *key: expired.append(key))
+    await asyncio.sleep(0.01, loop=loop)
+    assert (await second.claim('2.0', 'U1')).func is all_callback
+
+    await asyncio.sleep(0.05, loop=loop)
+    assert expired == [('1.0', 'all')]
+    assert await second.claim('1.0', 'U1') is None
+
+
+async def test_shared_closure(loop, db):
+    threads = SharedThreadRegistry(loop)
+
+    async def callback(message, slack):
+        pass
+
+    with pytest.raises(ValueError):
+        threads.add('1.0', callback)
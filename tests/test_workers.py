@@ -0,0 +1,25 @@
+import pytest
+
+from sirbot.slack.workers import worker_config
+
+
+def test_worker_config():
+    config = {'slack': {'rtm': True, 'record': 'traffic.jsonl.gz'}}
+
+    first = worker_config(config, 0, 2)['slack']
+    second = worker_config(config, 1, 2)['slack']
+
+    assert first['rtm'] and not second['rtm']
+    assert second['record'] == 'traffic.1.jsonl.gz'
+    assert second['rate_limit']['margin'] == pytest.approx(0.45)
+
+
+def test_worker_config_shared():
+    config = {'slack': {'dedup': {'window': 60}, 'threads': False}}
+
+    slack = worker_config(config, 1, 2)['slack']
+    assert slack['dedup'] == {'window': 60, 'shared': True}
+    assert slack['threads'] is False
+
+    slack = worker_config(config, 0, 1)['slack']
+    assert slack['dedup'] == {'window': 60}